@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# 文生图接口响应方式的微基准测试
+#
+# 对比旧的处理方式（json.loads校验后包装为{"result": "<JSON字符串>"}再编码）
+# 与透传方式（直接把图片API响应体作为响应返回）的耗时和内存峰值
+#
+# 用法：python benchmarks/bench_image_response.py --size-kb 2048 --rounds 50
+import argparse
+import base64
+import json
+import os
+import time
+import tracemalloc
+
+from starlette.responses import JSONResponse, Response
+
+
+def build_body(size_kb: int) -> str:
+    """构造包含base64图片和URL列表的模拟图片API响应"""
+    image = base64.b64encode(os.urandom(size_kb * 1024 * 3 // 4)).decode("ascii")
+    return json.dumps({
+        "success": True,
+        "task_id": "bench",
+        "data": [{"image_base64": image}] + [
+            {"image_url": f"https://example.com/images/{i}.png"} for i in range(100)
+        ]
+    })
+
+
+def legacy(body: str):
+    """旧方式：解析校验后包装为字符串再整体编码"""
+    json.loads(body)
+    return JSONResponse(content={"result": body}).body
+
+
+def passthrough(body: str):
+    """透传方式：原样返回响应体"""
+    return Response(content=body, media_type="application/json").body
+
+
+def measure(func, body: str, rounds: int):
+    """返回(平均耗时毫秒, 内存峰值MB, 响应大小KB)"""
+    func(body)  # 预热
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(body)
+    elapsed = (time.perf_counter() - start) / rounds * 1000
+
+    tracemalloc.start()
+    out = func(body)
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return elapsed, peak, len(out) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文生图接口响应方式微基准测试")
+    parser.add_argument("--size-kb", type=int, default=2048, help="模拟响应体大小（KB）")
+    parser.add_argument("--rounds", type=int, default=50, help="每种方式的执行次数")
+    args = parser.parse_args()
+
+    body = build_body(args.size_kb)
+    print(f"响应体大小: {len(body) / 1024:.0f} KB, 执行次数: {args.rounds}")
+    print(f"{'方式':<12}{'平均耗时(ms)':>14}{'内存峰值(MB)':>14}{'响应大小(KB)':>14}")
+    for name, func in (("legacy", legacy), ("passthrough", passthrough)):
+        elapsed, peak, size = measure(func, body, args.rounds)
+        print(f"{name:<12}{elapsed:>14.2f}{peak:>14.2f}{size:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# 主键生成方式对插入吞吐的基准测试
+#
+# 在DATABASE_URL指向的数据库中创建两张与chat_messages结构相同的临时表，
+# 分别用uuid4和UUIDv7作为主键批量插入，对比吞吐量和最终表大小。
+# 随机主键的劣势在表超过缓冲池后才明显，MySQL上建议至少插入数百万行
+#
+# 用法：python benchmarks/bench_insert_ids.py --rows 1000000 --batch-size 1000
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+
+from database import engine  # noqa: E402
+from ids import new_id  # noqa: E402
+
+GENERATORS = {
+    "uuid4": lambda: str(uuid.uuid4()),
+    "uuid7": new_id,
+}
+
+
+def create_table(conn, name: str):
+    conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    suffix = " ENGINE=InnoDB DEFAULT CHARSET=utf8mb4" if engine.dialect.name == "mysql" else ""
+    conn.execute(text(
+        f"CREATE TABLE {name} ("
+        "id VARCHAR(36) PRIMARY KEY, session_id VARCHAR(36) NOT NULL, is_user BOOLEAN, "
+        "content TEXT NOT NULL, created_at DATETIME)" + suffix
+    ))
+    conn.execute(text(f"CREATE INDEX idx_{name}_session_id ON {name} (session_id)"))
+
+
+def table_size(conn, name: str):
+    """返回表的数据+索引大小（MB），非MySQL返回None"""
+    if engine.dialect.name != "mysql":
+        return None
+    conn.execute(text(f"ANALYZE TABLE {name}"))
+    size = conn.execute(text(
+        "SELECT data_length + index_length FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name"
+    ), {"name": name}).scalar()
+    return size / 1024 / 1024
+
+
+def bench(kind: str, rows: int, batch_size: int, keep: bool):
+    name = f"bench_ids_{kind}"
+    generate = GENERATORS[kind]
+    session_ids = [str(uuid.uuid4()) for _ in range(1000)]
+    insert_sql = text(
+        f"INSERT INTO {name} (id, session_id, is_user, content, created_at) "
+        "VALUES (:id, :session_id, :is_user, :content, :created_at)"
+    )
+    with engine.begin() as conn:
+        create_table(conn, name)
+
+    start = time.perf_counter()
+    last_report = start
+    for offset in range(0, rows, batch_size):
+        batch = [{
+            "id": generate(),
+            "session_id": session_ids[(offset + i) % len(session_ids)],
+            "is_user": (offset + i) % 2 == 0,
+            "content": "这是一条用于插入吞吐测试的聊天消息🙂",
+            "created_at": datetime.utcnow(),
+        } for i in range(min(batch_size, rows - offset))]
+        with engine.begin() as conn:
+            conn.execute(insert_sql, batch)
+        now = time.perf_counter()
+        if now - last_report > 5:
+            print(f"  {kind}: 已插入 {offset + len(batch)} 行，当前 {(offset + len(batch)) / (now - start):.0f} 行/秒")
+            last_report = now
+    elapsed = time.perf_counter() - start
+
+    with engine.begin() as conn:
+        size = table_size(conn, name)
+        if not keep:
+            conn.execute(text(f"DROP TABLE {name}"))
+    size_text = f"{size:.1f} MB" if size is not None else "-"
+    print(f"{kind:<8}{rows / elapsed:>12.0f} 行/秒{elapsed:>10.1f} 秒  表大小 {size_text}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="主键生成方式插入吞吐基准测试")
+    parser.add_argument("--rows", type=int, default=200000, help="每种主键插入的行数")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每个事务插入的行数")
+    parser.add_argument("--keep", action="store_true", help="保留测试表以便检查")
+    args = parser.parse_args()
+    print(f"数据库: {engine.dialect.name}，每种主键插入 {args.rows} 行")
+    for kind in GENERATORS:
+        bench(kind, args.rows, args.batch_size, args.keep)
+
+
+if __name__ == "__main__":
+    main()
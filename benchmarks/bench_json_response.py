@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# 接口响应序列化开销的微基准测试
+#
+# 对比FastAPI默认路径（jsonable_encoder + 标准库json的JSONResponse）
+# 与api_response使用的FastJSONResponse（orjson），在典型响应上的单次序列化耗时
+#
+# 用法：python benchmarks/bench_json_response.py --rounds 20000
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from responses import api_response  # noqa: E402
+
+# 典型响应：聊天回复、用户信息、发送消息
+PAYLOADS = {
+    "chatAi": {
+        "code": 200,
+        "message": "success",
+        "data": "春风十里不如你🌸，今天的阳光刚刚好，愿你被温柔以待，生日快乐！🎂" * 3
+    },
+    "user/info": {
+        "code": 200,
+        "message": "success",
+        "data": {
+            "id": "5f0c6b1e-3c1a-4b1e-9d2a-8f1e2d3c4b5a",
+            "openid": "oAbCdEfGhIjKlMnOpQrStUvWxYz",
+            "nickName": "小助手用户",
+            "avatar": "https://thirdwx.qlogo.cn/mmopen/vi_32/avatar/132",
+            "createdAt": datetime.now(timezone.utc).isoformat(),
+            "settings": {"isDarkMode": False, "autoRead": True, "saveHistory": True}
+        }
+    },
+    "message": {
+        "code": 200,
+        "message": "success",
+        "data": {
+            "sessionId": "5f0c6b1e-3c1a-4b1e-9d2a-8f1e2d3c4b5a",
+            "messageId": "7a1d2c3b-4e5f-6a7b-8c9d-0e1f2a3b4c5d",
+            "reply": {"content": "这是AI的回复。" * 20, "time": datetime.now(timezone.utc).isoformat()}
+        }
+    },
+}
+
+
+def default_path(payload: dict):
+    """FastAPI返回dict时的默认路径"""
+    return JSONResponse(content=jsonable_encoder(payload)).body
+
+
+def fast_path(payload: dict):
+    """api_response直接返回FastJSONResponse"""
+    return api_response(payload["data"], message=payload["message"], code=payload["code"]).body
+
+
+def measure(func, payload: dict, rounds: int) -> float:
+    """返回单次序列化平均耗时（微秒）"""
+    func(payload)  # 预热
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(payload)
+    return (time.perf_counter() - start) / rounds * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="接口响应序列化微基准测试")
+    parser.add_argument("--rounds", type=int, default=20000, help="每种方式的执行次数")
+    args = parser.parse_args()
+
+    print(f"{'响应':<12}{'默认路径(us)':>14}{'orjson(us)':>14}{'加速比':>10}")
+    for name, payload in PAYLOADS.items():
+        before = measure(default_path, payload, args.rounds)
+        after = measure(fast_path, payload, args.rounds)
+        print(f"{name:<12}{before:>14.2f}{after:>14.2f}{before / after:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# 消息内容压缩的存储与读取开销基准测试
+#
+# 用不同长度的菜谱类AI回复（中文+emoji）测试压缩率、写入编码耗时和读取解码耗时，
+# 并在SQLite内存库中对比压缩前后按会话读取消息的耗时
+#
+# 用法：python benchmarks/bench_message_compression.py --rows 2000
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("MESSAGE_COMPRESSION_THRESHOLD", "1024")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from compression import encode_content, decode_content  # noqa: E402
+
+SECTIONS = [
+    "1. 菜名：红烧排骨 🍽️",
+    "2. 主要食材：排骨500克、土豆两个 🥬",
+    "3. 辅助食材：生姜、大葱、八角、冰糖、生抽、老抽、料酒 🧂",
+    "4. 烹饪步骤：排骨冷水下锅焯水，撇去浮沫后捞出沥干；锅中少许油放入冰糖小火炒出糖色，"
+    "倒入排骨翻炒上色，加入姜片葱段八角，淋入料酒生抽老抽，加开水没过排骨，大火烧开转小火炖40分钟 🔥",
+    "5. 烹饪小贴士：炒糖色时火一定要小，糖变成枣红色立即下排骨，否则容易发苦 💡",
+    "6. 最终效果：色泽红亮，肉质软烂脱骨，咸中带甜，土豆吸满汤汁非常下饭 👨‍🍳",
+]
+
+
+def make_reply(target_chars: int) -> str:
+    """拼接出指定长度左右的菜谱回复"""
+    parts = []
+    while sum(len(p) for p in parts) < target_chars:
+        parts.append(random.choice(SECTIONS))
+    return "\n".join(parts)
+
+
+def bench_codec(sizes, rounds: int):
+    print(f"{'字符数':>8}{'原始(B)':>10}{'存储(B)':>10}{'压缩率':>8}{'编码(us)':>10}{'解码(us)':>10}")
+    for size in sizes:
+        reply = make_reply(size)
+        stored = encode_content(reply, force=True)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            encode_content(reply, force=True)
+        encode_us = (time.perf_counter() - start) / rounds * 1_000_000
+        start = time.perf_counter()
+        for _ in range(rounds):
+            decode_content(stored)
+        decode_us = (time.perf_counter() - start) / rounds * 1_000_000
+        raw_bytes = len(reply.encode("utf-8"))
+        stored_bytes = len(stored.encode("utf-8"))
+        print(f"{len(reply):>8}{raw_bytes:>10}{stored_bytes:>10}{stored_bytes / raw_bytes:>8.2f}{encode_us:>10.1f}{decode_us:>10.1f}")
+
+
+def bench_reads(rows: int):
+    """对比压缩前后按会话读取消息的耗时（SQLite内存库，主要体现解码开销）"""
+    engine = create_engine("sqlite://")
+    replies = [make_reply(random.choice([200, 1500, 3000])) for _ in range(rows)]
+    for name, compress in (("plain", False), ("compressed", True)):
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS m"))
+            conn.execute(text("CREATE TABLE m (id INTEGER PRIMARY KEY, session_id INTEGER, content TEXT)"))
+            conn.execute(text("INSERT INTO m (session_id, content) VALUES (:s, :c)"), [
+                {"s": i % 50, "c": encode_content(r, force=True) if compress else r} for i, r in enumerate(replies)
+            ])
+            size = conn.execute(text("SELECT SUM(LENGTH(CAST(content AS BLOB))) FROM m")).scalar()
+        start = time.perf_counter()
+        with engine.connect() as conn:
+            for session_id in range(50):
+                for (content,) in conn.execute(text("SELECT content FROM m WHERE session_id = :s"), {"s": session_id}):
+                    decode_content(content)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{name:<12}表数据 {size / 1024:>8.0f} KB，读取全部会话 {elapsed:>8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="消息内容压缩基准测试")
+    parser.add_argument("--rows", type=int, default=2000, help="读取测试的消息条数")
+    parser.add_argument("--rounds", type=int, default=200, help="编解码测试的执行次数")
+    args = parser.parse_args()
+    random.seed(42)
+    bench_codec([500, 1000, 2000, 4000, 8000], args.rounds)
+    print()
+    bench_reads(args.rows)
+
+
+if __name__ == "__main__":
+    main()
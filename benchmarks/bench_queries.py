@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# 接口数据库查询基准测试
+#
+# 在scripts/seed_data.py生成的大规模数据上，逐条执行各接口实际使用的查询，统计耗时分位数：
+#   python scripts/seed_data.py --users 1000000
+#   python benchmarks/bench_queries.py --runs 200
+#   python benchmarks/bench_queries.py --runs 50 --explain      # 同时输出执行计划
+#
+# 会话数最多、居中和最少的三类用户分别测量，重度用户的检索最能暴露缺失的索引。
+# 检索查询直接调用routers.chat.build_search_query，与接口执行的SQL相同
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, text  # noqa: E402
+from sqlalchemy.orm import joinedload  # noqa: E402
+
+from database import SessionLocal  # noqa: E402
+from models import ChatMessage, ChatSession, User, UserSettings  # noqa: E402
+from routers.chat import build_search_query  # noqa: E402
+
+SEARCH_KEYWORDS = ["番茄炒蛋", "citywalk", "旅行攻略", "🎉", "不会出现的关键词"]
+
+
+def pick_users(db) -> dict:
+    """按会话数选出重度、中位和轻度用户"""
+    rows = db.query(ChatSession.user_id, func.count(ChatSession.id).label("n")).group_by(
+        ChatSession.user_id).order_by(text("n DESC")).all()
+    if not rows:
+        raise SystemExit("数据库中没有会话数据，请先运行scripts/seed_data.py")
+    return {"重度": rows[0][0], "中位": rows[len(rows) // 2][0], "轻度": rows[-1][0]}
+
+
+def build_queries(db, user_id: str) -> dict:
+    """各接口的查询，键为查询名称，值为返回Query对象的函数"""
+    user = db.query(User).filter(User.id == user_id).first()
+    session_id = db.query(ChatSession.id).filter(ChatSession.user_id == user_id).order_by(
+        ChatSession.created_at.desc()).limit(1).scalar()
+    queries = {
+        "utils.get_current_user": lambda: db.query(User).filter(User.id == user_id),
+        "user.get_user_info": lambda: db.query(User).options(joinedload(User.settings)).filter(User.id == user_id),
+        "chat/user 用户设置": lambda: db.query(UserSettings).filter(UserSettings.user_id == user_id),
+        "chat.send_message 会话": lambda: db.query(ChatSession).filter(
+            ChatSession.id == session_id, ChatSession.user_id == user_id),
+        "auth.wechat_login openid": lambda: db.query(User).filter(User.openid == user.openid),
+    }
+    for keyword in SEARCH_KEYWORDS:
+        queries[f"chat.search '{keyword}'"] = (
+            lambda keyword=keyword: build_search_query(db, user_id, keyword).order_by(
+                ChatMessage.created_at.desc()).offset(0).limit(21))
+    queries["chat.search 第5页"] = lambda: build_search_query(db, user_id, SEARCH_KEYWORDS[0]).order_by(
+        ChatMessage.created_at.desc()).offset(80).limit(21)
+    return queries
+
+
+def explain(db, query) -> list:
+    """返回查询的执行计划"""
+    dialect = db.get_bind().dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if dialect.name == "sqlite" else "EXPLAIN "
+    return [tuple(row) for row in db.execute(text(prefix + sql))]
+
+
+def measure(db, make_query, runs: int) -> list:
+    durations = []
+    for _ in range(runs):
+        db.expunge_all()  # 不复用已加载的对象，每次都完整执行查询和对象构造
+        start = time.perf_counter()
+        make_query().all()
+        durations.append(time.perf_counter() - start)
+    return sorted(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="接口数据库查询基准测试")
+    parser.add_argument("--runs", type=int, default=100, help="每条查询的执行次数")
+    parser.add_argument("--warmup", type=int, default=5, help="正式计时前的预热次数")
+    parser.add_argument("--explain", action="store_true", help="输出每条查询的执行计划")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        users = pick_users(db)
+        for label, user_id in users.items():
+            sessions = db.query(func.count(ChatSession.id)).filter(ChatSession.user_id == user_id).scalar()
+            messages = db.query(func.count(ChatMessage.id)).join(
+                ChatSession, ChatMessage.session_id == ChatSession.id).filter(ChatSession.user_id == user_id).scalar()
+            print(f"\n{label}用户 {user_id}：{sessions}个会话，{messages}条消息")
+            print(f"{'查询':<28}{'p50':>10}{'p95':>10}{'p99':>10}{'最大':>10}  (ms)")
+            for name, make_query in build_queries(db, user_id).items():
+                measure(db, make_query, args.warmup)
+                durations = measure(db, make_query, args.runs)
+                pick = lambda q: durations[min(len(durations) - 1, int(len(durations) * q / 100))] * 1000
+                print(f"{name:<28}{pick(50):>10.3f}{pick(95):>10.3f}{pick(99):>10.3f}{durations[-1] * 1000:>10.3f}")
+                if args.explain:
+                    for row in explain(db, make_query()):
+                        print("    " + " | ".join("" if v is None else str(v) for v in row))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
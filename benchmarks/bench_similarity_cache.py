@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# 近似重复缓存的查询耗时基准测试
+#
+# 向SimilarityCache写入大量模拟的朋友圈关键词，再分别用改写过的输入（应命中）和
+# 无关输入（应未命中）查询，输出命中率和查询耗时分位数，确认未命中时增加的耗时相对模型调用可以忽略
+#
+# 用法：python benchmarks/bench_similarity_cache.py --entries 4096 --lookups 20000
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from similarity_cache import SimilarityCache, jaccard, shingles  # noqa: E402
+
+TOPICS = ["生日", "中秋节", "春节", "毕业", "入职", "旅行", "周末", "加班", "健身", "下雨天", "咖啡", "猫咪",
+          "妈妈", "爸爸", "闺蜜", "男朋友", "女朋友", "同学聚会", "新家", "结婚纪念日"]
+EXTRAS = ["开心", "感恩", "温馨", "简短", "文艺", "搞笑", "伤感", "正能量", "海边", "雪景", "日落", "星空"]
+TEMPLATES = ["帮我写个{}的朋友圈", "帮我写一个{}的朋友圈", "{}朋友圈", "来个{}文案", "写一下{}的朋友圈吧"]
+
+
+def random_topic(rng: random.Random) -> str:
+    return "".join(rng.sample(TOPICS, 1) + rng.sample(EXTRAS, rng.randint(1, 2)))
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="近似重复缓存查询耗时基准测试")
+    parser.add_argument("--entries", type=int, default=4096, help="缓存条目数")
+    parser.add_argument("--lookups", type=int, default=20000, help="查询次数")
+    parser.add_argument("--threshold", type=float, default=0.7, help="相似度阈值")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    cache = SimilarityCache(maxsize=args.entries)
+    namespace = ("朋友圈", "bench")
+    topics = [random_topic(rng) for _ in range(args.entries)]
+    start = time.perf_counter()
+    for topic in topics:
+        cache.set(namespace, rng.choice(TEMPLATES).format(topic), topic)
+    print(f"写入{args.entries}条: 平均{(time.perf_counter() - start) / args.entries * 1e6:.1f}微秒/条")
+
+    for name, make_query in [
+        ("改写后的重复输入", lambda: rng.choice(TEMPLATES).format(rng.choice(topics))),
+        ("无关输入", lambda: "".join(rng.choice("春夏秋冬山水花鸟风月云雨日星天地") for _ in range(rng.randint(4, 12)))),
+    ]:
+        queries = [make_query() for _ in range(args.lookups)]
+        durations, hits = [], 0
+        for query in queries:
+            start = time.perf_counter()
+            hits += cache.get(namespace, query, args.threshold) is not None
+            durations.append(time.perf_counter() - start)
+        print(f"{name}: 命中率{hits / len(queries):.1%}, "
+              f"p50 {percentile(durations, 50) * 1e6:.1f}微秒, p99 {percentile(durations, 99) * 1e6:.1f}微秒")
+
+    a, b = "帮我写个生日朋友圈", "帮我写一个生日的朋友圈"
+    print(f"示例相似度: '{a}' vs '{b}' = {jaccard(shingles(a), shingles(b)):.2f}")
+    print(f"缓存统计: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# WebSocket与REST聊天接口的单轮开销对比
+#
+# 对运行中的服务分别通过GET /chat/chatAi和/chat/ws发送相同的消息，统计每轮耗时分位数和吞吐量。
+# 上游使用零延迟的模拟模型服务，测得的差异即为每轮的连接、请求头、认证等开销：
+#   python scripts/fake_llm_server.py --port 8091 --name deepseek
+#   DEEPSEEK_API_URL=http://127.0.0.1:8091/v1 DEEPSEEK_API_KEY=fake python run.py
+#   python benchmarks/bench_ws_vs_rest.py --base-url http://127.0.0.1:8000 --token <JWT> --turns 500 --concurrency 4
+#
+# --new-connection表示REST每轮新建连接（接近移动网络下连接不能复用的情况），默认复用keep-alive连接
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import httpx
+import websockets
+
+
+def summarize(name: str, durations, elapsed: float):
+    durations = sorted(durations)
+    pick = lambda q: durations[min(len(durations) - 1, int(len(durations) * q / 100))] * 1000
+    print(f"{name:<24} {len(durations)}轮  p50 {pick(50):7.2f}ms  p95 {pick(95):7.2f}ms  "
+          f"p99 {pick(99):7.2f}ms  吞吐 {len(durations) / elapsed:7.1f}轮/秒")
+
+
+async def bench_rest(base_url: str, token: str, turns: int, concurrency: int, new_connection: bool):
+    headers = {"Authorization": f"Bearer {token}"}
+    durations = []
+    queue = asyncio.Queue()
+    for i in range(turns):
+        queue.put_nowait(i)
+
+    async def worker(client):
+        while not queue.empty():
+            i = queue.get_nowait()
+            start = time.perf_counter()
+            if new_connection:
+                async with httpx.AsyncClient(base_url=base_url, headers=headers) as fresh:
+                    response = await fresh.get("/chat/chatAi", params={"message": f"第{i}轮"})
+            else:
+                response = await client.get("/chat/chatAi", params={"message": f"第{i}轮"})
+            response.raise_for_status()
+            durations.append(time.perf_counter() - start)
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+    summarize("REST" + ("(新建连接)" if new_connection else "(keep-alive)"), durations, elapsed)
+
+
+async def bench_ws(base_url: str, token: str, turns: int, concurrency: int):
+    url = base_url.replace("http", "ws", 1) + f"/chat/ws?token={token}"
+    durations = []
+    sent_at = {}
+    async with websockets.connect(url) as ws:
+        ready = json.loads(await ws.recv())
+        assert ready["type"] == "ready", ready
+        window = asyncio.Semaphore(concurrency)  # 同时在途的请求数
+        finished = asyncio.Event()
+
+        async def reader():
+            while len(durations) < turns:
+                message = json.loads(await ws.recv())
+                if message["type"] == "result":
+                    durations.append(time.perf_counter() - sent_at.pop(message["id"]))
+                    window.release()
+                elif message["type"] == "error":
+                    raise RuntimeError(message)
+            finished.set()
+
+        reader_task = asyncio.create_task(reader())
+        start = time.perf_counter()
+        for i in range(turns):
+            await window.acquire()
+            request_id = uuid.uuid4().hex
+            sent_at[request_id] = time.perf_counter()
+            await ws.send(json.dumps({"type": "chat", "id": request_id, "message": f"第{i}轮"}))
+        await finished.wait()
+        elapsed = time.perf_counter() - start
+        await reader_task
+    summarize("WebSocket(单连接)", durations, elapsed)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="WebSocket与REST聊天接口的单轮开销对比")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--token", required=True, help="登录接口返回的JWT令牌")
+    parser.add_argument("--turns", type=int, default=500, help="每种方式的轮数")
+    parser.add_argument("--concurrency", type=int, default=1, help="同时在途的请求数，WebSocket不应超过WS_MAX_INFLIGHT")
+    parser.add_argument("--new-connection", action="store_true", help="REST每轮新建连接")
+    args = parser.parse_args()
+
+    await bench_rest(args.base_url, args.token, args.turns, args.concurrency, args.new_connection)
+    await bench_ws(args.base_url, args.token, args.turns, args.concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+# 进程内缓存工具
+import threading  # 线程锁，保证多线程访问安全
+import time  # 时间处理，用于过期判断
+from collections import OrderedDict  # 有序字典，用于实现LRU淘汰
+
+
+class TTLCache:
+    """带过期时间的LRU缓存
+
+    线程安全的进程内缓存，超过容量时淘汰最久未使用的条目，
+    超过存活时间的条目在读取时视为不存在
+
+    Attributes:
+        maxsize: 最大条目数
+        ttl: 条目存活时间（秒），为0表示永不过期
+        hits: 命中次数
+        misses: 未命中次数
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (过期时间戳, 值)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """读取缓存，命中时将条目移到队尾（最近使用）"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at and expires_at < time.monotonic():
+                # 已过期，删除条目
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        """写入缓存，超过容量时淘汰最久未使用的条目"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else 0
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)  # 淘汰最久未使用的条目
+
+    def pop(self, key, default=None):
+        """删除并返回缓存条目"""
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[1]
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """返回缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / total, 4) if total else 0.0,
+        }
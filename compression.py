@@ -0,0 +1,44 @@
+# 消息内容压缩
+import base64  # 压缩结果转为文本存储
+import zlib  # 压缩算法
+
+from config import MESSAGE_COMPRESSION_ENABLED, MESSAGE_COMPRESSION_THRESHOLD, MESSAGE_COMPRESSION_LEVEL
+
+# 压缩内容的前缀标记，普通文本以该字符开头时也会被压缩，保证读取时不会误判
+COMPRESSED_MARKER = "\x1fz"
+
+
+def should_compress(text: str, force: bool = False) -> bool:
+    """判断消息内容是否需要压缩
+
+    Args:
+        text: 消息原文
+        force: 忽略总开关，只按长度阈值判断（用于批量迁移）
+    """
+    if text is None:
+        return False
+    if text.startswith(COMPRESSED_MARKER[0]):
+        return True
+    if not (MESSAGE_COMPRESSION_ENABLED or force):
+        return False
+    return len(text) >= MESSAGE_COMPRESSION_THRESHOLD
+
+
+def encode_content(text: str, force: bool = False) -> str:
+    """把消息原文编码为存储格式，超过阈值时压缩"""
+    if not should_compress(text, force):
+        return text
+    compressed = zlib.compress(text.encode("utf-8"), MESSAGE_COMPRESSION_LEVEL)
+    return COMPRESSED_MARKER + base64.b64encode(compressed).decode("ascii")
+
+
+def decode_content(value: str) -> str:
+    """把存储格式还原为消息原文，未压缩的内容原样返回"""
+    if value is None or not value.startswith(COMPRESSED_MARKER):
+        return value
+    return zlib.decompress(base64.b64decode(value[len(COMPRESSED_MARKER):])).decode("utf-8")
+
+
+def is_encoded(value: str) -> bool:
+    """存储值是否为压缩格式"""
+    return value is not None and value.startswith(COMPRESSED_MARKER)
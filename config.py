@@ -30,6 +30,9 @@ DB_PORT = os.getenv("DB_PORT", "3306")
 DB_NAME = os.getenv("DB_NAME", "ai_assistant")
 # 构建数据库URL
 DATABASE_URL = os.getenv("DATABASE_URL", f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+# 只读副本，多个URL用逗号分隔，留空表示读写都走主库
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))  # 用户写入后该时间内的读请求仍走主库
 
 # JWT认证配置 - 使用随机生成的密钥作为默认值
 import secrets
@@ -38,6 +41,12 @@ SECRET_KEY = os.getenv("SECRET_KEY", DEFAULT_SECRET_KEY)
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", str(60 * 24 * 7)))
 
+# 令牌吊销配置
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))  # 布隆过滤器的初始容量
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))  # 布隆过滤器的误判率，误判时多查一次表
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))  # 同步其他进程吊销记录的间隔（秒）
+REVOCATION_PURGE_SECONDS = int(os.getenv("REVOCATION_PURGE_SECONDS", "3600"))  # 清理过期吊销记录的间隔（秒）
+
 # 微信小程序配置 - 移除硬编码的AppID和Secret
 WECHAT_APPID = os.getenv("WECHAT_APPID", "")  # 默认为空，必须通过环境变量提供
 WECHAT_SECRET = os.getenv("WECHAT_SECRET", "")  # 默认为空，必须通过环境变量提供
@@ -46,6 +55,42 @@ WECHAT_LOGIN_URL = os.getenv("WECHAT_LOGIN_URL", "https://api.weixin.qq.com/sns/
 # AI服务配置
 AI_API_KEY = os.getenv("AI_API_KEY", "")
 AI_API_URL = os.getenv("AI_API_URL", "https://api.openai.com/v1/chat/completions")
+AI_MODEL_NAME = os.getenv("AI_MODEL_NAME", "gpt-4o-mini")  # 配置AI_API_KEY后作为DeepSeek之外的备用模型服务
+
+# 提示词优化缓存配置
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "2048"))  # 最多缓存的提示词条数
+PROMPT_CACHE_TTL = int(os.getenv("PROMPT_CACHE_TTL", str(60 * 60 * 24)))  # 缓存有效期，默认1天
+# 近似重复输入缓存配置，只对创作类功能启用，输入相似度达到阈值时直接返回之前的生成结果
+SIMILAR_CACHE_THRESHOLDS = os.getenv("SIMILAR_CACHE_THRESHOLDS", "")  # 各功能的相似度阈值，如 朋友圈:0.7,小红书:0.75，由similarity_cache.parse_thresholds解析
+SIMILAR_CACHE_SIZE = int(os.getenv("SIMILAR_CACHE_SIZE", "4096"))  # 最多缓存的生成结果条数
+SIMILAR_CACHE_TTL = int(os.getenv("SIMILAR_CACHE_TTL", str(60 * 60)))  # 缓存有效期，默认1小时
+# 缓存未命中时的并行模式：空表示关闭，raw表示以原始输入结果为准，optimized表示以优化提示词结果为准
+TEXT2IMAGE_SPECULATIVE_PRIMARY = os.getenv("TEXT2IMAGE_SPECULATIVE_PRIMARY", "").lower()
+
+# DeepSeek调用并发限制配置
+LLM_CONCURRENCY_INITIAL = int(os.getenv("LLM_CONCURRENCY_INITIAL", "8"))  # 初始并发上限
+LLM_CONCURRENCY_MIN = int(os.getenv("LLM_CONCURRENCY_MIN", "2"))  # 并发上限的下限
+LLM_CONCURRENCY_MAX = int(os.getenv("LLM_CONCURRENCY_MAX", "64"))  # 并发上限的上限
+LLM_LATENCY_TARGET = float(os.getenv("LLM_LATENCY_TARGET", "30"))  # 单次调用超过该耗时（秒）视为上游拥塞
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "5"))  # 最长排队时间（秒），超过后快速失败
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "200"))  # 最多排队的调用数
+
+# 多模型服务路由配置
+LLM_ROUTES = os.getenv("LLM_ROUTES", "")  # 各功能允许使用的服务，如 翻译:openai,deepseek;评价:deepseek，由llm_router.parse_routes解析
+LLM_FAILOVER_HEDGE_AFTER = float(os.getenv("LLM_FAILOVER_HEDGE_AFTER", "0"))  # 首选服务超过该时间（秒）未返回时同时请求下一个服务，0表示关闭
+LLM_STATS_WINDOW = float(os.getenv("LLM_STATS_WINDOW", "300"))  # 统计p95耗时和错误率的时间窗口（秒）
+LLM_UNHEALTHY_ERROR_RATE = float(os.getenv("LLM_UNHEALTHY_ERROR_RATE", "0.5"))  # 错误率达到该值的服务暂停路由
+
+# 对冲请求配置，只建议用于输出较短、对耗时敏感的功能
+LLM_HEDGE_ROUTES = [route.strip() for route in os.getenv("LLM_HEDGE_ROUTES", "").split(",") if route.strip()]  # 启用对冲的功能，如 评价,朋友圈,翻译
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "90"))  # 首次请求超过该分位数耗时后发出对冲请求
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))  # 对冲等待时间的下限（秒）
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))  # 对冲请求占总请求数的上限
+LLM_HEDGE_MEASURE_RATE = float(os.getenv("LLM_HEDGE_MEASURE_RATE", "0.05"))  # 对冲成功后仍等待首次请求完成以评估p99改善的抽样比例
+
+# 各功能的生成预算，默认值见routers/chatwithdeepseek.py中的DEFAULT_GENERATION_PROFILES
+LLM_PROFILES = os.getenv("LLM_PROFILES", "")  # 覆盖默认预算，如 评价:max_tokens=120,target_p95=4，由llm_router.parse_profiles解析
+LLM_DEFAULT_MAX_TOKENS = int(os.getenv("LLM_DEFAULT_MAX_TOKENS", "2048"))  # 未配置预算的功能的最大输出token数
 
 # 语音识别服务配置
 SPEECH_API_KEY = os.getenv("SPEECH_API_KEY", "")
@@ -56,10 +101,79 @@ UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
 MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(10 * 1024 * 1024)))
 ALLOWED_AUDIO_FORMATS = os.getenv("ALLOWED_AUDIO_FORMATS", "audio/mp3,audio/wav,audio/x-m4a").split(",")
 
+# 用户信息缓存配置（进程内缓存，多进程部署时其他进程最长在TTL后看到设置变更）
+USER_INFO_CACHE_SIZE = int(os.getenv("USER_INFO_CACHE_SIZE", "10000"))  # 缓存的用户数
+USER_INFO_CACHE_TTL = int(os.getenv("USER_INFO_CACHE_TTL", "300"))  # 缓存有效期（秒）
+
+# 批量生成配置
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "10"))  # 单次批量请求最多条目数
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "4"))  # 同一批次内并发调用DeepSeek的上限
+
+# WebSocket聊天连接配置
+WS_MAX_INFLIGHT = int(os.getenv("WS_MAX_INFLIGHT", "4"))  # 同一连接最多同时处理的请求数
+WS_SEND_QUEUE = int(os.getenv("WS_SEND_QUEUE", "32"))  # 每个连接最多排队待发送的消息数
+WS_AUTH_TIMEOUT = float(os.getenv("WS_AUTH_TIMEOUT", "10"))  # 连接后等待认证消息的时间（秒）
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "300"))  # 连接空闲超过该时间（秒）后关闭，0表示不限制
+
+# 聊天记录搜索配置
+CHAT_SEARCH_FULLTEXT = os.getenv("CHAT_SEARCH_FULLTEXT", "True").lower() == "true"  # MySQL下是否使用FULLTEXT索引，分区表需关闭
+CHAT_SEARCH_COMPRESSED_SCAN = int(os.getenv("CHAT_SEARCH_COMPRESSED_SCAN", "2000"))  # 每次搜索最多解压匹配的压缩消息数（按时间从新到旧）
+
+# 消息内容压缩配置
+MESSAGE_COMPRESSION_ENABLED = os.getenv("MESSAGE_COMPRESSION_ENABLED", "False").lower() == "true"  # 是否压缩长消息
+MESSAGE_COMPRESSION_THRESHOLD = int(os.getenv("MESSAGE_COMPRESSION_THRESHOLD", "1024"))  # 超过该字符数时压缩
+MESSAGE_COMPRESSION_LEVEL = int(os.getenv("MESSAGE_COMPRESSION_LEVEL", "6"))  # zlib压缩级别1-9
+
+# 聊天记录保留与归档配置
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "0"))  # 会话保留天数，超过后归档删除，0表示不启用
+RETENTION_INTERVAL_SECONDS = int(os.getenv("RETENTION_INTERVAL_SECONDS", str(6 * 60 * 60)))  # 归档任务执行间隔
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "200"))  # 每个归档文件包含的会话数
+RETENTION_DELETE_CHUNK = int(os.getenv("RETENTION_DELETE_CHUNK", "500"))  # 每个删除事务处理的行数
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archives")  # 归档文件目录
+
+# 生成图片结果存储配置
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", os.path.join(UPLOAD_DIR, "images"))
+IMAGE_STORE_MAX_BYTES = int(os.getenv("IMAGE_STORE_MAX_BYTES", str(512 * 1024 * 1024)))  # 默认最多占用512MB磁盘
+
+# 幂等请求配置，请求头Idempotency-Key相同的重复请求返回第一次的结果
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))  # 处理结果的保存时间（秒）
+IDEMPOTENCY_PROCESSING_TIMEOUT = int(os.getenv("IDEMPOTENCY_PROCESSING_TIMEOUT", "900"))  # 处理中的记录超过该时间（秒）视为处理进程已退出
+IDEMPOTENCY_MAX_RESPONSE_BYTES = int(os.getenv("IDEMPOTENCY_MAX_RESPONSE_BYTES", str(256 * 1024)))  # 超过该大小的结果不保存
+IDEMPOTENCY_PURGE_SECONDS = int(os.getenv("IDEMPOTENCY_PURGE_SECONDS", "3600"))  # 清理过期记录的间隔（秒）
+
+# 事务性发件箱配置，聊天消息写入时在同一事务中记录事件，由后台任务批量发布给下游
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "False").lower() == "true"  # 事件包含消息原文，默认不开启
+OUTBOX_SINK = os.getenv("OUTBOX_SINK", "ndjson")  # 事件接收端：ndjson（按天写入文件）或memory（进程内队列，用于测试）
+OUTBOX_DIR = os.getenv("OUTBOX_DIR", "outbox")  # ndjson接收端的文件目录
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))  # 每批发布的事件数
+OUTBOX_RELAY_INTERVAL = float(os.getenv("OUTBOX_RELAY_INTERVAL", "1"))  # 没有积压时检查新事件的间隔（秒）
+OUTBOX_RETENTION_HOURS = int(os.getenv("OUTBOX_RETENTION_HOURS", "72"))  # 已发布事件在表中的保留时间（小时）
+OUTBOX_PURGE_SECONDS = int(os.getenv("OUTBOX_PURGE_SECONDS", "3600"))  # 清理已发布事件的间隔（秒）
+OUTBOX_FILE_RETENTION_DAYS = int(os.getenv("OUTBOX_FILE_RETENTION_DAYS", "7"))  # ndjson事件文件的保留天数，0表示不清理
+
 # 应用配置
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", "8000"))
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "600"))  # 请求截止时间（秒），传递给所有上游调用，0表示不限制
+
+# 运行指标接口访问令牌，未设置时指标接口只在调试模式下开放
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# 请求剖析配置，需要安装可选依赖pyinstrument；关闭时不加载剖析中间件
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "False").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # 自动抽样剖析的请求比例，0表示只剖析带X-Profile请求头的请求
+PROFILE_PATHS = [p.strip() for p in os.getenv("PROFILE_PATHS", "/chat/chatAi").split(",") if p.strip()]  # 参与抽样的路径前缀
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))  # 采样间隔（秒）
+PROFILE_MAX_REPORTS = int(os.getenv("PROFILE_MAX_REPORTS", "50"))  # 内存中保留的报告数
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))  # 同时剖析的请求数上限
+
+# 事件循环阻塞检测配置
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "True").lower() == "true"
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))  # 测量事件循环延迟的间隔（秒）
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))  # 延迟超过该值（秒）时记录阻塞事件循环的调用栈
+LOOP_BLOCK_MAX_EVENTS = int(os.getenv("LOOP_BLOCK_MAX_EVENTS", "50"))  # 保留的阻塞记录数
+LOOP_MONITOR_STRICT = os.getenv("LOOP_MONITOR_STRICT", "False").lower() == "true"  # 严格模式，应用关闭时有阻塞记录则抛出异常，用于测试
 
 # API文档配置
 API_TITLE = os.getenv("API_TITLE", "AI聊天助手API")
@@ -1,16 +1,84 @@
 # 导入必要的模块
-from sqlalchemy import create_engine
+import contextvars  # 当前请求的用户
+import itertools  # 只读副本轮询
+from sqlalchemy import create_engine, event, Insert, Update, Delete
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
 
 # 导入配置
-from config import DATABASE_URL
+from config import DATABASE_URL, DATABASE_REPLICA_URLS, READ_YOUR_WRITES_SECONDS
+from cache import TTLCache  # 最近写入过的用户
 
 # 创建数据库引擎和会话
 engine = create_engine(DATABASE_URL)  # 创建SQLAlchemy引擎实例
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)  # 创建会话工厂
 Base = declarative_base()  # 创建模型基类
 
+# 只读副本引擎，未配置时读请求也走主库
+replica_engines = [create_engine(url, pool_pre_ping=True) for url in DATABASE_REPLICA_URLS]
+_replica_cycle = itertools.cycle(replica_engines)
+
+# 当前请求的用户ID，由get_current_user设置，用于读己之写判断
+current_user_id = contextvars.ContextVar("current_user_id", default=None)
+
+# 最近在主库写入过数据的用户，窗口期内的读请求继续走主库，避免读到复制延迟前的旧数据
+# 只在当前进程内有效，多进程部署时应让同一用户的请求落到同一进程，或适当调大窗口期
+recent_writers = TTLCache(maxsize=100000, ttl=READ_YOUR_WRITES_SECONDS)
+
+
+def mark_user_write(user_id: str):
+    """记录用户刚在主库写入过数据"""
+    if user_id and READ_YOUR_WRITES_SECONDS > 0:
+        recent_writers.set(user_id, True)
+
+
+def should_read_primary(user_id: str = None) -> bool:
+    """判断读请求是否必须走主库"""
+    if not replica_engines:
+        return True
+    user_id = user_id or current_user_id.get()
+    return bool(user_id) and recent_writers.get(user_id, False)
+
+
+class RoutingSession(Session):
+    """读写分离会话
+
+    查询发往只读副本，flush和INSERT/UPDATE/DELETE语句发往主库。
+    会话一旦写入过数据，后续的查询（包括refresh）也都走主库，保证同一会话内读到自己的写入。
+    同一个会话内的查询固定使用同一个副本
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if (self._flushing or isinstance(clause, (Insert, Update, Delete))
+                or self.info.get("wrote") or should_read_primary()):
+            return engine
+        replica = self.info.get("replica")
+        if replica is None:
+            replica = self.info["replica"] = next(_replica_cycle)
+        return replica
+
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, class_=RoutingSession)  # 只读会话工厂
+
+
+@event.listens_for(Session, "after_flush")
+def _record_write(session, flush_context):
+    """会话写入过数据时做标记，提交后记录当前用户"""
+    session.info["wrote"] = True
+    session.info["pending_write"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_writer(session):
+    if session.info.pop("pending_write", False):
+        mark_user_write(current_user_id.get())
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_write(session):
+    session.info.pop("pending_write", None)
+
+
 # 依赖项：获取数据库会话
 def get_db():
     """创建数据库会话依赖项
@@ -25,4 +93,21 @@ def get_db():
     try:
         yield db  # 返回数据库会话
     finally:
-        db.close()  # 请求结束后关闭会话
\ No newline at end of file
+        db.close()  # 请求结束后关闭会话
+
+
+# 依赖项：获取只读数据库会话
+def get_read_db():
+    """创建读写分离的数据库会话依赖项
+
+    用于以读为主的接口，查询走只读副本，写入仍然走主库；
+    当前用户刚写入过数据时查询也走主库
+
+    Returns:
+        Session: SQLAlchemy数据库会话
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,155 @@
+# 请求截止时间与取消
+import asyncio  # 异步任务管理
+import threading  # 跨线程的取消标记
+import time  # 单调时钟
+from contextvars import ContextVar  # 请求级上下文变量
+from typing import Optional  # 类型提示
+
+from config import REQUEST_TIMEOUT  # 默认请求截止时间
+
+# 当前请求的截止时间（time.monotonic()时间戳），None表示不限制
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+# 当前请求的取消标记，客户端断开或超过截止时间时置位，供线程池中的同步调用检查
+request_cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("request_cancel_event", default=None)
+
+
+class LinkedCancelEvent(threading.Event):
+    """可以单独置位的子取消标记，父标记置位时同样视为已取消
+
+    用于请求内派生的推测执行：主路径成功后只取消推测的调用，客户端断开时两者一起取消
+    """
+
+    def __init__(self, parent: Optional[threading.Event] = None):
+        super().__init__()
+        self.parent = parent
+
+    def is_set(self) -> bool:
+        return super().is_set() or (self.parent is not None and self.parent.is_set())
+
+
+class DeadlineExceeded(Exception):
+    """请求超过截止时间"""
+
+
+class ClientDisconnected(Exception):
+    """客户端已断开连接"""
+
+
+def remaining(default: float, minimum: float = 1.0) -> float:
+    """计算上游调用可用的超时时间
+
+    取默认超时和请求剩余时间中的较小值，不小于minimum，
+    超时后由run_until_disconnect负责取消调用
+
+    Args:
+        default: 上游调用自身的默认超时（秒）
+        minimum: 最小超时（秒）
+
+    Returns:
+        float: 本次上游调用应使用的超时时间（秒）
+    """
+    deadline = request_deadline.get()
+    if deadline is None:
+        return default
+    return max(minimum, min(default, deadline - time.monotonic()))
+
+
+def is_cancelled() -> bool:
+    """当前请求是否已被取消或超过截止时间"""
+    event = request_cancel_event.get()
+    if event is not None and event.is_set():
+        return True
+    deadline = request_deadline.get()
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def wait_or_cancelled(seconds: float) -> bool:
+    """等待指定时间，请求被取消时提前返回
+
+    用于替代重试间隔中的time.sleep
+
+    Returns:
+        bool: 请求是否已被取消
+    """
+    event = request_cancel_event.get()
+    if event is None:
+        time.sleep(seconds)
+    else:
+        event.wait(seconds)
+    return is_cancelled()
+
+
+async def run_until_disconnect(request, awaitable, poll_interval: float = 0.5):
+    """执行上游调用，客户端断开或超过截止时间时取消
+
+    取消异步任务会关闭与上游的连接，支持的服务商会随之停止生成；
+    线程池中的同步调用无法被强制中断，会通过取消标记在下一次检查时退出
+
+    Args:
+        request: 当前请求对象，用于检测客户端是否断开
+        awaitable: 要执行的协程或可等待对象
+        poll_interval: 检测客户端断开的间隔（秒）
+
+    Returns:
+        上游调用的返回值
+
+    Raises:
+        ClientDisconnected: 客户端已断开
+        DeadlineExceeded: 超过请求截止时间
+    """
+    task = asyncio.ensure_future(awaitable)
+    deadline = request_deadline.get()
+    event = request_cancel_event.get()
+    try:
+        while True:
+            timeout = poll_interval
+            if deadline is not None:
+                timeout = min(timeout, max(0.0, deadline - time.monotonic()))
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+            if done:
+                return task.result()
+            if deadline is not None and time.monotonic() >= deadline:
+                raise DeadlineExceeded("请求超过截止时间")
+            if await request.is_disconnected():
+                raise ClientDisconnected("客户端已断开连接")
+    finally:
+        if not task.done():
+            if event is not None:
+                event.set()  # 通知线程池中的同步调用停止重试
+            task.cancel()
+
+
+class DeadlineMiddleware:
+    """为每个请求设置截止时间和取消标记
+
+    截止时间取REQUEST_TIMEOUT与请求头X-Request-Timeout（秒）中的较小值，
+    客户端只能缩短截止时间，不能延长；REQUEST_TIMEOUT为0表示默认不限制
+    """
+
+    def __init__(self, app, default_timeout: float = REQUEST_TIMEOUT):
+        self.app = app
+        self.default_timeout = default_timeout
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timeout = self.default_timeout
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-timeout":
+                try:
+                    client_timeout = float(value)
+                except ValueError:
+                    break  # 忽略无法解析的请求头
+                if client_timeout > 0:
+                    timeout = min(timeout, client_timeout) if timeout > 0 else client_timeout
+                break
+
+        deadline_token = request_deadline.set(time.monotonic() + timeout if timeout > 0 else None)
+        cancel_token = request_cancel_event.set(threading.Event())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_cancel_event.reset(cancel_token)
+            request_deadline.reset(deadline_token)
@@ -0,0 +1,233 @@
+# 幂等请求
+import asyncio  # 进行中的处理任务
+import contextvars  # 处理任务使用独立的请求上下文
+import hashlib  # 键和请求参数摘要
+import threading  # 处理任务的取消标记
+import time  # 截止时间
+from datetime import datetime, timedelta  # 过期时间
+from typing import Optional  # 类型提示
+
+import orjson  # 结果序列化
+from fastapi import HTTPException  # 请求错误
+from fastapi.concurrency import run_in_threadpool  # 在线程池中执行数据库操作
+from sqlalchemy import delete  # 批量删除
+from sqlalchemy.exc import IntegrityError  # 并发插入相同的键
+
+# 导入项目内部模块
+from config import (
+    IDEMPOTENCY_TTL, IDEMPOTENCY_PROCESSING_TIMEOUT, IDEMPOTENCY_MAX_RESPONSE_BYTES,
+    IDEMPOTENCY_PURGE_SECONDS, REQUEST_TIMEOUT
+)
+from database import SessionLocal  # 数据库会话工厂
+from deadline import request_deadline, request_cancel_event  # 请求截止时间与取消
+from models import IdempotencyRecord  # 数据模型
+
+# 幂等键的最大长度
+MAX_KEY_LENGTH = 128
+
+
+def fingerprint(params) -> str:
+    """请求参数的摘要，参数需要可以JSON序列化"""
+    return hashlib.sha256(orjson.dumps(params, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def anonymous_scope(device_id: Optional[str] = None) -> str:
+    """不需要登录的接口使用的幂等键作用域，代替用户ID
+
+    不按客户端地址区分：手机在Wi-Fi和4G之间切换后地址会变，重试仍需接上之前的处理。
+    客户端提供设备ID时按设备区分，否则所有匿名请求共用一个作用域，只按接口和键区分，
+    键用于参数不同的请求时返回422，不会拿到其他请求的结果
+    """
+    if not device_id:
+        return "anon"
+    return "anon:" + hashlib.sha256(device_id.encode()).hexdigest()[:31]
+
+
+class IdempotencyStore:
+    """按Idempotency-Key去重的请求处理
+
+    第一次请求在数据库中写入处理中的记录并执行处理，完成后保存结果，有效期IDEMPOTENCY_TTL秒。
+    相同键的重复请求：
+    - 同一进程内正在处理时，等待同一个处理任务的结果，不重复执行
+    - 已完成时，直接返回保存的结果
+    - 其他进程正在处理时，返回409，客户端稍后重试即可拿到结果
+    处理任务不随发起请求的连接断开而取消，客户端断网后重试可以接上进行中的处理；
+    处理出错时删除记录，重试会重新执行。结果超过IDEMPOTENCY_MAX_RESPONSE_BYTES时不保存
+
+    Attributes:
+        ttl: 记录有效期（秒）
+        processing_timeout: 处理中的记录超过该时间（秒）视为处理进程已退出，允许重新处理
+        replays: 返回已保存结果的次数
+        attaches: 等待进行中处理任务的次数
+        conflicts: 因其他进程正在处理返回409的次数
+    """
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, processing_timeout: float = IDEMPOTENCY_PROCESSING_TIMEOUT,
+                 max_response_bytes: int = IDEMPOTENCY_MAX_RESPONSE_BYTES):
+        self.ttl = ttl
+        self.processing_timeout = processing_timeout
+        self.max_response_bytes = max_response_bytes
+        self._inflight = {}  # 记录ID -> 处理任务
+        self.executions = 0
+        self.replays = 0
+        self.attaches = 0
+        self.conflicts = 0
+
+    @staticmethod
+    def record_id(user_id: str, endpoint: str, key: str) -> str:
+        return hashlib.sha256(f"{user_id}\x1f{endpoint}\x1f{key}".encode()).hexdigest()
+
+    async def execute(self, key: str, user_id: str, endpoint: str, params, work) -> tuple:
+        """按幂等键执行处理
+
+        Args:
+            key: 请求头Idempotency-Key的值
+            user_id: 当前用户ID，不同用户的键互不影响
+            endpoint: 接口名称
+            params: 请求参数，同一个键用于不同参数时返回422
+            work: 无参数的异步函数，返回可以JSON序列化的结果
+
+        Returns:
+            tuple: (结果, 是否为重复请求)
+
+        Raises:
+            HTTPException: 键格式无效、键已用于其他参数或其他进程正在处理时抛出
+        """
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key长度应为1到{MAX_KEY_LENGTH}个字符")
+        record_id = self.record_id(user_id, endpoint, key)
+        request_fingerprint = fingerprint(params)
+
+        task = self._inflight.get(record_id)
+        if task is None:
+            task = self._start(record_id, user_id, endpoint, request_fingerprint, work)
+            return await asyncio.shield(task)
+        if task.fingerprint != request_fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key已用于参数不同的请求")
+        self.attaches += 1
+        result, _ = await asyncio.shield(task)
+        return result, True
+
+    def _start(self, record_id: str, user_id: str, endpoint: str, request_fingerprint: str, work) -> asyncio.Task:
+        """启动处理任务，任务使用独立的截止时间和取消标记，不受发起请求的连接断开影响"""
+        context = contextvars.copy_context()
+        context.run(request_deadline.set, time.monotonic() + REQUEST_TIMEOUT if REQUEST_TIMEOUT > 0 else None)
+        context.run(request_cancel_event.set, threading.Event())
+        task = asyncio.create_task(self._run(record_id, user_id, endpoint, request_fingerprint, work), context=context)
+        task.fingerprint = request_fingerprint
+        self._inflight[record_id] = task
+        return task
+
+    async def _run(self, record_id: str, user_id: str, endpoint: str, request_fingerprint: str, work) -> tuple:
+        try:
+            stored = await run_in_threadpool(self._claim, record_id, user_id, endpoint, request_fingerprint)
+            if stored is not None:
+                self.replays += 1
+                return orjson.loads(stored), True
+            self.executions += 1
+            try:
+                result = await work()
+            except BaseException:
+                await run_in_threadpool(self._delete, record_id)  # 处理失败，重试时重新执行
+                raise
+            await run_in_threadpool(self._complete, record_id, orjson.dumps(result).decode())
+            return result, False
+        finally:
+            self._inflight.pop(record_id, None)
+
+    def _claim(self, record_id: str, user_id: str, endpoint: str, request_fingerprint: str):
+        """写入处理中的记录，已有完成的记录时返回保存的结果
+
+        Raises:
+            HTTPException: 键已用于其他参数（422）或其他进程正在处理（409）
+        """
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            for _ in range(2):
+                record = db.get(IdempotencyRecord, record_id)
+                if record is not None and record.expires_at > now:
+                    if record.fingerprint != request_fingerprint:
+                        raise HTTPException(status_code=422, detail="Idempotency-Key已用于参数不同的请求")
+                    if record.status == "completed":
+                        return record.response
+                    if record.created_at > now - timedelta(seconds=self.processing_timeout):
+                        self.conflicts += 1
+                        raise HTTPException(status_code=409, detail="相同Idempotency-Key的请求正在处理中，请稍后重试",
+                                            headers={"Retry-After": "2"})
+                if record is not None:
+                    db.delete(record)  # 已过期，或处理进程已退出
+                    db.flush()
+                db.add(IdempotencyRecord(
+                    id=record_id, user_id=user_id, endpoint=endpoint, fingerprint=request_fingerprint,
+                    status="processing", created_at=now, expires_at=now + timedelta(seconds=self.ttl)
+                ))
+                try:
+                    db.commit()
+                    return None
+                except IntegrityError:
+                    db.rollback()  # 其他进程同时写入了相同的键，重新读取
+            raise HTTPException(status_code=409, detail="相同Idempotency-Key的请求正在处理中，请稍后重试",
+                                headers={"Retry-After": "2"})
+        finally:
+            db.close()
+
+    def _complete(self, record_id: str, response: str):
+        db = SessionLocal()
+        try:
+            record = db.get(IdempotencyRecord, record_id)
+            if record is None:
+                return
+            if len(response.encode()) > self.max_response_bytes:
+                db.delete(record)  # 结果过大不保存，之后相同的请求会重新执行
+            else:
+                record.status = "completed"
+                record.response = response
+            db.commit()
+        finally:
+            db.close()
+
+    def _delete(self, record_id: str):
+        db = SessionLocal()
+        try:
+            db.execute(delete(IdempotencyRecord).where(IdempotencyRecord.id == record_id))
+            db.commit()
+        finally:
+            db.close()
+
+    def purge_expired(self) -> int:
+        """删除已过期的记录"""
+        db = SessionLocal()
+        try:
+            deleted = db.execute(
+                delete(IdempotencyRecord).where(IdempotencyRecord.expires_at <= datetime.utcnow())).rowcount
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            "inflight": len(self._inflight),
+            "executions": self.executions,
+            "replays": self.replays,
+            "attaches": self.attaches,
+            "conflicts": self.conflicts,
+        }
+
+
+# 全局的幂等请求处理
+idempotency_store = IdempotencyStore()
+
+
+async def run_idempotency_purge_loop():
+    """后台定时清理过期的幂等请求记录"""
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_PURGE_SECONDS)
+        try:
+            # 在线程池中执行同步数据库操作，避免阻塞事件循环
+            deleted = await asyncio.to_thread(idempotency_store.purge_expired)
+            if deleted:
+                print(f"已清理 {deleted} 条过期的幂等请求记录")
+        except Exception as e:
+            print(f"幂等请求记录清理失败: {str(e)}")
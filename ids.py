@@ -0,0 +1,55 @@
+# 按时间排序的主键生成
+import os  # 随机数
+import threading  # 保证同一毫秒内单调递增
+import time  # 时间戳
+import uuid  # UUID类型
+from datetime import datetime, timezone  # 日期时间处理
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def _build_uuid7(ms: int, rand_a: int, rand_b: int) -> uuid.UUID:
+    """按RFC 9562的布局组装UUIDv7：48位毫秒时间戳 + 版本 + 12位rand_a + 变体 + 62位rand_b"""
+    value = (ms & 0xFFFFFFFFFFFF) << 80
+    value |= 0x7 << 76  # 版本号7
+    value |= (rand_a & 0xFFF) << 64
+    value |= 0x2 << 62  # RFC 4122变体
+    value |= rand_b & 0x3FFFFFFFFFFFFFFF
+    return uuid.UUID(int=value)
+
+
+def uuid7() -> uuid.UUID:
+    """生成UUIDv7
+
+    高位是毫秒时间戳，新生成的ID总是大于之前的ID，InnoDB聚簇索引按顺序追加写入，
+    避免uuid4随机插入导致的页分裂。同一毫秒内用rand_a作为计数器保证单调递增
+    """
+    global _last_ms, _counter
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            _last_ms = ms
+            _counter = int.from_bytes(os.urandom(2), "big") & 0x7FF  # 随机起点，留出递增空间
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                # 同一毫秒内计数器用尽，借用下一毫秒
+                _last_ms += 1
+                _counter = 0
+            ms = _last_ms
+        return _build_uuid7(ms, _counter, int.from_bytes(os.urandom(8), "big"))
+
+
+def uuid7_from_datetime(value: datetime) -> uuid.UUID:
+    """根据已有记录的创建时间生成UUIDv7，用于存量数据迁移，保持与创建时间一致的顺序"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)  # 数据库中的时间均为UTC
+    ms = int(value.timestamp() * 1000)
+    return _build_uuid7(ms, int.from_bytes(os.urandom(2), "big"), int.from_bytes(os.urandom(8), "big"))
+
+
+def new_id() -> str:
+    """生成字符串形式的主键，作为模型id列的默认值"""
+    return str(uuid7())
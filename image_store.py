@@ -0,0 +1,137 @@
+# 生成图片结果存储
+import hashlib  # 计算内容摘要
+import os  # 文件路径处理
+import threading  # 淘汰过程加锁
+from datetime import datetime  # 日期时间处理
+from typing import Optional  # 类型提示
+
+from sqlalchemy import func  # SQL聚合函数
+
+# 导入项目内部模块
+from config import IMAGE_STORE_DIR, IMAGE_STORE_MAX_BYTES  # 存储配置
+from database import SessionLocal  # 数据库会话工厂
+from models import GeneratedImage  # 数据模型
+
+
+class ImageStore:
+    """按内容寻址的生成图片结果存储
+
+    以(提示词, 尺寸, 模型)的摘要为键，把图片API的响应保存到本地磁盘，
+    元数据保存在generated_images表中。总占用超过上限时按最近访问时间淘汰
+
+    Attributes:
+        root: 结果文件存储目录
+        max_bytes: 最大磁盘占用（字节）
+    """
+
+    def __init__(self, root: str = IMAGE_STORE_DIR, max_bytes: int = IMAGE_STORE_MAX_BYTES, session_factory=SessionLocal):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.session_factory = session_factory
+        self._evict_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(prompt: str, size: str, model: str) -> str:
+        """计算结果的内容地址"""
+        raw = "\x1f".join([prompt.strip(), size, model])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _relative_path(self, key: str) -> str:
+        # 按摘要前两位分目录，避免单个目录文件过多
+        return os.path.join(key[:2], f"{key}.json")
+
+    def path_for(self, key: str) -> str:
+        """返回结果文件的绝对路径"""
+        return os.path.join(self.root, self._relative_path(key))
+
+    def get(self, key: str) -> Optional[str]:
+        """读取已存储的结果，命中时更新访问时间
+
+        Returns:
+            str: 图片API的响应JSON字符串，不存在时返回None
+        """
+        db = self.session_factory()
+        try:
+            record = db.query(GeneratedImage).filter(GeneratedImage.id == key).first()
+            if not record:
+                return None
+            path = os.path.join(self.root, record.file_path)
+            if not os.path.exists(path):
+                # 文件已丢失，删除失效的元数据
+                db.delete(record)
+                db.commit()
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                body = f.read()
+            record.hit_count = (record.hit_count or 0) + 1
+            record.last_accessed_at = datetime.utcnow()
+            db.commit()
+            return body
+        finally:
+            db.close()
+
+    def put(self, key: str, prompt: str, size: str, model: str, body: str):
+        """保存图片API的响应，并在超出磁盘上限时淘汰旧结果"""
+        relative_path = self._relative_path(key)
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再替换，避免并发读取到写了一半的文件
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        size_bytes = os.path.getsize(path)
+
+        db = self.session_factory()
+        try:
+            record = db.query(GeneratedImage).filter(GeneratedImage.id == key).first()
+            if record:
+                record.size_bytes = size_bytes
+                record.last_accessed_at = datetime.utcnow()
+            else:
+                db.add(GeneratedImage(
+                    id=key,
+                    prompt=prompt,
+                    size=size,
+                    model=model,
+                    file_path=relative_path,
+                    size_bytes=size_bytes
+                ))
+            db.commit()
+            self._evict(db)
+        finally:
+            db.close()
+
+    def _evict(self, db, batch_size: int = 100):
+        """淘汰最近最少访问的结果，直到总占用不超过上限"""
+        with self._evict_lock:
+            total = db.query(func.coalesce(func.sum(GeneratedImage.size_bytes), 0)).scalar()
+            while total > self.max_bytes:
+                oldest = db.query(GeneratedImage).order_by(GeneratedImage.last_accessed_at.asc()).limit(batch_size).all()
+                if not oldest:
+                    break
+                for record in oldest:
+                    if total <= self.max_bytes:
+                        break
+                    path = os.path.join(self.root, record.file_path)
+                    if os.path.exists(path):
+                        os.remove(path)
+                    total -= record.size_bytes or 0
+                    db.delete(record)
+                db.commit()
+
+    def stats(self) -> dict:
+        """返回存储统计信息"""
+        db = self.session_factory()
+        try:
+            count, total = db.query(
+                func.count(GeneratedImage.id),
+                func.coalesce(func.sum(GeneratedImage.size_bytes), 0)
+            ).one()
+            return {"count": count, "bytes": int(total), "maxBytes": self.max_bytes}
+        finally:
+            db.close()
+
+
+# 全局结果存储实例
+image_store = ImageStore()
@@ -8,7 +8,7 @@ USE ai_assistant;
 
 -- 创建用户表
 CREATE TABLE IF NOT EXISTS users (
-    id VARCHAR(36) PRIMARY KEY COMMENT '用户唯一标识，UUID格式',
+    id VARCHAR(36) PRIMARY KEY COMMENT '用户唯一标识，UUIDv7格式',
     openid VARCHAR(100) NOT NULL UNIQUE COMMENT '微信用户唯一标识',
     nick_name VARCHAR(100) COMMENT '用户昵称',
     avatar VARCHAR(255) COMMENT '用户头像URL',
@@ -18,7 +18,7 @@ CREATE TABLE IF NOT EXISTS users (
 
 -- 创建用户设置表
 CREATE TABLE IF NOT EXISTS user_settings (
-    id VARCHAR(36) PRIMARY KEY COMMENT '设置唯一标识，UUID格式',
+    id VARCHAR(36) PRIMARY KEY COMMENT '设置唯一标识，UUIDv7格式',
     user_id VARCHAR(36) NOT NULL COMMENT '关联的用户ID',
     is_dark_mode BOOLEAN DEFAULT FALSE COMMENT '是否启用深色模式',
     auto_read BOOLEAN DEFAULT FALSE COMMENT '是否启用自动朗读',
@@ -30,7 +30,7 @@ CREATE TABLE IF NOT EXISTS user_settings (
 
 -- 创建聊天会话表
 CREATE TABLE IF NOT EXISTS chat_sessions (
-    id VARCHAR(36) PRIMARY KEY COMMENT '会话唯一标识，UUID格式',
+    id VARCHAR(36) PRIMARY KEY COMMENT '会话唯一标识，UUIDv7格式',
     user_id VARCHAR(36) NOT NULL COMMENT '关联的用户ID',
     title VARCHAR(255) DEFAULT '新会话' COMMENT '会话标题',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
@@ -40,18 +40,85 @@ CREATE TABLE IF NOT EXISTS chat_sessions (
 
 -- 创建聊天消息表
 CREATE TABLE IF NOT EXISTS chat_messages (
-    id VARCHAR(36) PRIMARY KEY COMMENT '消息唯一标识，UUID格式',
+    id VARCHAR(36) PRIMARY KEY COMMENT '消息唯一标识，UUIDv7格式',
     session_id VARCHAR(36) NOT NULL COMMENT '关联的会话ID',
     is_user BOOLEAN DEFAULT TRUE COMMENT '消息类型：TRUE表示用户消息，FALSE表示AI回复',
-    content TEXT NOT NULL COMMENT '消息内容',
+    content TEXT NOT NULL COMMENT '消息内容，超过阈值时压缩存储',
+    is_compressed BOOLEAN NOT NULL DEFAULT FALSE COMMENT '消息内容是否为压缩存储',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
-    INDEX idx_session_id (session_id) COMMENT '会话ID索引'
+    INDEX idx_session_id (session_id) COMMENT '会话ID索引',
+    FULLTEXT INDEX ft_content (content) WITH PARSER ngram COMMENT '消息内容全文索引，ngram分词支持中文'
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='聊天消息表';
 
+-- 已有数据库升级：为聊天消息添加全文索引（ngram分词长度由ngram_token_size控制，默认2）
+-- ALTER TABLE chat_messages ADD FULLTEXT INDEX ft_content (content) WITH PARSER ngram;
+
+-- 可选：chat_messages按月分区（使用 scripts/migrate_ids.py partition 执行）
+-- 注意：分区表不支持FULLTEXT索引，启用分区需先删除ft_content，并设置CHAT_SEARCH_FULLTEXT=False
+-- ALTER TABLE chat_messages DROP INDEX ft_content;
+-- ALTER TABLE chat_messages MODIFY created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+--     DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at);
+-- ALTER TABLE chat_messages PARTITION BY RANGE (TO_DAYS(created_at)) (
+--     PARTITION p202610 VALUES LESS THAN (TO_DAYS('2026-11-01')),
+--     PARTITION pmax VALUES LESS THAN MAXVALUE
+-- );
+
+-- 已有数据库升级：添加消息压缩标记，存量数据使用 scripts/compress_messages.py 分批压缩
+-- ALTER TABLE chat_messages ADD COLUMN is_compressed BOOLEAN NOT NULL DEFAULT FALSE COMMENT '消息内容是否为压缩存储' AFTER content;
+
+-- 创建生成图片结果表
+CREATE TABLE IF NOT EXISTS generated_images (
+    id VARCHAR(64) PRIMARY KEY COMMENT '结果唯一标识，(提示词, 尺寸, 模型)的SHA-256摘要',
+    prompt TEXT NOT NULL COMMENT '发送给图片API的提示词',
+    size VARCHAR(20) NOT NULL COMMENT '图片尺寸',
+    model VARCHAR(50) NOT NULL COMMENT '图片模型',
+    file_path VARCHAR(255) NOT NULL COMMENT '结果文件相对路径',
+    size_bytes INT DEFAULT 0 COMMENT '结果文件大小（字节）',
+    hit_count INT DEFAULT 0 COMMENT '缓存命中次数',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    last_accessed_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '最近访问时间',
+    INDEX idx_last_accessed_at (last_accessed_at) COMMENT '最近访问时间索引，用于LRU淘汰'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='生成图片结果表';
+
+-- 创建已吊销令牌表
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti VARCHAR(36) PRIMARY KEY COMMENT '令牌唯一标识',
+    user_id VARCHAR(36) NOT NULL COMMENT '令牌所属的用户ID',
+    expires_at DATETIME NOT NULL COMMENT '令牌过期时间，过期后记录被清理',
+    revoked_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '吊销时间',
+    INDEX idx_expires_at (expires_at) COMMENT '过期时间索引，用于清理',
+    INDEX idx_revoked_at (revoked_at) COMMENT '吊销时间索引，用于各进程增量同步'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='已吊销令牌表';
+
+-- 创建幂等请求记录表
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    id VARCHAR(64) PRIMARY KEY COMMENT '(用户ID, 接口, 幂等键)的SHA-256摘要',
+    user_id VARCHAR(36) NOT NULL COMMENT '请求用户ID',
+    endpoint VARCHAR(50) NOT NULL COMMENT '接口名称',
+    fingerprint VARCHAR(64) NOT NULL COMMENT '请求参数的SHA-256摘要',
+    status VARCHAR(20) NOT NULL DEFAULT 'processing' COMMENT '处理状态：processing或completed',
+    response MEDIUMTEXT COMMENT '处理结果的JSON文本',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    expires_at DATETIME NOT NULL COMMENT '过期时间，过期后记录被清理',
+    INDEX idx_expires_at (expires_at) COMMENT '过期时间索引，用于清理'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='幂等请求记录表';
+
+-- 创建事务性发件箱事件表
+CREATE TABLE IF NOT EXISTS outbox_events (
+    id VARCHAR(36) PRIMARY KEY COMMENT '事件唯一标识，UUIDv7格式，按写入顺序递增',
+    event_type VARCHAR(50) NOT NULL COMMENT '事件类型，如message.created',
+    aggregate_id VARCHAR(36) NOT NULL COMMENT '事件所属对象的ID，聊天事件为会话ID',
+    payload MEDIUMTEXT NOT NULL COMMENT '事件内容的JSON文本',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    published_at DATETIME NULL COMMENT '发布时间，未发布时为空',
+    INDEX idx_published_at_id (published_at, id) COMMENT '转发任务按ID顺序读取未发布的事件'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='事务性发件箱事件表';
+
 -- 添加一些说明
 /*
 数据库设计说明：
-1. 所有表使用UUID作为主键，以字符串形式存储
+1. 所有表使用UUIDv7作为主键，以字符串形式存储；UUIDv7高位为毫秒时间戳，
+   新记录按时间顺序追加到聚簇索引末尾，避免随机UUID导致的页分裂
 2. 表之间的逻辑关系（不使用外键约束）：
    - user_settings.user_id -> users.id
    - chat_sessions.user_id -> users.id
@@ -0,0 +1,204 @@
+# 自适应并发限制
+import asyncio  # 异步等待
+import threading  # 线程锁，同步和异步调用共用一个限制器
+import time  # 单调时钟
+from collections import deque  # 等待队列
+from contextlib import asynccontextmanager, contextmanager  # 上下文管理器
+
+
+class LimiterRejected(Exception):
+    """排队等待超过预算或队列已满，请求被快速拒绝"""
+
+
+class _Waiter:
+    """等待中的调用方，granted在锁内置位后由notify唤醒"""
+    __slots__ = ("granted", "notify")
+
+    def __init__(self, notify):
+        self.granted = False
+        self.notify = notify
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveLimiter:
+    """AIMD自适应并发限制器
+
+    调用成功且耗时不超过latency_target时并发上限加性增长（每个上限周期约加1），
+    调用出错或耗时超过latency_target时乘性下降（乘以backoff），
+    上游变慢或限流时自动减少同时发出的请求，恢复后再逐步放开。
+    超过上限的调用按先来先服务排队，排队超过queue_timeout或队列长度超过max_queue时
+    立即抛出LimiterRejected，避免在上游拥塞时继续堆积请求。
+    被取消的调用（客户端断开、超过截止时间）不参与上限调整
+
+    Attributes:
+        name: 限制器名称，用于指标
+        min_limit: 并发上限的下限
+        max_limit: 并发上限的上限
+        latency_target: 期望的单次调用耗时（秒）
+        queue_timeout: 最长排队时间（秒）
+        max_queue: 最多排队的调用数
+        backoff: 乘性下降系数
+    """
+
+    def __init__(self, name: str, initial_limit: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 latency_target: float = 30.0, queue_timeout: float = 5.0, max_queue: int = 200,
+                 backoff: float = 0.9):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.backoff = backoff
+        self._limit = float(max(min_limit, min(max_limit, initial_limit)))
+        self._inflight = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        # 统计信息
+        self.accepted = 0
+        self.rejected = 0
+        self.errors = 0
+        self.slow = 0
+        self.latency_ewma = 0.0
+        self.queue_wait_ewma = 0.0
+
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        return max(self.min_limit, int(self._limit))
+
+    def _try_acquire(self, notify):
+        """有空闲名额时直接占用并返回None，否则加入等待队列并返回等待对象"""
+        with self._lock:
+            if self._inflight < self.limit and not self._waiters:
+                self._inflight += 1
+                self.accepted += 1
+                return None
+            if self.queue_timeout <= 0 or len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise LimiterRejected(f"{self.name}并发已满，排队{len(self._waiters)}个")
+            waiter = _Waiter(notify)
+            self._waiters.append(waiter)
+            return waiter
+
+    def _leave_queue(self, waiter: _Waiter, waited: float) -> bool:
+        """结束等待，返回是否已获得名额；未获得时从队列中移除"""
+        with self._lock:
+            if waiter.granted:
+                self.accepted += 1
+                self.queue_wait_ewma += 0.2 * (waited - self.queue_wait_ewma)
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def _reject(self, waited: float):
+        with self._lock:
+            self.rejected += 1
+        raise LimiterRejected(f"{self.name}排队{waited:.1f}秒仍未获得名额")
+
+    def _drain(self):
+        """把空出的名额交给排队中的调用方，调用方需持有锁"""
+        while self._waiters and self._inflight < self.limit:
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self._inflight += 1
+            waiter.notify()
+
+    def _release(self, latency: float = None, error: bool = False):
+        """释放名额并根据本次调用结果调整并发上限，latency为None表示调用被取消"""
+        with self._lock:
+            if latency is not None:
+                if error or latency > self.latency_target:
+                    self._limit = max(self.min_limit, self._limit * self.backoff)
+                    if error:
+                        self.errors += 1
+                    else:
+                        self.slow += 1
+                elif self._inflight >= self._limit / 2:
+                    # 只有实际用到一半以上名额时才增长，避免空闲时上限无限变大
+                    self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+                if not error:
+                    self.latency_ewma += 0.2 * (latency - self.latency_ewma)
+            self._inflight -= 1
+            self._drain()
+
+    async def acquire(self):
+        """异步获取名额，排队超时抛出LimiterRejected"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = self._try_acquire(lambda: loop.call_soon_threadsafe(_resolve, future))
+        if waiter is None:
+            return
+        start = time.monotonic()
+        try:
+            await asyncio.wait({future}, timeout=self.queue_timeout)
+        except BaseException:
+            # 等待期间被取消，已分到的名额要还回去
+            if self._leave_queue(waiter, time.monotonic() - start):
+                self._release()
+            raise
+        waited = time.monotonic() - start
+        if not self._leave_queue(waiter, waited):
+            self._reject(waited)
+
+    def acquire_sync(self):
+        """同步获取名额，供线程池中的调用使用"""
+        event = threading.Event()
+        waiter = self._try_acquire(event.set)
+        if waiter is None:
+            return
+        start = time.monotonic()
+        event.wait(self.queue_timeout)
+        waited = time.monotonic() - start
+        if not self._leave_queue(waiter, waited):
+            self._reject(waited)
+
+    @asynccontextmanager
+    async def slot(self):
+        """在名额内执行一次异步调用，并用调用结果调整并发上限"""
+        await self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except asyncio.CancelledError:
+            self._release()
+            raise
+        except Exception:
+            self._release(time.monotonic() - start, error=True)
+            raise
+        self._release(time.monotonic() - start)
+
+    @contextmanager
+    def slot_sync(self):
+        """在名额内执行一次同步调用"""
+        self.acquire_sync()
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self._release(time.monotonic() - start, error=True)
+            raise
+        except BaseException:
+            self._release()
+            raise
+        self._release(time.monotonic() - start)
+
+    def stats(self) -> dict:
+        """返回限制器当前状态和统计信息"""
+        with self._lock:
+            return {
+                "name": self.name,
+                "limit": self.limit,
+                "inflight": self._inflight,
+                "queued": len(self._waiters),
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "errors": self.errors,
+                "slow": self.slow,
+                "latencyEwmaSeconds": round(self.latency_ewma, 3),
+                "queueWaitEwmaSeconds": round(self.queue_wait_ewma, 3),
+            }
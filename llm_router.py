@@ -0,0 +1,574 @@
+# 多模型服务路由与故障转移
+import asyncio  # 并发调用与对冲
+import math  # 无完整样本的服务排序
+import random  # 对冲效果抽样
+import threading  # 线程锁
+import time  # 单调时钟
+from collections import deque  # 滚动窗口
+from typing import Callable, Dict, List, Optional  # 类型提示
+
+import httpx  # 连接和读取分别设置的超时
+
+from limiter import AdaptiveLimiter  # 每个服务独立的并发限制
+
+
+class LatencyWindow:
+    """滚动时间窗口内的调用耗时和错误统计
+
+    只保留最近window_seconds秒、最多max_samples个样本，过期样本在读写时清理
+
+    Attributes:
+        window_seconds: 窗口长度（秒）
+        max_samples: 最多保留的样本数
+    """
+
+    def __init__(self, window_seconds: float = 300, max_samples: int = 2000):
+        self.window_seconds = window_seconds
+        self.max_samples = max_samples
+        self._samples = deque()  # (时间戳, 耗时, 是否成功)
+        self._cancelled = deque()  # 被取消的调用的时间戳，只知道耗时的下限，不作为耗时样本
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        while self._samples and (now - self._samples[0][0] > self.window_seconds
+                                 or len(self._samples) > self.max_samples):
+            self._samples.popleft()
+        while self._cancelled and (now - self._cancelled[0] > self.window_seconds
+                                   or len(self._cancelled) > self.max_samples):
+            self._cancelled.popleft()
+
+    def record(self, latency: float, ok: bool):
+        """记录一次调用"""
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, latency, ok))
+            self._trim(now)
+
+    def record_cancelled(self):
+        """记录一次被取消的调用（对冲落败或客户端断开），截断的耗时会拉低p95，只计数"""
+        now = time.monotonic()
+        with self._lock:
+            self._cancelled.append(now)
+            self._trim(now)
+
+    def cancelled(self) -> int:
+        """窗口内被取消的调用数"""
+        with self._lock:
+            self._trim(time.monotonic())
+            return len(self._cancelled)
+
+    def snapshot(self) -> tuple:
+        """返回窗口内成功调用的耗时（升序）和失败次数"""
+        with self._lock:
+            self._trim(time.monotonic())
+            latencies = sorted(latency for _, latency, ok in self._samples if ok)
+            return latencies, len(self._samples) - len(latencies)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """成功调用耗时的q分位数（0-100），没有样本时返回None"""
+        latencies, _ = self.snapshot()
+        return _percentile(latencies, q)
+
+    def error_rate(self) -> float:
+        """窗口内的错误率"""
+        latencies, errors = self.snapshot()
+        total = len(latencies) + errors
+        return errors / total if total else 0.0
+
+    def __len__(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            return len(self._samples)
+
+
+def _percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * q / 100))
+    return sorted_values[index]
+
+
+class GenerationProfile:
+    """一个功能的生成预算，每次调用都按此设置最大输出长度、超时和停止序列
+
+    Attributes:
+        max_tokens: 最大输出token数，None表示不限制
+        connect_timeout: 建立连接的超时（秒）
+        read_timeout: 等待响应的超时（秒），同时不超过请求的剩余时间
+        stop: 停止序列，模型输出这些字符串时立即结束
+        target_p95: 期望的p95耗时（秒），与实际耗时一起输出到运行指标，用于调整预算
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None, connect_timeout: float = 5, read_timeout: float = 120,
+                 stop: List[str] = None, target_p95: Optional[float] = None):
+        self.max_tokens = max_tokens
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.stop = stop or None
+        self.target_p95 = target_p95
+
+    def client_timeout(self, timeout: float) -> httpx.Timeout:
+        """本次调用的HTTP超时，读取超时取预算和调用方给出的剩余时间中的较小值"""
+        read = min(self.read_timeout, timeout) if timeout else self.read_timeout
+        return httpx.Timeout(read, connect=min(self.connect_timeout, read))
+
+    def replace(self, **changes) -> "GenerationProfile":
+        """返回修改了部分字段的副本"""
+        values = dict(vars(self))
+        values.update(changes)
+        return GenerationProfile(**values)
+
+
+class Backend:
+    """一个OpenAI兼容的模型服务
+
+    Attributes:
+        name: 服务名称，用于路由配置和指标
+        factory: 根据(temperature, timeout, profile)创建LangChain聊天模型的函数
+        limiter: 该服务的自适应并发限制器
+        window: 该服务的耗时和错误统计
+    """
+
+    def __init__(self, name: str, factory: Callable, limiter: AdaptiveLimiter, window: LatencyWindow = None):
+        self.name = name
+        self.factory = factory
+        self.limiter = limiter
+        self.window = window or LatencyWindow()
+
+    def create(self, temperature: float, timeout: float, profile: GenerationProfile):
+        """创建本次调用使用的聊天模型，应用功能的生成预算"""
+        return self.factory(temperature, profile.client_timeout(timeout), profile)
+
+    def stats(self, min_samples: int, unhealthy_error_rate: float) -> dict:
+        latencies, errors = self.window.snapshot()
+        total = len(latencies) + errors
+        error_rate = errors / total if total else 0.0
+        return {
+            "name": self.name,
+            "samples": total,
+            "p50Seconds": _round(_percentile(latencies, 50)),
+            "p95Seconds": _round(_percentile(latencies, 95)),
+            "p99Seconds": _round(_percentile(latencies, 99)),
+            "errorRate": round(error_rate, 4),
+            "cancelled": self.window.cancelled(),
+            "healthy": total < min_samples or error_rate < unhealthy_error_rate,
+            "limiter": self.limiter.stats(),
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 3)
+
+
+def prompt_cache_usage(response) -> tuple:
+    """从模型响应中读取(输入token数, 命中前缀缓存的token数)，响应不含用量时返回(0, 0)
+
+    DeepSeek返回usage.prompt_cache_hit_tokens，OpenAI兼容服务返回usage.prompt_tokens_details.cached_tokens
+    """
+    usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    prompt_tokens = usage.get("prompt_tokens")
+    cached_tokens = usage.get("prompt_cache_hit_tokens")
+    if cached_tokens is None:
+        cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    if cached_tokens is None or prompt_tokens is None:
+        usage_metadata = getattr(response, "usage_metadata", None) or {}
+        prompt_tokens = prompt_tokens or usage_metadata.get("input_tokens")
+        if cached_tokens is None:
+            cached_tokens = (usage_metadata.get("input_token_details") or {}).get("cache_read")
+    return prompt_tokens or 0, cached_tokens or 0
+
+
+class RouteStats:
+    """一个路由键的请求和对冲统计
+
+    primary记录首次请求的耗时（被对冲取消时记为已等待的时间），用于计算对冲等待时间；
+    抽样请求在对冲成功后不取消首次请求，等它完成后把两者的耗时成对记入shadow_primary和shadow_actual，
+    用同一批请求比较不对冲和对冲时的p99
+
+    truncated记录因达到最大输出长度而被截断的调用数，timeouts记录超时的调用数，用于调整生成预算；
+    prompt_tokens和cached_tokens累计每次调用的输入token数和命中前缀缓存的token数，
+    单次调用的耗时按是否命中前缀缓存分别记入cache_hit和cache_miss，用于比较命中缓存带来的耗时改善
+
+    Attributes:
+        latency: 实际返回耗时
+        primary: 首次请求耗时
+        shadow_primary: 抽样请求中首次请求的完整耗时
+        shadow_actual: 抽样请求的实际返回耗时
+        cache_hit: 命中前缀缓存的单次调用耗时
+        cache_miss: 未命中前缀缓存的单次调用耗时
+    """
+
+    def __init__(self, window_seconds: float):
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedges_denied = 0
+        self.latency = LatencyWindow(window_seconds)
+        self.primary = LatencyWindow(window_seconds)
+        self.shadow_primary = LatencyWindow(window_seconds)
+        self.shadow_actual = LatencyWindow(window_seconds)
+        self.truncated = 0
+        self.timeouts = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.cache_hit = LatencyWindow(window_seconds)
+        self.cache_miss = LatencyWindow(window_seconds)
+
+    def record_response(self, response, latency: float):
+        """记录一次成功调用是否被截断，以及前缀缓存用量和耗时"""
+        if (getattr(response, "response_metadata", None) or {}).get("finish_reason") == "length":
+            self.truncated += 1
+        prompt_tokens, cached_tokens = prompt_cache_usage(response)
+        if not prompt_tokens:
+            return
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += cached_tokens
+        (self.cache_hit if cached_tokens else self.cache_miss).record(latency, True)
+
+    def stats(self, profile: GenerationProfile = None) -> dict:
+        shadow_primary = self.shadow_primary.percentile(99)
+        shadow_actual = self.shadow_actual.percentile(99)
+        improvement = None
+        if shadow_primary is not None and shadow_actual is not None:
+            improvement = shadow_primary - shadow_actual
+        p95 = self.latency.percentile(95)
+        target = profile.target_p95 if profile else None
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedgeWins": self.hedge_wins,
+            "hedgesDenied": self.hedges_denied,
+            "hedgeRate": round(self.hedges / self.requests, 4) if self.requests else 0.0,
+            "p95Seconds": _round(p95),
+            "p99Seconds": _round(self.latency.percentile(99)),
+            "targetP95Seconds": target,
+            "withinTarget": None if target is None or p95 is None else p95 <= target,
+            "maxTokens": profile.max_tokens if profile else None,
+            "truncated": self.truncated,
+            "timeouts": self.timeouts,
+            "shadowSamples": len(self.shadow_actual),
+            "p99WithoutHedgeSeconds": _round(shadow_primary),
+            "p99WithHedgeSeconds": _round(shadow_actual),
+            "p99ImprovementSeconds": _round(improvement),
+            "promptTokens": self.prompt_tokens,
+            "cachedPromptTokens": self.cached_tokens,
+            "promptCacheHitRate": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+            "p50CacheHitSeconds": _round(self.cache_hit.percentile(50)),
+            "p50CacheMissSeconds": _round(self.cache_miss.percentile(50)),
+        }
+
+
+class ProviderRouter:
+    """按耗时和健康状况在多个模型服务之间路由
+
+    每次调用按路由键（功能类型）取出允许使用的服务，排除错误率过高的服务后按p95耗时从低到高排序，
+    样本不足的服务排在最前，以便重新采样。
+    首选服务出错或被并发限制拒绝时立即转到下一个服务。
+
+    对冲：hedge_routes中的路由键在首次请求超过该路由首次请求耗时的hedge_percentile分位数后，
+    再发出一个相同的请求（有其他候选服务时发给下一个服务，否则发给同一个服务），取先成功的结果；
+    其他路由键在hedge_after大于0时，首选服务超过该时间未返回则对冲到下一个服务。
+    额外请求受预算限制：每个请求积累hedge_budget个令牌，每次对冲消耗一个，
+    长期来看对冲请求数不超过总请求数的hedge_budget倍
+
+    Attributes:
+        backends: 按优先级排列的服务列表
+        routes: 路由键到允许使用的服务名称列表的映射，未配置的路由键可以使用所有服务
+        hedge_after: 向第二个服务发出对冲请求前等待的时间（秒），0表示不对冲
+        hedge_routes: 按耗时分位数对冲的路由键
+        hedge_percentile: 对冲等待时间使用的分位数
+        hedge_min_delay: 对冲等待时间的下限（秒）
+        hedge_budget: 对冲请求占总请求数的上限
+        hedge_measure_rate: 对冲成功后仍等待首次请求完成、用于评估p99改善的抽样比例
+        profiles: 路由键到生成预算的映射
+        default_profile: 未配置生成预算的路由键使用的预算
+        unhealthy_error_rate: 错误率达到该值时视为不健康
+        min_samples: 计算耗时和错误率所需的最少样本数
+    """
+
+    def __init__(self, backends: List[Backend], routes: Dict[str, List[str]] = None, hedge_after: float = 0,
+                 hedge_routes: List[str] = None, hedge_percentile: float = 90, hedge_min_delay: float = 0.5,
+                 hedge_budget: float = 0.1, hedge_measure_rate: float = 0.05,
+                 profiles: Dict[str, GenerationProfile] = None, default_profile: GenerationProfile = None,
+                 unhealthy_error_rate: float = 0.5, min_samples: int = 5, window_seconds: float = 300):
+        self.backends = backends
+        self.routes = routes or {}
+        self.hedge_after = hedge_after
+        self.hedge_routes = set(hedge_routes or [])
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_budget = hedge_budget
+        self.hedge_measure_rate = hedge_measure_rate
+        self.profiles = profiles or {}
+        self.default_profile = default_profile or GenerationProfile()
+        self.unhealthy_error_rate = unhealthy_error_rate
+        self.min_samples = min_samples
+        self.window_seconds = window_seconds
+        self.failovers = 0
+        self.provider_hedges = 0
+        self._route_stats = {}
+        self._hedge_tokens = 1.0
+        self._lock = threading.Lock()
+
+    def route_stats(self, route: str) -> RouteStats:
+        """返回路由键的统计对象，不存在时创建"""
+        with self._lock:
+            stats = self._route_stats.get(route)
+            if stats is None:
+                stats = self._route_stats[route] = RouteStats(self.window_seconds)
+            return stats
+
+    def profile(self, route: str) -> GenerationProfile:
+        """返回路由键的生成预算"""
+        return self.profiles.get(route, self.default_profile)
+
+    def hedge_delay(self, route: str, has_next: bool):
+        """计算本次调用的对冲等待时间，None表示不对冲"""
+        if route in self.hedge_routes:
+            latencies, _ = self.route_stats(route).primary.snapshot()
+            if len(latencies) >= self.min_samples:
+                return max(self.hedge_min_delay, _percentile(latencies, self.hedge_percentile))
+        if self.hedge_after > 0 and has_next:
+            return self.hedge_after
+        return None
+
+    def _earn_hedge_token(self):
+        with self._lock:
+            # 最多积累一定数量的令牌，允许短时间内的突发对冲
+            self._hedge_tokens = min(max(1.0, self.hedge_budget * 100), self._hedge_tokens + self.hedge_budget)
+
+    def _spend_hedge_token(self) -> bool:
+        with self._lock:
+            if self._hedge_tokens >= 1:
+                self._hedge_tokens -= 1
+                return True
+            return False
+
+    def _allowed(self, route: str) -> List[Backend]:
+        names = self.routes.get(route)
+        if not names:
+            return list(self.backends)
+        by_name = {backend.name: backend for backend in self.backends}
+        return [by_name[name] for name in names if name in by_name]
+
+    def candidates(self, route: str) -> List[Backend]:
+        """返回本次调用依次尝试的服务，健康的服务按p95耗时排序，不健康的服务排在最后兜底"""
+        healthy, unhealthy = [], []
+        for order, backend in enumerate(self._allowed(route)):
+            latencies, errors = backend.window.snapshot()
+            total = len(latencies) + errors
+            if total >= self.min_samples and errors / total >= self.unhealthy_error_rate:
+                unhealthy.append(backend)
+                continue
+            # 样本不足时p95视为0，优先采样；调用总被取消（如对冲总是落败）而没有完整样本的服务排在有样本的服务之后；
+            # 相同时保持配置顺序
+            if len(latencies) >= self.min_samples:
+                p95 = _percentile(latencies, 95)
+            elif backend.window.cancelled() >= self.min_samples:
+                p95 = math.inf
+            else:
+                p95 = 0.0
+            healthy.append((p95, order, backend))
+        return [backend for _, _, backend in sorted(healthy, key=lambda item: item[:2])] + unhealthy
+
+    async def _call(self, backend: Backend, messages, temperature: float, timeout: float,
+                    stats: RouteStats, profile: GenerationProfile):
+        """在服务自己的并发限制内按生成预算调用一次，并记录耗时、截断和前缀缓存用量"""
+        async with backend.limiter.slot():
+            start = time.monotonic()
+            try:
+                response = await backend.create(temperature, timeout, profile).ainvoke(messages)
+            except asyncio.CancelledError:
+                # 被对冲或客户端断开取消，已等待的时间只是实际耗时的下限，不作为耗时样本
+                backend.window.record_cancelled()
+                raise
+            except Exception as e:
+                backend.window.record(time.monotonic() - start, False)
+                if _is_timeout(e):
+                    stats.timeouts += 1
+                raise
+            latency = time.monotonic() - start
+            backend.window.record(latency, True)
+            stats.record_response(response, latency)
+            return response
+
+    async def ainvoke(self, route: str, messages, temperature: float, timeout: float):
+        """异步调用模型，按候选顺序故障转移，首次请求过慢时发出对冲请求
+
+        Raises:
+            Exception: 所有服务都调用失败时抛出最后一个错误，都因并发已满被拒绝时为LimiterRejected
+        """
+        pending = self.candidates(route)
+        if not pending:
+            raise RuntimeError(f"没有可用于{route}的模型服务")
+        stats = self.route_stats(route)
+        profile = self.profile(route)
+        stats.requests += 1
+        self._earn_hedge_token()
+        delay = self.hedge_delay(route, len(pending) > 1)
+        measure = delay is not None and random.random() < self.hedge_measure_rate
+        tasks = {}
+        last_error = None
+        hedged = False
+        keep_primary = False
+        started = time.monotonic()
+
+        def start(backend):
+            task = asyncio.create_task(self._call(backend, messages, temperature, timeout, stats, profile))
+            tasks[task] = backend
+            return task
+
+        primary = start(pending.pop(0))
+        try:
+            while tasks:
+                wait_timeout = None
+                if delay is not None and not hedged:
+                    wait_timeout = max(0.0, started + delay - time.monotonic())
+                done, _ = await asyncio.wait(tasks, timeout=wait_timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    running = next(iter(tasks.values()))
+                    if pending:
+                        backend = pending[0]
+                    elif route in self.hedge_routes:
+                        backend = running  # 只有一个服务时对冲到同一个服务
+                    else:
+                        continue
+                    if not self._spend_hedge_token():
+                        stats.hedges_denied += 1
+                        continue
+                    if backend is not running:
+                        pending.pop(0)
+                        self.provider_hedges += 1
+                    stats.hedges += 1
+                    print(f"{route}首次请求超过{delay:.2f}秒未返回，对冲请求{backend.name}")
+                    start(backend)
+                    continue
+                for task in done:
+                    backend = tasks.pop(task)
+                    if task.exception() is None:
+                        elapsed = time.monotonic() - started
+                        stats.latency.record(elapsed, True)
+                        if task is primary or not hedged:
+                            stats.primary.record(elapsed, True)
+                            if measure:
+                                stats.shadow_primary.record(elapsed, True)
+                                stats.shadow_actual.record(elapsed, True)
+                        else:
+                            stats.hedge_wins += 1
+                            if not primary.done():
+                                # 首次请求被对冲取代，已等待的时间是其耗时的下限
+                                stats.primary.record(elapsed, True)
+                                if measure:
+                                    keep_primary = True
+                                    primary.add_done_callback(
+                                        lambda t: self._record_shadow(stats, t, started, elapsed))
+                        return task.result()
+                    last_error = task.exception()
+                    print(f"模型服务{backend.name}调用失败: {str(last_error)}")
+                if not tasks and pending:
+                    self.failovers += 1
+                    start(pending.pop(0))
+            raise last_error
+        finally:
+            for task in tasks:
+                if not (keep_primary and task is primary):
+                    task.cancel()
+
+    @staticmethod
+    def _record_shadow(stats: RouteStats, primary: asyncio.Task, started: float, actual: float):
+        """抽样请求的首次请求完成后，成对记录不对冲和对冲时的耗时"""
+        if primary.cancelled() or primary.exception() is not None:
+            return
+        stats.shadow_primary.record(time.monotonic() - started, True)
+        stats.shadow_actual.record(actual, True)
+
+    def invoke(self, route: str, messages, temperature: float, timeout: float):
+        """同步调用模型，按候选顺序依次故障转移，供线程池中的调用使用"""
+        last_error = None
+        stats = self.route_stats(route)
+        profile = self.profile(route)
+        stats.requests += 1
+        for index, backend in enumerate(self.candidates(route)):
+            if index:
+                self.failovers += 1
+            try:
+                with backend.limiter.slot_sync():
+                    start = time.monotonic()
+                    try:
+                        response = backend.create(temperature, timeout, profile).invoke(messages)
+                    except Exception as e:
+                        backend.window.record(time.monotonic() - start, False)
+                        if _is_timeout(e):
+                            stats.timeouts += 1
+                        raise
+                    latency = time.monotonic() - start
+                    backend.window.record(latency, True)
+                    stats.latency.record(latency, True)
+                    stats.record_response(response, latency)
+                    return response
+            except Exception as e:
+                last_error = e
+                print(f"模型服务{backend.name}调用失败: {str(e)}")
+        if last_error is None:
+            raise RuntimeError(f"没有可用于{route}的模型服务")
+        raise last_error
+
+    def stats(self) -> dict:
+        """返回各服务的耗时、错误率、并发限制状态以及路由统计"""
+        with self._lock:
+            routes = dict(self._route_stats)
+            hedge_tokens = self._hedge_tokens
+        return {
+            "backends": [backend.stats(self.min_samples, self.unhealthy_error_rate) for backend in self.backends],
+            "routes": {route: stats.stats(self.profile(route)) for route, stats in routes.items()},
+            "failovers": self.failovers,
+            "providerHedges": self.provider_hedges,
+            "hedgeTokens": round(hedge_tokens, 2),
+        }
+
+
+def _is_timeout(error: Exception) -> bool:
+    """是否为连接或读取超时，包括httpx和OpenAI SDK的超时异常"""
+    return isinstance(error, (TimeoutError, httpx.TimeoutException)) or "timeout" in type(error).__name__.lower()
+
+
+def parse_routes(value: str) -> Dict[str, List[str]]:
+    """解析路由配置，格式如 翻译:openai,deepseek;评价:deepseek"""
+    routes = {}
+    for part in value.split(";"):
+        if ":" not in part:
+            continue
+        route, names = part.split(":", 1)
+        routes[route.strip()] = [name.strip() for name in names.split(",") if name.strip()]
+    return routes
+
+
+def parse_profiles(value: str, defaults: Dict[str, GenerationProfile] = None) -> Dict[str, GenerationProfile]:
+    """解析生成预算配置并覆盖默认值
+
+    格式如 评价:max_tokens=120,read_timeout=15,target_p95=4;做菜达人:max_tokens=1200,stop=\\n\\n\\n
+    只需写出要修改的字段，多个停止序列用|分隔，\\n表示换行；
+    max_tokens和target_p95留空表示不限制，超时留空时保留默认值
+    """
+    profiles = dict(defaults or {})
+    for part in value.split(";"):
+        route, _, fields = part.partition(":")
+        route = route.strip()
+        if not route or not fields.strip():
+            continue
+        changes = {}
+        for item in fields.split(","):
+            key, _, raw = item.partition("=")
+            key, raw = key.strip(), raw.strip()
+            if key == "stop":
+                changes[key] = [stop.replace("\\n", "\n") for stop in raw.split("|") if stop]
+            elif key == "max_tokens":
+                changes[key] = int(raw) if raw else None
+            elif key in ("connect_timeout", "read_timeout"):
+                if raw:  # 超时不能为空，未填写时保留默认值
+                    changes[key] = float(raw)
+            elif key == "target_p95":
+                changes[key] = float(raw) if raw else None
+        profiles[route] = profiles.get(route, GenerationProfile()).replace(**changes)
+    return profiles
@@ -0,0 +1,138 @@
+# 事件循环阻塞检测
+import asyncio  # 测量任务
+import sys  # 读取事件循环线程的调用栈
+import threading  # 看门狗线程
+import time  # 单调时钟
+import traceback  # 格式化调用栈
+from bisect import bisect_left  # 直方图分桶
+from collections import deque  # 最近的阻塞记录
+from datetime import datetime  # 记录时间
+
+# 导入项目内部模块
+from config import (
+    LOOP_MONITOR_INTERVAL, LOOP_BLOCK_THRESHOLD, LOOP_BLOCK_MAX_EVENTS, LOOP_MONITOR_STRICT
+)
+
+# 延迟直方图的分桶上界（秒）
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 阻塞记录中保留的栈帧数
+STACK_LIMIT = 15
+
+
+class EventLoopBlocked(Exception):
+    """严格模式下检测到事件循环被阻塞"""
+
+
+class LoopMonitor:
+    """持续测量事件循环延迟，并记录阻塞事件循环的调用栈
+
+    事件循环中的测量任务每隔interval秒醒来一次，实际醒来时间比预期晚的部分即为事件循环延迟，
+    计入直方图。看门狗线程检查测量任务的心跳，超过threshold秒未醒来时说明事件循环正被同步调用阻塞，
+    此时读取事件循环线程的调用栈，即可定位在async函数中直接调用的requests、同步数据库查询、time.sleep等。
+    严格模式下check()在有阻塞记录时抛出EventLoopBlocked，应用关闭时自动检查，用于让测试失败
+
+    Attributes:
+        interval: 测量间隔（秒）
+        threshold: 视为阻塞的延迟（秒）
+        strict: 是否为严格模式
+        blocks: 最近的阻塞记录，包含检测时间、阻塞时长和调用栈
+    """
+
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL, threshold: float = LOOP_BLOCK_THRESHOLD,
+                 max_events: int = LOOP_BLOCK_MAX_EVENTS, strict: bool = LOOP_MONITOR_STRICT):
+        self.interval = interval
+        self.threshold = threshold
+        self.strict = strict
+        self.blocks = deque(maxlen=max_events)
+        self.block_count = 0
+        self._bucket_counts = [0] * (len(LAG_BUCKETS) + 1)
+        self._lag_sum = 0.0
+        self._lag_count = 0
+        self._lag_max = 0.0
+        self._heartbeat = None  # 测量任务最近一次开始等待的时间
+        self._pending = None  # (心跳时间, 阻塞记录)，看门狗已记录、阻塞时长待测量任务醒来后补全
+        self._loop_thread_id = None
+        self._task = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """在当前事件循环中启动测量任务和看门狗线程"""
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._measure())
+        threading.Thread(target=self._watch, name="loop-monitor", daemon=True).start()
+
+    def stop(self):
+        """停止测量，严格模式下有阻塞记录时抛出EventLoopBlocked"""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.strict:
+            self.check()
+
+    def check(self):
+        """有阻塞记录时抛出EventLoopBlocked，异常信息包含各次阻塞的调用栈"""
+        if self.blocks:
+            details = "\n".join(f"阻塞{event['blockedSeconds']}秒:\n{event['stack']}" for event in self.blocks)
+            raise EventLoopBlocked(f"事件循环被阻塞{self.block_count}次\n{details}")
+
+    async def _measure(self):
+        while True:
+            heartbeat = time.monotonic()
+            self._heartbeat = heartbeat
+            await asyncio.sleep(self.interval)
+            self._heartbeat = None  # 已醒来，看门狗不再把本次等待计为阻塞
+            lag = max(0.0, time.monotonic() - heartbeat - self.interval)
+            self._observe(lag)
+            pending = self._pending
+            if pending is not None and pending[0] == heartbeat:
+                pending[1]["blockedSeconds"] = round(lag, 3)
+                self._pending = None
+
+    def _observe(self, lag: float):
+        self._bucket_counts[bisect_left(LAG_BUCKETS, lag)] += 1
+        self._lag_sum += lag
+        self._lag_count += 1
+        self._lag_max = max(self._lag_max, lag)
+
+    def _watch(self):
+        """看门狗线程：测量任务超过threshold未醒来时记录事件循环线程的调用栈，每次阻塞只记录一次"""
+        while not self._stop.wait(max(self.threshold / 4, 0.005)):
+            heartbeat = self._heartbeat
+            if heartbeat is None or (self._pending is not None and self._pending[0] == heartbeat):
+                continue
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)[-STACK_LIMIT:]) if frame is not None else ""
+            event = {"detectedAt": datetime.utcnow().isoformat(), "blockedSeconds": round(stalled, 3), "stack": stack}
+            self.blocks.append(event)
+            self.block_count += 1
+            self._pending = (heartbeat, event)
+            print(f"警告: 事件循环已被阻塞{stalled:.3f}秒，当前调用栈:\n{stack}")
+
+    def histogram(self) -> list:
+        """返回累计直方图[(上界, 次数)]，最后一项上界为inf"""
+        result, total = [], 0
+        for bound, count in zip(LAG_BUCKETS + (float("inf"),), self._bucket_counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def stats(self) -> dict:
+        """返回延迟统计和最近的阻塞记录"""
+        return {
+            "lagCount": self._lag_count,
+            "lagSumSeconds": round(self._lag_sum, 6),
+            "lagMaxSeconds": round(self._lag_max, 6),
+            "blocks": self.block_count,
+            "thresholdSeconds": self.threshold,
+            "recentBlocks": list(self.blocks)[-5:],
+        }
+
+
+# 全局的事件循环监控
+loop_monitor = LoopMonitor()
@@ -4,6 +4,8 @@ from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, F
 from fastapi.middleware.cors import CORSMiddleware  # 用于处理跨域资源共享
 from fastapi.security import OAuth2PasswordBearer  # 用于OAuth2密码流认证
 from typing import Optional  # 类型提示，表示可选参数
+from contextlib import asynccontextmanager  # 应用生命周期管理
+import asyncio  # 后台任务
 
 # 服务器和工具模块
 import uvicorn  # ASGI服务器，用于运行FastAPI应用
@@ -11,6 +13,8 @@ import jwt  # JSON Web Token，用于生成和验证令牌
 from datetime import datetime, timedelta  # 日期时间处理
 import os  # 操作系统功能，文件路径处理等
 from pydantic import BaseModel  # 数据验证和设置管理
+from responses import FastJSONResponse  # 基于orjson的快速JSON响应
+from deadline import DeadlineMiddleware  # 请求截止时间中间件
 
 # 数据库相关模块
 from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey, Text  # SQL工具和列类型
@@ -26,16 +30,48 @@ from config import (
     DATABASE_URL, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES,
     HOST, PORT, DEBUG, API_TITLE, API_DESCRIPTION,
     ALLOW_ORIGINS, ALLOW_CREDENTIALS, ALLOW_METHODS, ALLOW_HEADERS,
-    OAUTH2_TOKEN_URL
+    OAUTH2_TOKEN_URL, RETENTION_DAYS, PROFILING_ENABLED, LOOP_MONITOR_ENABLED, OUTBOX_ENABLED
 )  # 从配置文件导入所有需要的配置
+from retention import run_retention_loop  # 聊天记录归档任务
+from revocation import revocation_list, run_revocation_sync_loop  # 令牌吊销列表同步任务
+from loop_monitor import loop_monitor  # 事件循环阻塞检测
+from idempotency import run_idempotency_purge_loop  # 幂等请求记录清理任务
+from outbox import run_outbox_relay_loop  # 发件箱事件发布任务
 
 # 创建数据库引擎和会话
 engine = create_engine(DATABASE_URL)  # 创建SQLAlchemy引擎实例
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)  # 创建会话工厂
 Base = declarative_base()  # 创建模型基类
 
+# 应用生命周期：启动和停止后台任务
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = []
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()  # 持续测量事件循环延迟，记录阻塞事件循环的调用栈
+    try:
+        revocation_list.sync()  # 启动时加载已吊销的令牌，之后定时增量同步
+    except Exception as e:
+        print(f"令牌吊销列表加载失败: {str(e)}")
+    tasks.append(asyncio.create_task(run_revocation_sync_loop()))
+    tasks.append(asyncio.create_task(run_idempotency_purge_loop()))  # 定时清理过期的幂等请求记录
+    if RETENTION_DAYS > 0:
+        tasks.append(asyncio.create_task(run_retention_loop()))  # 定时归档超过保留期的会话
+    if OUTBOX_ENABLED:
+        tasks.append(asyncio.create_task(run_outbox_relay_loop()))  # 批量发布聊天事件给下游
+    yield
+    for task in tasks:
+        task.cancel()
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.stop()  # 严格模式下有阻塞记录时抛出异常
+
 # 创建FastAPI应用
-app = FastAPI(title=API_TITLE, description=API_DESCRIPTION)  # 创建应用实例，设置API文档标题和描述
+app = FastAPI(
+    title=API_TITLE,
+    description=API_DESCRIPTION,
+    lifespan=lifespan,  # 启动和停止后台任务
+    default_response_class=FastJSONResponse  # 默认使用orjson序列化响应
+)  # 创建应用实例，设置API文档标题和描述
 
 # 配置CORS（跨域资源共享）
 app.add_middleware(
@@ -46,17 +82,30 @@ app.add_middleware(
     allow_headers=ALLOW_HEADERS,  # 允许的HTTP头
 )
 
+# 设置请求截止时间，并传递给所有上游调用
+app.add_middleware(DeadlineMiddleware)
+
+# 按需剖析请求，关闭时不加载中间件，没有额外开销
+if PROFILING_ENABLED:
+    from profiling import Profiler, ProfilingMiddleware
+    if Profiler is None:
+        print("警告: 已开启PROFILING_ENABLED，但未安装pyinstrument，请求剖析不可用")
+    else:
+        app.add_middleware(ProfilingMiddleware)
+
 # OAuth2认证
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=OAUTH2_TOKEN_URL)  # 配置OAuth2密码流认证，指定获取令牌的URL
 
 # 导入路由模块
-from routers import auth, user, chat, ai, chatwithdeepseek
+from routers import auth, user, chat, ai, chatwithdeepseek, metrics, ws
 
 # 注册路由
 app.include_router(auth.router, prefix="/auth", tags=["认证"])  # 认证相关路由，如登录、注册
 app.include_router(user.router, prefix="/user", tags=["用户"])  # 用户相关路由，如获取用户信息
 app.include_router(chat.router, prefix="/chat", tags=["聊天"])  # 聊天相关路由，如发送消息
+app.include_router(ws.router, prefix="/chat", tags=["聊天"])  # 聊天WebSocket连接
 app.include_router(ai.router, prefix="/ai", tags=["AI功能"])  # AI功能路由，如语音识别
+app.include_router(metrics.router, prefix="/metrics", tags=["运行指标"])  # 运行指标路由，如并发限制器状态
 
 # 主入口
 if __name__ == "__main__":
@@ -1,21 +1,44 @@
 # 导入必要的模块
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text  # 数据库列类型
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index  # 数据库列类型和索引
+from sqlalchemy import event  # ORM事件
+from sqlalchemy.types import TypeDecorator  # 自定义列类型
+from sqlalchemy.dialects.mysql import MEDIUMTEXT  # MySQL中较大的文本列
 from sqlalchemy.ext.declarative import declarative_base  # 声明式基类
 from sqlalchemy.orm import relationship  # 关系管理
 from datetime import datetime  # 日期时间处理
-import uuid  # 生成唯一标识符
+from ids import new_id  # 生成按时间排序的主键
+from compression import encode_content, decode_content, should_compress  # 消息内容压缩
 
 # 创建声明式基类，所有模型都将继承此基类
 Base = declarative_base()
 
 
+class CompressedText(TypeDecorator):
+    """透明压缩的文本列类型
+    
+    写入时超过阈值的内容压缩后存储，读取时自动解压，对业务代码透明
+    """
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return encode_content(value)
+
+    def process_result_value(self, value, dialect):
+        return decode_content(value)
+
+    def coerce_compared_value(self, op, value):
+        # LIKE、MATCH等比较中的字面量按普通文本处理，不参与压缩
+        return Text()
+
+
 class User(Base):
     """用户模型
     
     存储用户基本信息，包括微信openid、昵称和头像
     
     Attributes:
-        id: 用户唯一标识，UUID格式
+        id: 用户唯一标识，UUIDv7格式
         openid: 微信用户唯一标识
         nick_name: 用户昵称
         avatar: 用户头像URL
@@ -23,7 +46,7 @@ class User(Base):
     """
     __tablename__ = "users"  # 数据库表名
 
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))  # 主键，默认生成UUID
+    id = Column(String(36), primary_key=True, default=new_id)  # 主键，默认生成按时间排序的UUIDv7
     openid = Column(String(100), unique=True, index=True, nullable=False)  # 微信openid，唯一且建立索引
     nick_name = Column(String(100))  # 用户昵称
     avatar = Column(String(255))  # 用户头像URL
@@ -40,7 +63,7 @@ class UserSettings(Base):
     存储用户个性化设置，如深色模式、自动朗读等
     
     Attributes:
-        id: 设置唯一标识，UUID格式
+        id: 设置唯一标识，UUIDv7格式
         user_id: 关联的用户ID
         is_dark_mode: 是否启用深色模式
         auto_read: 是否启用自动朗读
@@ -50,7 +73,7 @@ class UserSettings(Base):
     """
     __tablename__ = "user_settings"  # 数据库表名
 
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))  # 主键，默认生成UUID
+    id = Column(String(36), primary_key=True, default=new_id)  # 主键，默认生成按时间排序的UUIDv7
     user_id = Column(String(36), ForeignKey("users.id"), nullable=False)  # 外键，关联用户表
     is_dark_mode = Column(Boolean, default=False)  # 深色模式开关，默认关闭
     auto_read = Column(Boolean, default=False)  # 自动朗读开关，默认关闭
@@ -68,7 +91,7 @@ class ChatSession(Base):
     表示用户与AI助手之间的一个完整对话会话
     
     Attributes:
-        id: 会话唯一标识，UUID格式
+        id: 会话唯一标识，UUIDv7格式
         user_id: 关联的用户ID
         title: 会话标题
         created_at: 创建时间
@@ -76,7 +99,7 @@ class ChatSession(Base):
     """
     __tablename__ = "chat_sessions"  # 数据库表名
 
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))  # 主键，默认生成UUID
+    id = Column(String(36), primary_key=True, default=new_id)  # 主键，默认生成按时间排序的UUIDv7
     user_id = Column(String(36), ForeignKey("users.id"), nullable=False)  # 外键，关联用户表
     title = Column(String(255), default="新会话")  # 会话标题，默认为"新会话"
     created_at = Column(DateTime, default=datetime.utcnow)  # 创建时间
@@ -93,19 +116,135 @@ class ChatMessage(Base):
     存储会话中的单条消息，包括用户发送的消息和AI的回复
     
     Attributes:
-        id: 消息唯一标识，UUID格式
+        id: 消息唯一标识，UUIDv7格式
         session_id: 关联的会话ID
         is_user: 是否为用户消息
-        content: 消息内容
+        content: 消息内容，超过阈值时压缩存储
+        is_compressed: 消息内容是否为压缩存储
         created_at: 创建时间
     """
     __tablename__ = "chat_messages"  # 数据库表名
+    __table_args__ = (
+        # 消息内容全文索引，使用ngram分词器支持中文检索（仅MySQL生效）
+        Index("ft_content", "content", mysql_prefix="FULLTEXT", mysql_with_parser="ngram"),
+    )
 
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))  # 主键，默认生成UUID
+    id = Column(String(36), primary_key=True, default=new_id)  # 主键，默认生成按时间排序的UUIDv7
     session_id = Column(String(36), ForeignKey("chat_sessions.id"), nullable=False)  # 外键，关联会话表
     is_user = Column(Boolean, default=True)  # 消息类型：True表示用户消息，False表示AI回复
-    content = Column(Text, nullable=False)  # 消息内容，文本类型
+    content = Column(CompressedText, nullable=False)  # 消息内容，文本类型，长内容透明压缩
+    is_compressed = Column(Boolean, default=False, nullable=False)  # 是否压缩存储
     created_at = Column(DateTime, default=datetime.utcnow)  # 创建时间
 
     # 关系定义
-    session = relationship("ChatSession", back_populates="messages")  # 多对一关系：关联会话
\ No newline at end of file
+    session = relationship("ChatSession", back_populates="messages")  # 多对一关系：关联会话
+
+
+@event.listens_for(ChatMessage, "before_insert")
+@event.listens_for(ChatMessage, "before_update")
+def _set_message_compressed_flag(mapper, connection, target):
+    """写入前同步压缩标记，与CompressedText的压缩判断保持一致"""
+    target.is_compressed = should_compress(target.content)
+
+
+class GeneratedImage(Base):
+    """生成图片结果模型
+    
+    记录文生图接口返回结果在本地存储中的元数据，按内容寻址去重
+    
+    Attributes:
+        id: 结果唯一标识，(提示词, 尺寸, 模型)的SHA-256摘要
+        prompt: 发送给图片API的提示词
+        size: 图片尺寸，如"1024x1024"
+        model: 图片模型名称
+        file_path: 结果文件相对于存储目录的路径
+        size_bytes: 结果文件大小（字节）
+        hit_count: 缓存命中次数
+        created_at: 创建时间
+        last_accessed_at: 最近访问时间，用于LRU淘汰
+    """
+    __tablename__ = "generated_images"  # 数据库表名
+
+    id = Column(String(64), primary_key=True)  # 主键，内容摘要
+    prompt = Column(Text, nullable=False)  # 提示词
+    size = Column(String(20), nullable=False)  # 图片尺寸
+    model = Column(String(50), nullable=False)  # 图片模型
+    file_path = Column(String(255), nullable=False)  # 结果文件路径
+    size_bytes = Column(Integer, default=0)  # 文件大小
+    hit_count = Column(Integer, default=0)  # 命中次数
+    created_at = Column(DateTime, default=datetime.utcnow)  # 创建时间
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, index=True)  # 最近访问时间，建立索引
+
+class RevokedToken(Base):
+    """已吊销令牌模型
+
+    退出登录时记录令牌的jti，各进程定期同步到内存中的布隆过滤器，
+    令牌过期后记录不再需要，由同步任务定期清理
+
+    Attributes:
+        jti: 令牌唯一标识
+        user_id: 令牌所属的用户ID
+        expires_at: 令牌过期时间
+        revoked_at: 吊销时间，用于增量同步
+    """
+    __tablename__ = "revoked_tokens"  # 数据库表名
+
+    jti = Column(String(36), primary_key=True)  # 主键，令牌唯一标识
+    user_id = Column(String(36), nullable=False)  # 令牌所属用户
+    expires_at = Column(DateTime, nullable=False, index=True)  # 令牌过期时间，建立索引用于清理
+    revoked_at = Column(DateTime, default=datetime.utcnow, index=True)  # 吊销时间，建立索引用于增量同步
+
+class IdempotencyRecord(Base):
+    """幂等请求记录模型
+
+    客户端用Idempotency-Key请求头标识一次操作，重试时携带相同的键，
+    第一次请求的处理状态和结果记录在此，重复的请求直接返回记录的结果，不再重复执行
+
+    Attributes:
+        id: (用户ID, 接口, 幂等键)的SHA-256摘要
+        user_id: 请求用户ID
+        endpoint: 接口名称
+        fingerprint: 请求参数的SHA-256摘要，同一个键用于不同参数时拒绝请求
+        status: 处理状态，processing或completed
+        response: 处理结果的JSON文本，处理中时为空
+        created_at: 创建时间，处理中的记录超过处理超时视为处理进程已退出
+        expires_at: 过期时间，过期后记录被清理，相同的键可以重新使用
+    """
+    __tablename__ = "idempotency_keys"  # 数据库表名
+
+    id = Column(String(64), primary_key=True)  # 主键，键摘要
+    user_id = Column(String(36), nullable=False)  # 请求用户
+    endpoint = Column(String(50), nullable=False)  # 接口名称
+    fingerprint = Column(String(64), nullable=False)  # 请求参数摘要
+    status = Column(String(20), nullable=False, default="processing")  # 处理状态
+    response = Column(Text().with_variant(MEDIUMTEXT(), "mysql"), nullable=True)  # 处理结果
+    created_at = Column(DateTime, default=datetime.utcnow)  # 创建时间
+    expires_at = Column(DateTime, nullable=False, index=True)  # 过期时间，建立索引用于清理
+
+class OutboxEvent(Base):
+    """事务性发件箱事件模型
+
+    与业务数据在同一个事务中写入，提交成功的写入一定有对应的事件，回滚时事件一并丢弃。
+    后台转发任务按ID顺序批量读取未发布的事件，发布到外部接收端后标记已发布，
+    分析和审核等下游消费者读取接收端，不再直接查询业务表
+
+    Attributes:
+        id: 事件唯一标识，UUIDv7格式，按写入顺序递增，下游按此去重
+        event_type: 事件类型，如message.created
+        aggregate_id: 事件所属对象的ID，聊天事件为会话ID，下游按此保证同一会话内的顺序
+        payload: 事件内容的JSON文本
+        created_at: 创建时间
+        published_at: 发布时间，未发布时为空
+    """
+    __tablename__ = "outbox_events"  # 数据库表名
+    __table_args__ = (
+        # 转发任务按ID顺序读取未发布的事件
+        Index("idx_published_at_id", "published_at", "id"),
+    )
+
+    id = Column(String(36), primary_key=True, default=new_id)  # 主键，默认生成按时间排序的UUIDv7
+    event_type = Column(String(50), nullable=False)  # 事件类型
+    aggregate_id = Column(String(36), nullable=False)  # 所属对象ID
+    payload = Column(Text().with_variant(MEDIUMTEXT(), "mysql"), nullable=False)  # 事件内容
+    created_at = Column(DateTime, default=datetime.utcnow)  # 创建时间
+    published_at = Column(DateTime, nullable=True)  # 发布时间
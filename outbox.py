@@ -0,0 +1,233 @@
+# 事务性发件箱与聊天事件发布
+import asyncio  # 后台定时任务
+import os  # 文件路径处理
+import threading  # 内存接收端加锁
+import time  # 清理间隔
+from collections import deque  # 内存接收端的事件队列
+from datetime import datetime, timedelta  # 日期时间处理
+
+import orjson  # 事件序列化
+from sqlalchemy import delete, update  # 批量更新和删除
+
+# 导入项目内部模块
+from config import (
+    OUTBOX_ENABLED, OUTBOX_SINK, OUTBOX_DIR, OUTBOX_BATCH_SIZE, OUTBOX_RELAY_INTERVAL,
+    OUTBOX_RETENTION_HOURS, OUTBOX_PURGE_SECONDS, OUTBOX_FILE_RETENTION_DAYS
+)
+from database import SessionLocal  # 数据库会话工厂
+from models import OutboxEvent  # 数据模型
+
+
+def add_message_event(db, message, user_id: str):
+    """在当前事务中为新消息记录message.created事件
+
+    需要在提交消息所在的事务之前调用，事件与消息一起提交或回滚
+
+    Args:
+        db: 写入消息的数据库会话
+        message: 已添加到会话中的ChatMessage
+        user_id: 消息所属用户ID
+    """
+    if not OUTBOX_ENABLED:
+        return
+    db.flush()  # 生成消息ID和创建时间
+    db.add(OutboxEvent(
+        event_type="message.created",
+        aggregate_id=message.session_id,
+        payload=orjson.dumps({
+            "messageId": message.id,
+            "sessionId": message.session_id,
+            "userId": user_id,
+            "isUser": message.is_user,
+            "content": message.content,
+            "createdAt": message.created_at,
+        }).decode()
+    ))
+
+
+class NDJSONSink:
+    """按天写入NDJSON文件的事件接收端
+
+    每批事件一次追加写入并fsync，写入成功后事件才会被标记为已发布。
+    事件包含消息原文，文件按retention_days天保留，避免聊天记录归档删除后仍留在事件文件中
+    """
+
+    FILE_PREFIX = "chat-events-"
+
+    def __init__(self, directory: str = OUTBOX_DIR, retention_days: int = OUTBOX_FILE_RETENTION_DAYS):
+        self.directory = directory
+        self.retention_days = retention_days
+
+    def publish(self, events: list):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{self.FILE_PREFIX}{datetime.utcnow():%Y%m%d}.ndjson")
+        # 事件内容已经是JSON文本，直接拼接到信封中，不再解析和重新编码
+        data = b"".join(
+            orjson.dumps({key: value for key, value in event.items() if key != "payload"})[:-1]
+            + b',"payload":' + event["payload"].encode("utf-8") + b"}\n"
+            for event in events
+        )
+        with open(path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+    def purge_files(self, now: datetime = None) -> int:
+        """删除超过保留天数的事件文件，返回删除的文件数"""
+        if self.retention_days <= 0 or not os.path.isdir(self.directory):
+            return 0
+        oldest = f"{(now or datetime.utcnow()) - timedelta(days=self.retention_days):%Y%m%d}"
+        deleted = 0
+        for name in os.listdir(self.directory):
+            day = name[len(self.FILE_PREFIX):-len(".ndjson")]
+            if name.startswith(self.FILE_PREFIX) and name.endswith(".ndjson") and day < oldest:
+                os.remove(os.path.join(self.directory, name))
+                deleted += 1
+        return deleted
+
+
+class MemoryBroker:
+    """进程内的事件接收端，代替消息队列用于本地调试和测试
+
+    Attributes:
+        events: 已发布、尚未被消费的事件，超过容量时丢弃最早的事件
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.events = deque(maxlen=maxsize)
+        self._lock = threading.Lock()
+
+    def publish(self, events: list):
+        with self._lock:
+            self.events.extend({**event, "payload": orjson.loads(event["payload"])} for event in events)
+
+    def consume(self, max_events: int = 100) -> list:
+        """取出最早的若干个事件"""
+        with self._lock:
+            return [self.events.popleft() for _ in range(min(max_events, len(self.events)))]
+
+
+# 可用的事件接收端
+SINKS = {
+    "ndjson": NDJSONSink,
+    "memory": MemoryBroker,
+}
+
+
+def create_sink(name: str):
+    """按名称创建事件接收端
+
+    Raises:
+        ValueError: 名称不在SINKS中
+    """
+    if name not in SINKS:
+        raise ValueError(f"未知的事件接收端: {name}，可选: {', '.join(SINKS)}")
+    return SINKS[name]()
+
+
+class OutboxRelay:
+    """把发件箱中未发布的事件批量发布到接收端
+
+    按ID顺序读取一批未发布的事件，发布成功后在同一个事务中标记为已发布。
+    MySQL下读取时加FOR UPDATE SKIP LOCKED，多个进程同时转发不会重复发布同一批事件。
+    发布后、标记前进程退出时这一批会被再次发布，投递语义为至少一次，下游按事件ID去重
+
+    Attributes:
+        sink: 事件接收端，提供publish(events)方法
+        batch_size: 每批发布的事件数
+    """
+
+    def __init__(self, sink, batch_size: int = OUTBOX_BATCH_SIZE, session_factory=SessionLocal):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+        self.published = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_lag_seconds = None  # 最近一批中最早事件从写入到发布的时间
+
+    def relay_once(self) -> int:
+        """发布一批事件，返回发布的事件数"""
+        db = self.session_factory()
+        try:
+            rows = db.query(OutboxEvent).filter(OutboxEvent.published_at.is_(None)).order_by(
+                OutboxEvent.id).limit(self.batch_size).with_for_update(skip_locked=True).all()
+            if not rows:
+                db.rollback()
+                return 0
+            events = [{
+                "id": row.id,
+                "type": row.event_type,
+                "aggregateId": row.aggregate_id,
+                "createdAt": row.created_at,
+                "payload": row.payload,
+            } for row in rows]
+            try:
+                self.sink.publish(events)
+            except Exception as e:
+                db.rollback()
+                self.failures += 1
+                self.last_error = str(e)
+                raise
+            now = datetime.utcnow()
+            db.execute(update(OutboxEvent).where(OutboxEvent.id.in_([row.id for row in rows])).values(published_at=now))
+            db.commit()
+            self.published += len(rows)
+            self.batches += 1
+            self.last_lag_seconds = round((now - rows[0].created_at).total_seconds(), 3)
+            return len(rows)
+        finally:
+            db.close()
+
+    def purge_published(self, before: datetime) -> int:
+        """删除发布时间早于before的事件"""
+        db = self.session_factory()
+        try:
+            deleted = db.execute(delete(OutboxEvent).where(OutboxEvent.published_at < before)).rowcount
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            "sink": type(self.sink).__name__,
+            "published": self.published,
+            "batches": self.batches,
+            "failures": self.failures,
+            "lastError": self.last_error,
+            "lastLagSeconds": self.last_lag_seconds,
+        }
+
+
+# 全局的事件转发
+outbox_relay = OutboxRelay(create_sink(OUTBOX_SINK))
+
+
+async def run_outbox_relay_loop():
+    """后台持续发布发件箱中的事件，有积压时连续发布，没有积压时按间隔检查，并定时清理已发布的事件和过期的事件文件"""
+    last_purge = time.monotonic()
+    while True:
+        published = 0
+        try:
+            # 在线程池中执行同步数据库操作和文件写入，避免阻塞事件循环
+            published = await asyncio.to_thread(outbox_relay.relay_once)
+        except Exception as e:
+            print(f"发件箱事件发布失败: {str(e)}")
+        if time.monotonic() - last_purge >= OUTBOX_PURGE_SECONDS:
+            last_purge = time.monotonic()
+            try:
+                before = datetime.utcnow() - timedelta(hours=OUTBOX_RETENTION_HOURS)
+                deleted = await asyncio.to_thread(outbox_relay.purge_published, before)
+                if deleted:
+                    print(f"已清理 {deleted} 条已发布的发件箱事件")
+                if isinstance(outbox_relay.sink, NDJSONSink):
+                    files = await asyncio.to_thread(outbox_relay.sink.purge_files)
+                    if files:
+                        print(f"已删除 {files} 个过期的事件文件")
+            except Exception as e:
+                print(f"发件箱事件清理失败: {str(e)}")
+        if published < outbox_relay.batch_size:
+            await asyncio.sleep(OUTBOX_RELAY_INTERVAL)
@@ -0,0 +1,132 @@
+# 按需请求性能剖析
+import random  # 抽样
+import time  # 请求耗时
+from collections import deque  # 固定容量的报告缓冲区
+from datetime import datetime  # 报告时间
+
+try:
+    from pyinstrument import Profiler  # 统计采样剖析器，支持跟踪协程的await
+    from pyinstrument.renderers import ConsoleRenderer, HTMLRenderer, SpeedscopeRenderer
+except ImportError:  # 可选依赖，未安装时不能开启剖析
+    Profiler = None
+
+# 导入项目内部模块
+from config import (
+    PROFILE_SAMPLE_RATE, PROFILE_INTERVAL, PROFILE_MAX_REPORTS, PROFILE_MAX_CONCURRENT, PROFILE_PATHS
+)
+from ids import new_id  # 报告ID
+from utils import is_metrics_token_valid  # 管理员令牌校验
+
+# 报告的下载格式
+PROFILE_FORMATS = ("html", "text", "speedscope")
+
+
+class ProfileStore:
+    """最近的剖析报告，超过容量时丢弃最早的报告
+
+    保存剖析会话本身，下载时再渲染，请求结束时只做一次追加
+    """
+
+    def __init__(self, maxsize: int = PROFILE_MAX_REPORTS):
+        self._reports = deque(maxlen=maxsize)
+
+    def add(self, report: dict):
+        self._reports.append(report)
+
+    def list(self) -> list:
+        """返回报告摘要，最新的在前"""
+        return [{key: value for key, value in report.items() if key != "session"}
+                for report in reversed(self._reports)]
+
+    def render(self, report_id: str, fmt: str = "html"):
+        """渲染指定报告，报告不存在时返回None"""
+        for report in self._reports:
+            if report["id"] == report_id:
+                break
+        else:
+            return None
+        if fmt == "text":
+            return ConsoleRenderer(unicode=True, color=False).render(report["session"])
+        if fmt == "speedscope":
+            return SpeedscopeRenderer().render(report["session"])
+        return HTMLRenderer().render(report["session"])
+
+
+# 全局的剖析报告缓冲区
+profile_store = ProfileStore()
+
+
+class ProfilingMiddleware:
+    """对部分请求做统计采样剖析
+
+    请求头带X-Profile: 1且X-Metrics-Token有效时剖析该请求，响应头X-Profile-Id返回报告ID；
+    另外按PROFILE_SAMPLE_RATE抽样剖析PROFILE_PATHS下的请求。
+    剖析覆盖整个请求的协程调用栈，等待上游或线程池的时间显示为对应的await调用，
+    可以区分模型服务、提示词构造、序列化和数据库的耗时。
+    同时进行的剖析不超过PROFILE_MAX_CONCURRENT个，超过时不剖析。
+    只在PROFILING_ENABLED开启时加入应用，关闭时没有任何开销
+    """
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE, interval: float = PROFILE_INTERVAL,
+                 max_concurrent: int = PROFILE_MAX_CONCURRENT, paths: list = PROFILE_PATHS):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_concurrent = max_concurrent
+        self.paths = tuple(paths)
+        self.active = 0
+
+    def _should_profile(self, scope) -> tuple:
+        """返回(是否剖析, 是否由请求头触发)"""
+        requested, token = False, None
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile":
+                requested = value not in (b"", b"0")
+            elif name == b"x-metrics-token":
+                token = value.decode("latin-1")
+        if requested and is_metrics_token_valid(token):
+            return True, True
+        if self.sample_rate > 0 and (not self.paths or scope["path"].startswith(self.paths)):
+            return random.random() < self.sample_rate, False
+        return False, False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profile, requested = self._should_profile(scope)
+        if not profile or self.active >= self.max_concurrent:
+            await self.app(scope, receive, send)
+            return
+
+        report_id = new_id()
+        status_code = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if requested:
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", report_id.encode())]
+            await send(message)
+
+        self.active += 1
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        started_at = datetime.utcnow()
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            self.active -= 1
+            profile_store.add({
+                "id": report_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "trigger": "header" if requested else "sample",
+                "durationMs": round((time.perf_counter() - start) * 1000, 1),
+                "startedAt": started_at.isoformat(),
+                "session": profiler.last_session,
+            })
@@ -0,0 +1,51 @@
+# 统一响应格式
+from typing import Any, Generic, Optional, TypeVar  # 类型提示
+
+import orjson  # 快速JSON序列化
+from fastapi.responses import JSONResponse  # JSON响应基类
+from pydantic import BaseModel  # 数据验证
+
+T = TypeVar("T")
+
+
+class FastJSONResponse(JSONResponse):
+    """使用orjson序列化的JSON响应
+
+    作为应用的默认响应类，datetime、UUID等类型由orjson直接处理
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ApiResponse(BaseModel, Generic[T]):
+    """统一响应数据模型
+
+    所有接口都返回{"code", "message", "data"}结构，作为接口的response_model用于生成文档
+
+    Attributes:
+        code: 业务状态码，200表示成功
+        message: 状态消息
+        data: 响应数据
+    """
+    code: int = 200  # 业务状态码
+    message: str = "success"  # 状态消息
+    data: Optional[T] = None  # 响应数据
+
+
+def api_response(data=None, message: str = "success", code: int = 200, **kwargs) -> FastJSONResponse:
+    """构建统一格式的响应
+
+    直接返回FastJSONResponse，跳过FastAPI的jsonable_encoder和response_model校验，
+    data中只能包含orjson可以直接序列化的类型（dict、list、str、数值、datetime等）
+
+    Args:
+        data: 响应数据
+        message: 状态消息
+        code: 业务状态码
+        **kwargs: 传给FastJSONResponse的其他参数，如status_code、headers
+
+    Returns:
+        FastJSONResponse: JSON响应
+    """
+    return FastJSONResponse(content={"code": code, "message": message, "data": data}, **kwargs)
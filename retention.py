@@ -0,0 +1,201 @@
+# 聊天记录保留与归档
+import asyncio  # 后台定时任务
+import gzip  # 归档文件压缩
+import json  # 归档记录序列化
+import os  # 文件路径处理
+from datetime import datetime, timedelta  # 日期时间处理
+
+from sqlalchemy import delete  # 批量删除
+
+# 导入项目内部模块
+from config import (
+    ARCHIVE_DIR, RETENTION_DAYS, RETENTION_INTERVAL_SECONDS,
+    RETENTION_BATCH_SIZE, RETENTION_DELETE_CHUNK
+)
+from database import SessionLocal  # 数据库会话工厂
+from models import ChatSession, ChatMessage  # 数据模型
+
+
+def _format_time(value: datetime):
+    return value.isoformat() if value else None
+
+
+def _parse_time(value: str):
+    return datetime.fromisoformat(value) if value else None
+
+
+def archive_sessions(before: datetime, batch_size: int = RETENTION_BATCH_SIZE,
+                     delete_chunk: int = RETENTION_DELETE_CHUNK, archive_dir: str = ARCHIVE_DIR,
+                     max_batches: int = 0) -> dict:
+    """归档并删除最后更新时间早于before的会话
+
+    每批会话先完整写入一个gzip压缩的NDJSON归档文件（每行一个会话及其全部消息），
+    落盘后再分块删除消息和会话，每块一个事务，控制单个事务的锁持有时间。
+    删除时重新检查会话，归档期间有新消息写入的会话不删除
+
+    Args:
+        before: 早于该时间的会话会被归档
+        batch_size: 每个归档文件包含的会话数
+        delete_chunk: 每个删除事务处理的行数，同一会话的消息总在一个事务中删除
+        archive_dir: 归档文件目录
+        max_batches: 最多处理的批次数，0表示处理到没有符合条件的会话为止
+
+    Returns:
+        dict: 归档并删除的会话数、消息数，因有更新而跳过的会话数和生成的归档文件列表
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    stats = {"sessions": 0, "messages": 0, "skipped": 0, "files": []}
+    batches = 0
+    while not max_batches or batches < max_batches:
+        db = SessionLocal()
+        try:
+            sessions = db.query(ChatSession).filter(
+                ChatSession.updated_at < before
+            ).order_by(ChatSession.updated_at.asc(), ChatSession.id.asc()).limit(batch_size).all()
+            if not sessions:
+                break
+            session_ids = [s.id for s in sessions]
+            messages = db.query(ChatMessage).filter(
+                ChatMessage.session_id.in_(session_ids)
+            ).order_by(ChatMessage.created_at.asc()).all()
+            by_session = {}
+            for message in messages:
+                by_session.setdefault(message.session_id, []).append(message)
+
+            # 先写归档文件，确认落盘后再删除数据
+            path = os.path.join(archive_dir, f"chat_archive_{datetime.utcnow():%Y%m%d%H%M%S%f}.jsonl.gz")
+            with gzip.open(path, "wt", encoding="utf-8") as f:
+                for session in sessions:
+                    f.write(json.dumps({
+                        "id": session.id,
+                        "userId": session.user_id,
+                        "title": session.title,
+                        "createdAt": _format_time(session.created_at),
+                        "updatedAt": _format_time(session.updated_at),
+                        "messages": [[
+                            m.id, m.is_user, m.content, _format_time(m.created_at)
+                        ] for m in by_session.get(session.id, [])]
+                    }, ensure_ascii=False, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+            archived = {session_id: {m.id for m in items} for session_id, items in by_session.items()}
+        finally:
+            db.close()
+
+        # 分块删除，每块一个短事务；一块包含若干完整的会话，消息数不超过delete_chunk（单个会话超过时单独成块）
+        deleted, deleted_messages, skipped = 0, 0, 0
+        for chunk in _chunk_sessions(session_ids, archived, delete_chunk):
+            removed, removed_messages = _delete_sessions(chunk, archived, before)
+            deleted += len(removed)
+            deleted_messages += removed_messages
+            skipped += len(chunk) - len(removed)
+
+        stats["sessions"] += deleted
+        stats["messages"] += deleted_messages
+        stats["skipped"] += skipped
+        stats["files"].append(path)
+        batches += 1
+        print(f"已归档 {deleted} 个会话、{deleted_messages} 条消息到 {path}"
+              + (f"，{skipped} 个会话归档后有更新，未删除" if skipped else ""))
+    return stats
+
+
+def _chunk_sessions(session_ids, archived: dict, delete_chunk: int):
+    """按消息数把会话分块，同一会话的消息总在同一块中"""
+    chunk, rows = [], 0
+    for session_id in session_ids:
+        count = len(archived.get(session_id, ())) + 1
+        if chunk and rows + count > delete_chunk:
+            yield chunk
+            chunk, rows = [], 0
+        chunk.append(session_id)
+        rows += count
+    if chunk:
+        yield chunk
+
+
+def _delete_sessions(session_ids, archived: dict, before: datetime) -> tuple:
+    """在一个事务中删除一块已归档的会话及其消息
+
+    删除前锁定会话并重新检查：归档之后更新过或写入了新消息的会话跳过，保留在数据库中，
+    避免删除没有写入归档文件的消息。被跳过的会话仍在本批归档文件中，恢复时已存在的会话会被跳过
+
+    Returns:
+        tuple: (删除的会话ID列表, 删除的消息数)
+    """
+    db = SessionLocal()
+    try:
+        stale = {row.id for row in db.query(ChatSession.id).filter(
+            ChatSession.id.in_(session_ids), ChatSession.updated_at < before
+        ).with_for_update()}
+        current = {}
+        for session_id, message_id in db.query(ChatMessage.session_id, ChatMessage.id).filter(
+                ChatMessage.session_id.in_(stale)):
+            current.setdefault(session_id, set()).add(message_id)
+        unchanged = [session_id for session_id in session_ids
+                     if session_id in stale and current.get(session_id, set()) == archived.get(session_id, set())]
+        deleted_messages = 0
+        if unchanged:
+            deleted_messages = db.execute(delete(ChatMessage).where(ChatMessage.session_id.in_(unchanged))).rowcount
+            db.execute(delete(ChatSession).where(ChatSession.id.in_(unchanged)))
+        db.commit()
+        return unchanged, deleted_messages
+    finally:
+        db.close()
+
+
+def restore_archive(path: str) -> dict:
+    """从归档文件恢复会话和消息，已存在的会话会被跳过
+
+    Args:
+        path: 归档文件路径
+
+    Returns:
+        dict: 恢复和跳过的会话数、恢复的消息数
+    """
+    stats = {"sessions": 0, "messages": 0, "skipped": 0}
+    db = SessionLocal()
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if db.query(ChatSession.id).filter(ChatSession.id == record["id"]).first():
+                    stats["skipped"] += 1
+                    continue
+                db.add(ChatSession(
+                    id=record["id"],
+                    user_id=record["userId"],
+                    title=record["title"],
+                    created_at=_parse_time(record["createdAt"]),
+                    updated_at=_parse_time(record["updatedAt"])
+                ))
+                db.flush()  # 先写入会话，保证消息的外键有效
+                for message_id, is_user, content, created_at in record["messages"]:
+                    db.add(ChatMessage(
+                        id=message_id,
+                        session_id=record["id"],
+                        is_user=is_user,
+                        content=content,
+                        created_at=_parse_time(created_at)
+                    ))
+                db.commit()
+                stats["sessions"] += 1
+                stats["messages"] += len(record["messages"])
+    finally:
+        db.close()
+    return stats
+
+
+async def run_retention_loop():
+    """后台定时归档超过保留期的会话，RETENTION_DAYS为0时不启动"""
+    while True:
+        try:
+            before = datetime.utcnow() - timedelta(days=RETENTION_DAYS)
+            # 在线程池中执行同步数据库操作，避免阻塞事件循环
+            stats = await asyncio.to_thread(archive_sessions, before)
+            if stats["sessions"]:
+                print(f"聊天记录归档完成: {stats['sessions']} 个会话、{stats['messages']} 条消息")
+        except Exception as e:
+            print(f"聊天记录归档失败: {str(e)}")
+        await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
@@ -0,0 +1,225 @@
+# 令牌吊销
+import asyncio  # 后台同步任务
+import math  # 布隆过滤器参数计算
+import threading  # 线程锁
+import time  # 清理间隔
+from datetime import datetime, timedelta  # 日期时间处理
+from typing import Optional  # 类型提示
+
+from sqlalchemy import delete  # 批量删除
+from sqlalchemy.exc import IntegrityError  # 重复吊销
+
+# 导入项目内部模块
+from cache import TTLCache  # 已确认的查询结果
+from config import (
+    REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE,
+    REVOCATION_SYNC_SECONDS, REVOCATION_PURGE_SECONDS
+)
+from database import SessionLocal  # 数据库会话工厂
+from models import RevokedToken  # 数据模型
+
+_HASH_MASK = (1 << 64) - 1
+
+# 增量同步时向前多查的时间，覆盖其他进程提交顺序与吊销时间不一致以及各主机时钟的小偏差
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+class BloomFilter:
+    """布隆过滤器
+
+    不在过滤器中的元素一定没有被加入过；在过滤器中的元素有error_rate的概率是误判。
+    使用进程内的hash()做双重哈希，只能在同一进程内使用
+
+    Attributes:
+        capacity: 预期元素数
+        error_rate: 元素数不超过capacity时的误判率
+        size: 位数组长度
+        hash_count: 哈希函数个数
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _hashes(self, item: str):
+        h = hash(item) & _HASH_MASK
+        return h & 0xFFFFFFFF, (h >> 32) | 1
+
+    def add(self, item: str):
+        h1, h2 = self._hashes(item)
+        for i in range(self.hash_count):
+            position = (h1 + i * h2) % self.size
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        h = hash(item) & _HASH_MASK
+        h2, size, bits = (h >> 32) | 1, self.size, self._bits
+        position = (h & 0xFFFFFFFF) % size
+        for _ in range(self.hash_count):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False  # 未吊销的令牌平均检查一两个位就能确定
+            position = (position + h2) % size
+        return True
+
+
+class RevocationList:
+    """已吊销令牌列表
+
+    revoked_tokens表是各进程共享的权威数据，每个进程在内存中维护一个布隆过滤器，
+    定期增量同步新吊销的jti。校验令牌时先查布隆过滤器，未命中（绝大多数请求）直接放行，
+    不访问数据库；命中时再查表确认，确认结果缓存在内存中，误判的令牌之后也不再查表。
+    其他进程吊销的令牌最多在REVOCATION_SYNC_SECONDS后生效，当前进程吊销的令牌立即生效
+
+    Attributes:
+        capacity: 布隆过滤器的初始容量，吊销数超过容量时按实际数量的两倍重建
+        error_rate: 布隆过滤器的误判率
+    """
+
+    def __init__(self, capacity: int = REVOCATION_BLOOM_CAPACITY, error_rate: float = REVOCATION_BLOOM_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._count = 0
+        self._cursor = None  # 已同步的最大吊销时间
+        self._confirmed = TTLCache(maxsize=10000)  # jti -> 是否确实已吊销
+        self._lock = threading.Lock()
+        self.bloom_hits = 0
+        self.false_positives = 0
+
+    def _add(self, jti: str):
+        """加入布隆过滤器，调用方需持有锁"""
+        self._bloom.add(jti)
+        self._count += 1
+
+    def is_revoked(self, jti: str) -> bool:
+        """判断令牌是否已被吊销，没有jti的旧令牌无法吊销
+
+        布隆过滤器命中且没有缓存的确认结果时会查询数据库，在事件循环中应先调用lookup，
+        返回None时再在线程池中调用confirm
+        """
+        revoked = self.lookup(jti)
+        return self.confirm(jti) if revoked is None else revoked
+
+    def lookup(self, jti: str) -> Optional[bool]:
+        """只用内存中的布隆过滤器和已确认结果判断令牌是否已被吊销，不访问数据库
+
+        Returns:
+            Optional[bool]: 是否已吊销，需要查询数据库确认时返回None
+        """
+        if not jti or jti not in self._bloom:
+            return False
+        self.bloom_hits += 1
+        return self._confirmed.get(jti)
+
+    def confirm(self, jti: str) -> bool:
+        """查询吊销表确认布隆过滤器命中的令牌是否已被吊销，并缓存确认结果"""
+        db = SessionLocal()
+        try:
+            revoked = db.get(RevokedToken, jti) is not None
+        finally:
+            db.close()
+        if not revoked:
+            self.false_positives += 1
+        self._confirmed.set(jti, revoked)
+        return revoked
+
+    def revoke(self, jti: str, user_id: str, expires_at: datetime):
+        """吊销令牌，写入共享的吊销表并立即在当前进程生效"""
+        db = SessionLocal()
+        try:
+            db.add(RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at))
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # 已经吊销过
+        finally:
+            db.close()
+        with self._lock:
+            self._add(jti)
+        self._confirmed.set(jti, True)
+
+    def sync(self, full: bool = False) -> int:
+        """从吊销表加载新吊销的令牌，返回加载的条数
+
+        Args:
+            full: 是否全量重建布隆过滤器，吊销数超过容量时自动全量重建
+        """
+        cursor = None if full else self._cursor
+        db = SessionLocal()
+        try:
+            query = db.query(RevokedToken.jti, RevokedToken.revoked_at).filter(
+                RevokedToken.expires_at > datetime.utcnow())
+            if cursor is not None:
+                query = query.filter(RevokedToken.revoked_at >= cursor - SYNC_OVERLAP)
+            rows = query.all()
+        finally:
+            db.close()
+
+        with self._lock:
+            if full:
+                # 建好新的过滤器后再替换，重建期间旧过滤器仍然有效
+                bloom = BloomFilter(max(self.capacity, len(rows) * 2), self.error_rate)
+                for jti, _ in rows:
+                    bloom.add(jti)
+                self._bloom, self._count, self._cursor = bloom, len(rows), None
+            elif self._count + len(rows) > self._bloom.capacity:
+                rows = None
+            else:
+                for jti, _ in rows:
+                    if jti not in self._bloom:
+                        self._add(jti)
+            if rows:
+                latest = max((revoked_at for _, revoked_at in rows if revoked_at), default=None)
+                if latest and (self._cursor is None or latest > self._cursor):
+                    self._cursor = latest
+        if rows is None:
+            return self.sync(full=True)
+        for jti, _ in rows:
+            self._confirmed.pop(jti)  # 丢弃之前缓存的未吊销结果，下次校验时重新确认
+        return len(rows)
+
+    def purge_expired(self) -> int:
+        """删除已过期的吊销记录并重建布隆过滤器，过期令牌本身已无法通过校验"""
+        db = SessionLocal()
+        try:
+            deleted = db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= datetime.utcnow())).rowcount
+            db.commit()
+        finally:
+            db.close()
+        self.sync(full=True)
+        return deleted
+
+    def stats(self) -> dict:
+        """返回布隆过滤器和查表统计"""
+        return {
+            "revoked": self._count,
+            "bloomCapacity": self._bloom.capacity,
+            "bloomBits": self._bloom.size,
+            "bloomHashes": self._bloom.hash_count,
+            "bloomHits": self.bloom_hits,
+            "falsePositives": self.false_positives,
+        }
+
+
+# 全局的已吊销令牌列表
+revocation_list = RevocationList()
+
+
+async def run_revocation_sync_loop():
+    """后台定时同步其他进程吊销的令牌，并定期清理过期的吊销记录"""
+    last_purge = time.monotonic()
+    while True:
+        await asyncio.sleep(REVOCATION_SYNC_SECONDS)
+        try:
+            # 在线程池中执行同步数据库操作，避免阻塞事件循环
+            if time.monotonic() - last_purge >= REVOCATION_PURGE_SECONDS:
+                deleted = await asyncio.to_thread(revocation_list.purge_expired)
+                last_purge = time.monotonic()
+                if deleted:
+                    print(f"已清理 {deleted} 条过期的令牌吊销记录")
+            else:
+                await asyncio.to_thread(revocation_list.sync)
+        except Exception as e:
+            print(f"令牌吊销列表同步失败: {str(e)}")
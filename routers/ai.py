@@ -10,12 +10,19 @@ from database import get_db  # 数据库会话依赖
 from models import User  # 用户模型
 from utils import get_current_user  # 用户认证依赖
 from config import ALLOWED_AUDIO_FORMATS  # 导入支持的音频格式配置
+from responses import ApiResponse, api_response  # 统一响应格式
+from pydantic import BaseModel  # 数据验证
 
 # 创建路由器
 router = APIRouter()
 
+# 语音识别响应模型
+class SpeechText(BaseModel):
+    """语音识别结果"""
+    text: str  # 识别出的文本
+
 # 语音识别接口
-@router.post("/speech-to-text")
+@router.post("/speech-to-text", response_model=ApiResponse[SpeechText])
 async def speech_to_text(
     audio: UploadFile = File(...),  # 上传的音频文件
     current_user: User = Depends(get_current_user),  # 当前认证用户
@@ -56,13 +63,9 @@ async def speech_to_text(
         recognized_text = "这是从语音中识别出的文本。在实际应用中，这里应该是真实的语音识别结果。"
         
         # 返回响应
-        return {
-            "code": 200,  # 状态码
-            "message": "success",  # 状态消息
-            "data": {
-                "text": recognized_text  # 识别出的文本
-            }
-        }
+        return api_response({
+            "text": recognized_text  # 识别出的文本
+        })
     finally:
         # 清理临时文件
         temp_file.close()  # 关闭文件
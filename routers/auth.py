@@ -1,5 +1,6 @@
 # 导入必要的模块
 from fastapi import APIRouter, Depends, HTTPException, status  # FastAPI相关组件
+from fastapi.concurrency import run_in_threadpool  # 在线程池中执行同步调用
 from sqlalchemy.orm import Session  # 数据库会话
 from typing import Optional  # 类型提示
 import jwt  # JWT令牌处理
@@ -12,7 +13,10 @@ from pydantic import BaseModel  # 数据验证
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, WECHAT_APPID, WECHAT_SECRET, WECHAT_LOGIN_URL  # 配置
 from database import get_db  # 数据库依赖
 from models import User, UserSettings  # 数据模型
-from utils import get_current_user  # 导入认证依赖
+from utils import get_token_payload  # 导入认证依赖
+from revocation import revocation_list  # 已吊销令牌
+from ids import new_id  # 生成令牌唯一标识
+from responses import ApiResponse, api_response  # 统一响应格式
 
 # 创建路由器
 router = APIRouter()
@@ -28,6 +32,21 @@ class WechatLoginRequest(BaseModel):
     code: str  # 微信登录临时凭证
     userInfo: dict  # 用户信息
 
+# 登录用户信息响应模型
+class LoginUserInfo(BaseModel):
+    """登录接口返回的用户信息"""
+    id: str  # 用户ID
+    openid: str  # 微信openid
+    nickName: Optional[str] = None  # 用户昵称
+    avatar: Optional[str] = None  # 用户头像
+    createdAt: str  # 创建时间
+
+# 登录响应数据模型
+class LoginData(BaseModel):
+    """登录接口返回的数据"""
+    token: str  # JWT访问令牌
+    userInfo: LoginUserInfo  # 用户信息
+
 # 创建JWT令牌
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """创建JWT访问令牌
@@ -44,14 +63,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta  # 使用指定的过期时间
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)  # 使用默认过期时间
-    to_encode.update({"exp": expire})  # 添加过期时间声明
+    to_encode.update({"exp": expire, "jti": new_id()})  # 添加过期时间和唯一标识声明，jti用于退出登录时吊销
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)  # 编码JWT
     return encoded_jwt
 
-# 使用utils.py中的get_current_user函数
-
 # 微信登录接口
-@router.post("/wechat-login")
+@router.post("/wechat-login", response_model=ApiResponse[LoginData])
 async def wechat_login(request: WechatLoginRequest, db: Session = Depends(get_db)):
     """微信小程序登录接口
     
@@ -69,7 +86,7 @@ async def wechat_login(request: WechatLoginRequest, db: Session = Depends(get_db
     """
     # 调用微信接口获取openid
     url = f"{WECHAT_LOGIN_URL}?appid={WECHAT_APPID}&secret={WECHAT_SECRET}&js_code={request.code}&grant_type=authorization_code"
-    response = requests.get(url)  # 发送HTTP请求
+    response = await run_in_threadpool(requests.get, url, timeout=10)  # 在线程池中发送HTTP请求，不阻塞事件循环
     result = response.json()  # 解析JSON响应
     
     # 检查微信接口返回的错误
@@ -106,41 +123,33 @@ async def wechat_login(request: WechatLoginRequest, db: Session = Depends(get_db
     )
     
     # 返回响应
-    return {
-        "code": 200,
-        "message": "success",
-        "data": {
-            "token": access_token,  # JWT访问令牌
-            "userInfo": {  # 用户信息
-                "id": user.id,
-                "openid": user.openid,
-                "nickName": user.nick_name,
-                "avatar": user.avatar,
-                "createdAt": user.created_at.isoformat()  # 格式化创建时间
-            }
+    return api_response({
+        "token": access_token,  # JWT访问令牌
+        "userInfo": {  # 用户信息
+            "id": user.id,
+            "openid": user.openid,
+            "nickName": user.nick_name,
+            "avatar": user.avatar,
+            "createdAt": user.created_at.isoformat()  # 格式化创建时间
         }
-    }
+    })
 
 # 退出登录接口
-@router.post("/logout")
-async def logout(current_user: User = Depends(get_current_user)):
+@router.post("/logout", response_model=ApiResponse[None])
+async def logout(payload: dict = Depends(get_token_payload)):
     """退出登录接口
     
-    处理用户退出登录请求
-    注意：由于JWT是无状态的，服务端无法真正使已颁发的令牌失效
-    在实际应用中，应使用令牌黑名单或Redis缓存来实现令牌失效
+    吊销当前令牌：令牌的jti写入revoked_tokens表，当前进程立即拒绝该令牌，
+    其他进程在下一次同步后拒绝。没有jti的旧令牌无法吊销，只能等待过期
     
     Args:
-        current_user: 当前认证用户，由get_current_user依赖项提供
+        payload: 当前令牌的载荷，由get_token_payload依赖项提供
         
     Returns:
         dict: 退出登录响应
     """
-    # 由于JWT是无状态的，服务端无法真正使令牌失效
-    # 在实际应用中，可以使用令牌黑名单或Redis缓存来实现令牌失效
-    # 这里简化处理，直接返回成功
-    return {
-        "code": 200,
-        "message": "已成功退出登录",
-        "data": None
-    }
\ No newline at end of file
+    jti = payload.get("jti")
+    if jti:
+        expires_at = datetime.utcfromtimestamp(payload["exp"])
+        await run_in_threadpool(revocation_list.revoke, jti, payload["sub"], expires_at)  # 写入吊销表
+    return api_response(None, message="已成功退出登录")
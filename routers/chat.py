@@ -1,19 +1,36 @@
 # 导入必要的模块
-from fastapi import APIRouter, Depends, HTTPException, status  # FastAPI相关组件
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status  # FastAPI相关组件
+from fastapi.concurrency import run_in_threadpool  # 在线程池中执行同步调用
 from sqlalchemy.orm import Session  # 数据库会话
+from sqlalchemy.dialects.mysql import match  # MySQL全文检索
+from typing import List  # 类型提示
 from typing import Optional  # 类型提示
 from pydantic import BaseModel  # 数据验证
 from datetime import datetime  # 日期时间处理
 import uuid  # 生成唯一标识符
 import json  # 用于解析JSON数据
-from fastapi.responses import JSONResponse  # 用于返回JSON响应
+import asyncio  # 并发执行批量生成
+import time  # 截止时间计算
+import orjson  # 流式响应逐行序列化
+from fastapi.responses import JSONResponse, Response, StreamingResponse  # 用于返回JSON响应
 
 # 导入项目内部模块
 
-from database import get_db  # 数据库会话依赖
-from models import User, ChatSession, ChatMessage  # 数据模型
-from routers.chatwithdeepseek import deepseek_optimize_prompt, get_deepseek_client, text2image, test_text2image_connection
+from database import SessionLocal, get_db, get_read_db  # 数据库会话依赖和会话工厂
+from models import User, UserSettings, ChatSession, ChatMessage  # 数据模型
+from routers.chatwithdeepseek import (
+    deepseek_optimize_prompt, get_deepseek_client, generate_image, is_image_success, test_text2image_connection,
+    translate_text, generate_review, generate_friend_circle_post, generate_xiaohongshu_post,
+    generate_bargain_script, generate_cooking_recipe
+)
+from deadline import run_until_disconnect, ClientDisconnected, DeadlineExceeded, request_deadline  # 请求截止时间与取消
+from image_store import image_store  # 生成图片结果存储
+from idempotency import anonymous_scope, idempotency_store  # 幂等请求
+from outbox import add_message_event  # 事务性发件箱
+from limiter import LimiterRejected  # DeepSeek并发限制
 from utils import get_current_user  # 用户认证依赖
+from responses import ApiResponse, api_response  # 统一响应格式
+from config import CHAT_SEARCH_FULLTEXT, CHAT_SEARCH_COMPRESSED_SCAN, CHAT_BATCH_MAX_ITEMS, CHAT_BATCH_CONCURRENCY  # 搜索与批量生成配置
 
 # 创建路由器
 router = APIRouter()
@@ -29,38 +46,98 @@ class MessageRequest(BaseModel):
     content: str  # 消息内容
     sessionId: Optional[str] = None  # 会话ID，可选
 
+# AI回复响应模型
+class MessageReply(BaseModel):
+    """AI回复内容"""
+    content: str  # AI回复内容
+    time: str  # 回复时间
+
+# 发送消息响应数据模型
+class SendMessageData(BaseModel):
+    """发送消息接口返回的数据"""
+    sessionId: str  # 会话ID
+    messageId: str  # 消息ID
+    reply: MessageReply  # AI回复
+
 # 发送消息接口
-@router.post("/message")
-async def send_message(request: MessageRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.post("/message", response_model=ApiResponse[SendMessageData])
+async def send_message(request: MessageRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db),
+                       idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     """发送消息接口
     
-    处理用户发送的消息，获取AI回复并保存对话记录
+    处理用户发送的消息，获取AI回复并保存对话记录。
+    用户关闭保存历史记录（save_history）时不写入会话和消息。
+    请求头带Idempotency-Key时，相同键的重试不会重复写入消息，返回第一次请求的结果，
+    响应头Idempotent-Replayed: true表示结果来自之前的请求
     
     Args:
         request: 消息请求数据
         current_user: 当前认证用户，由get_current_user依赖项提供
         db: 数据库会话，由get_db依赖项提供
+        idempotency_key: 幂等键，客户端为每条消息生成一次，重试时保持不变
         
     Returns:
         dict: 包含会话ID、消息ID和AI回复的响应
         
+    Raises:
+        HTTPException: 当指定的会话不存在时抛出404错误，幂等键已用于其他消息时抛出422错误
+    """
+    if not idempotency_key:
+        # 在线程池中执行同步数据库操作，避免阻塞事件循环
+        return api_response(await run_in_threadpool(save_message, db, current_user.id, request))
+
+    user_id = current_user.id
+
+    def save_in_new_session():
+        # 处理可能在请求结束后继续进行，使用独立的数据库会话
+        task_db = SessionLocal()
+        try:
+            return save_message(task_db, user_id, request)
+        finally:
+            task_db.close()
+
+    data, replayed = await idempotency_store.execute(
+        idempotency_key, user_id, "chat.message", request.model_dump(),
+        lambda: run_in_threadpool(save_in_new_session)
+    )
+    return api_response(data, headers={"Idempotent-Replayed": "true"} if replayed else None)
+
+def save_message(db: Session, user_id: str, request: MessageRequest) -> dict:
+    """获取AI回复并保存对话记录，返回发送消息接口的响应数据
+
     Raises:
         HTTPException: 当指定的会话不存在时抛出404错误
     """
+    # 这里应该调用AI服务获取回复
+    # 在实际应用中，可能需要调用OpenAI API或其他AI服务
+    ai_reply = "这是AI的回复。在实际应用中，这里应该调用AI服务获取真实回复。"
+    
+    # 用户关闭了保存历史记录时，只返回回复，不写入数据库
+    settings = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
+    if settings and not settings.save_history:
+        return {
+            "sessionId": request.sessionId or str(uuid.uuid4()),  # 未保存的临时会话ID
+            "messageId": str(uuid.uuid4()),  # 未保存的临时消息ID
+            "reply": {
+                "content": ai_reply,
+                "time": datetime.utcnow().isoformat()
+            }
+        }
+    
     # 获取或创建会话
     session = None
     if request.sessionId:
         # 如果提供了会话ID，查找该会话
         session = db.query(ChatSession).filter(
             ChatSession.id == request.sessionId,
-            ChatSession.user_id == current_user.id  # 确保会话属于当前用户
+            ChatSession.user_id == user_id  # 确保会话属于当前用户
         ).first()
         
         if not session:
             raise HTTPException(status_code=404, detail="会话不存在")
     else:
         # 如果没有提供会话ID，创建新会话
-        session = ChatSession(user_id=current_user.id)
+        session = ChatSession(user_id=user_id)
         db.add(session)  # 添加到数据库会话
         db.commit()  # 提交事务
         db.refresh(session)  # 刷新对象
@@ -72,13 +149,10 @@ async def send_message(request: MessageRequest, current_user: User = Depends(get
         content=request.content
     )
     db.add(user_message)  # 添加到数据库会话
+    add_message_event(db, user_message, user_id)  # 事件与消息在同一事务中写入
     db.commit()  # 提交事务
     db.refresh(user_message)  # 刷新对象
     
-    # 这里应该调用AI服务获取回复
-    # 在实际应用中，可能需要调用OpenAI API或其他AI服务
-    ai_reply = "这是AI的回复。在实际应用中，这里应该调用AI服务获取真实回复。"
-    
     # 创建AI回复消息记录
     ai_message = ChatMessage(
         session_id=session.id,
@@ -86,6 +160,7 @@ async def send_message(request: MessageRequest, current_user: User = Depends(get
         content=ai_reply
     )
     db.add(ai_message)  # 添加到数据库会话
+    add_message_event(db, ai_message, user_id)  # 事件与消息在同一事务中写入
     db.commit()  # 提交事务
     db.refresh(ai_message)  # 刷新对象
     
@@ -93,26 +168,201 @@ async def send_message(request: MessageRequest, current_user: User = Depends(get
     session.updated_at = datetime.utcnow()
     db.commit()  # 提交事务
     
-    # 返回响应
+    # 返回响应数据
     return {
-        "code": 200,
-        "message": "success",
-        "data": {
-            "sessionId": session.id,  # 会话ID
-            "messageId": ai_message.id,  # 消息ID
-            "reply": {
-                "content": ai_message.content,  # AI回复内容
-                "time": ai_message.created_at.isoformat()  # 格式化创建时间
-            }
+        "sessionId": session.id,  # 会话ID
+        "messageId": ai_message.id,  # 消息ID
+        "reply": {
+            "content": ai_message.content,  # AI回复内容
+            "time": ai_message.created_at.isoformat()  # 格式化创建时间
         }
     }
 
-@router.get("/chatAi")
-async def chat_ai(message: str, functionType: str = None, functionValue: str = None):
+async def dispatch_chat_function(message: str, functionType: str = None, functionValue: str = None):
+    """
+    根据功能类型调用对应的DeepSeek生成函数
+
+    Args:
+        message: 用户发送的消息内容
+        functionType: 功能类型，为空时使用常规AI回复
+        functionValue: 功能附加值
+
+    Returns:
+        str: AI回复内容
+    """
+    # 根据是否启用附加功能决定处理方式
+    if not functionType:
+        # 无附加功能，使用常规AI回复
+        return await get_deepseek_client(message)
+    
+    print(f"使用附加功能: {functionType}")
+    
+    # 翻译功能
+    if functionType.startswith("翻译"):
+        return await translate_text(message, functionType)
+    # 评价功能
+    elif functionType.startswith("评价"):
+        return await generate_review(message, functionType[2:], functionValue)
+    # 朋友圈文案功能
+    elif functionType.startswith("朋友圈"):
+        return await generate_friend_circle_post(message, functionType[3:], functionValue)
+    # 小红书文案功能
+    elif functionType.startswith("小红书"):
+        return await generate_xiaohongshu_post(message, functionType[3:], functionValue)
+    # 砍价话术功能
+    elif functionType.startswith("砍价"):
+        return await generate_bargain_script(message, functionType[2:], functionValue)
+    # 做菜达人功能
+    elif functionType.startswith("做菜达人"):
+        return await generate_cooking_recipe(message)
+    # 不支持的功能类型
+    return f"不支持的功能类型: {functionType}"
+
+# 全文检索的最短关键词长度，与MySQL的ngram_token_size保持一致
+SEARCH_NGRAM_SIZE = 2
+
+# 搜索结果条目模型
+class SearchResultItem(BaseModel):
+    """聊天记录搜索结果条目"""
+    messageId: str  # 消息ID
+    sessionId: str  # 会话ID
+    sessionTitle: Optional[str] = None  # 会话标题
+    isUser: bool  # 是否为用户消息
+    snippet: str  # 命中内容片段
+    time: str  # 消息时间
+
+# 搜索结果数据模型
+class SearchData(BaseModel):
+    """聊天记录搜索结果"""
+    items: List[SearchResultItem]  # 当前页结果
+    page: int  # 当前页码
+    pageSize: int  # 每页条数
+    hasMore: bool  # 是否还有下一页
+    partial: bool = False  # 压缩存储的长消息超过扫描上限，更早的长消息未被检索
+
+def _make_snippet(content: str, keyword: str, width: int = 60) -> str:
+    """截取关键词附近的内容片段"""
+    pos = content.lower().find(keyword.lower())
+    if pos < 0:
+        return content[:width * 2]
+    start = max(0, pos - width)
+    end = min(len(content), pos + len(keyword) + width)
+    return ("..." if start > 0 else "") + content[start:end] + ("..." if end < len(content) else "")
+
+# 搜索聊天记录接口
+def build_search_query(db: Session, user_id: str, keyword: str):
+    """构造聊天记录检索查询，返回(消息, 会话标题)查询，未排序和分页
+
+    MySQL下使用ngram全文索引，其他数据库、关键词过短或关闭CHAT_SEARCH_FULLTEXT时退化为LIKE匹配。
+    压缩存储的长消息无法按原文匹配，由search_compressed_messages检索。
+    查询基准测试也使用该函数，保证测量的是接口实际执行的查询
+    """
+    query = db.query(ChatMessage, ChatSession.title).join(
+        ChatSession, ChatMessage.session_id == ChatSession.id
+    ).filter(
+        ChatSession.user_id == user_id,  # 只检索当前用户的会话
+        ChatMessage.is_compressed.is_(False)  # 压缩存储的长消息无法按原文匹配
+    )
+
+    if CHAT_SEARCH_FULLTEXT and db.get_bind().dialect.name == "mysql" and len(keyword) >= SEARCH_NGRAM_SIZE:
+        # 以短语方式匹配，要求关键词的ngram连续出现
+        phrase = '"' + keyword.replace('"', " ") + '"'
+        query = query.filter(match(ChatMessage.content, against=phrase).in_boolean_mode())
+    else:
+        # 转义LIKE通配符，按字面量匹配
+        escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.filter(ChatMessage.content.like(f"%{escaped}%", escape="\\"))
+
+    return query
+
+def search_compressed_messages(db: Session, user_id: str, keyword: str, scan_limit: int = CHAT_SEARCH_COMPRESSED_SCAN):
+    """在压缩存储的长消息中检索关键词
+
+    压缩后的内容无法用索引或LIKE匹配，按时间从新到旧读取当前用户最近scan_limit条压缩消息，解压后匹配
+
+    Returns:
+        tuple: (按时间倒序的(消息, 会话标题)列表, 是否达到扫描上限)
+    """
+    rows = db.query(ChatMessage, ChatSession.title).join(
+        ChatSession, ChatMessage.session_id == ChatSession.id
+    ).filter(
+        ChatSession.user_id == user_id,
+        ChatMessage.is_compressed.is_(True)
+    ).order_by(ChatMessage.created_at.desc()).limit(scan_limit + 1).all()
+    needle = keyword.casefold()
+    matches = [(message, title) for message, title in rows[:scan_limit] if needle in message.content.casefold()]
+    return matches, len(rows) > scan_limit
+
+def run_search(db: Session, user_id: str, keyword: str, page: int, page_size: int) -> dict:
+    """执行聊天记录检索并分页，合并普通消息和压缩消息的结果"""
+    end = page * page_size
+    # 多取一条用于判断是否还有下一页，避免额外的COUNT查询
+    rows = build_search_query(db, user_id, keyword).order_by(ChatMessage.created_at.desc()).limit(end + 1).all()
+    compressed, partial = search_compressed_messages(db, user_id, keyword)
+    if compressed:
+        rows = sorted(rows + compressed, key=lambda row: row[0].created_at, reverse=True)
+
+    items = [{
+        "messageId": message.id,
+        "sessionId": message.session_id,
+        "sessionTitle": title,
+        "isUser": message.is_user,
+        "snippet": _make_snippet(message.content, keyword),
+        "time": message.created_at.isoformat()
+    } for message, title in rows[end - page_size:end]]
+
+    return {
+        "items": items,
+        "page": page,
+        "pageSize": page_size,
+        "hasMore": len(rows) > end,
+        "partial": partial
+    }
+
+@router.get("/search", response_model=ApiResponse[SearchData])
+async def search_messages(
+    q: str,
+    page: int = 1,
+    pageSize: int = 20,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """搜索聊天记录接口
+    
+    在当前用户的聊天记录中按关键词检索，按时间倒序分页返回。
+    MySQL下使用ngram全文索引，其他数据库、关键词过短或关闭CHAT_SEARCH_FULLTEXT时退化为LIKE匹配。
+    压缩存储的长消息解压后匹配，最多检索最近CHAT_SEARCH_COMPRESSED_SCAN条，超过时partial为true。
+    查询走只读副本，在线程池中执行
+    
+    Args:
+        q: 搜索关键词
+        page: 页码，从1开始
+        pageSize: 每页条数，最大50
+        current_user: 当前认证用户，由get_current_user依赖项提供
+        db: 只读数据库会话，由get_read_db依赖项提供
+        
+    Returns:
+        dict: 包含搜索结果的响应
+    """
+    keyword = q.strip()
+    if not keyword:
+        return api_response(None, message="搜索关键词不能为空", code=400)
+    page = max(page, 1)
+    pageSize = min(max(pageSize, 1), 50)
+    
+    # 解压长消息和匹配都是同步计算，放到线程池中避免阻塞事件循环
+    data = await run_in_threadpool(run_search, db, current_user.id, keyword, page, pageSize)
+    return api_response(data)
+
+@router.get("/chatAi", response_model=ApiResponse[str])
+async def chat_ai(request: Request, message: str, functionType: str = None, functionValue: str = None):
     """
     使用deepseek api回复消息，支持额外功能（翻译、评价生成、朋友圈文案、小红书文案、砍价话术）
+
+    客户端断开或超过请求截止时间时取消对DeepSeek的调用
     
     Args:
+        request: 当前请求，用于检测客户端是否断开
         message: 用户发送的消息内容
         functionType: 功能类型，如"翻译中译英"、"评价好评"、"朋友圈生日"等
         functionValue: 功能附加值，如评价功能中的字数要求："二十字"、"三十字"等
@@ -127,114 +377,241 @@ async def chat_ai(message: str, functionType: str = None, functionValue: str = N
         
         if not message:
             print("消息内容为空")
-            return {
-                "code": 400,
-                "message": "消息内容不能为空",
-                "data": None
-            }
+            return api_response(None, message="消息内容不能为空", code=400)
         
-        # 根据是否启用附加功能决定处理方式
-        if functionType:
-            print(f"使用附加功能: {functionType}")
-            
-            # 翻译功能
-            if functionType.startswith("翻译"):
-                from routers.chatwithdeepseek import translate_text
-                response = translate_text(message, functionType)
-                
-            # 评价功能
-            elif functionType.startswith("评价"):
-                from routers.chatwithdeepseek import generate_review
-                response = generate_review(message, functionType[2:], functionValue)
-                
-            # 朋友圈文案功能
-            elif functionType.startswith("朋友圈"):
-                from routers.chatwithdeepseek import generate_friend_circle_post
-                response = generate_friend_circle_post(message, functionType[3:], functionValue)
-                
-            # 小红书文案功能
-            elif functionType.startswith("小红书"):
-                from routers.chatwithdeepseek import generate_xiaohongshu_post
-                response = generate_xiaohongshu_post(message, functionType[3:], functionValue)
-                
-            # 砍价话术功能
-            elif functionType.startswith("砍价"):
-                from routers.chatwithdeepseek import generate_bargain_script
-                response = generate_bargain_script(message, functionType[2:], functionValue)
-                
-            # 做菜达人功能
-            elif functionType.startswith("做菜达人"):
-                from routers.chatwithdeepseek import generate_cooking_recipe
-                response = generate_cooking_recipe(message)
-                
-            # 不支持的功能类型
-            else:
-                response = f"不支持的功能类型: {functionType}"
-                
-        # 无附加功能，使用常规AI回复
-        else:
-            response = get_deepseek_client(message)
+        response = await run_until_disconnect(request, dispatch_chat_function(message, functionType, functionValue))
             
         print(f"AI响应: {response}")
         
         if response:
-            return {
-                "code": 200,
-                "message": "success",
-                "data": response
-            }
+            return api_response(response)
         else:
-            return {
-                "code": 500,
-                "message": "error",
-                "data": "AI回复失败"
-            }
+            return api_response("AI回复失败", message="error", code=500)
+    except ClientDisconnected:
+        print("客户端已断开，已取消AI请求")
+        return Response(status_code=499)
+    except DeadlineExceeded:
+        print("AI请求超过截止时间，已取消")
+        return api_response("AI回复超时，请稍后再试", message="error", code=504)
+    except LimiterRejected as e:
+        print(f"DeepSeek并发已满，快速拒绝: {str(e)}")
+        return api_response("服务繁忙，请稍后再试", message="error", code=503)
     except Exception as e:
         print(f"处理AI聊天请求时出错: {str(e)}")
         import traceback
         error_trace = traceback.format_exc()
         print(f"详细错误堆栈: {error_trace}")
-        return {
-            "code": 500,
-            "message": "error",
-            "data": f"处理请求失败: {str(e)}"
-        }
+        return api_response(f"处理请求失败: {str(e)}", message="error", code=500)
+
+# 批量生成条目模型
+class BatchChatItem(BaseModel):
+    """批量生成中的一项，参数与/chatAi相同"""
+    message: str  # 用户发送的消息内容
+    functionType: Optional[str] = None  # 功能类型
+    functionValue: Optional[str] = None  # 功能附加值
+
+# 批量生成请求模型
+class BatchChatRequest(BaseModel):
+    """批量生成请求
+
+    Attributes:
+        items: 要生成的条目列表
+        stream: 是否以NDJSON流式返回，每完成一项输出一行
+    """
+    items: List[BatchChatItem]  # 生成条目
+    stream: bool = False  # 是否流式返回
+
+# 批量生成结果模型
+class BatchChatResult(BaseModel):
+    """批量生成中一项的结果"""
+    index: int  # 条目在请求中的下标
+    ok: bool  # 是否生成成功
+    result: str  # AI回复内容或错误信息
+
+async def _run_batch_item(semaphore: asyncio.Semaphore, index: int, item: BatchChatItem) -> dict:
+    """在并发上限内生成一项，异常转换为失败结果，不影响同批其他条目"""
+    async with semaphore:
+        try:
+            response = await dispatch_chat_function(item.message, item.functionType, item.functionValue)
+        except LimiterRejected:
+            return {"index": index, "ok": False, "result": "服务繁忙，请稍后再试"}
+        except Exception as e:
+            print(f"批量生成第{index}项出错: {str(e)}")
+            return {"index": index, "ok": False, "result": f"处理请求失败: {str(e)}"}
+    if not response:
+        return {"index": index, "ok": False, "result": "AI回复失败"}
+    return {"index": index, "ok": True, "result": response}
+
+async def _stream_batch(semaphore: asyncio.Semaphore, items: List[BatchChatItem]):
+    """按完成顺序逐行输出批量生成结果
+
+    超过请求截止时间时为未完成的条目输出超时结果；
+    客户端断开时响应任务被取消，finally中取消所有未完成的DeepSeek调用
+    """
+    tasks = {asyncio.create_task(_run_batch_item(semaphore, i, item)): i for i, item in enumerate(items)}
+    pending = set(tasks)
+    deadline = request_deadline.get()
+    try:
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                for task in sorted(pending, key=tasks.get):
+                    yield orjson.dumps({"index": tasks[task], "ok": False, "result": "AI回复超时，请稍后再试"}) + b"\n"
+                break
+            for task in done:
+                yield orjson.dumps(task.result()) + b"\n"
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+@router.post("/chatAi/batch", response_model=ApiResponse[List[BatchChatResult]])
+async def chat_ai_batch(request: Request, batch: BatchChatRequest):
+    """
+    批量调用DeepSeek生成多个结果，如同一段文字的多种字数评价或多种语言翻译
+
+    各条目并发执行，同一批次内最多同时进行CHAT_BATCH_CONCURRENCY个调用。
+    单个条目失败只影响该条目的结果。
+    stream为true时以application/x-ndjson逐行返回，每完成一项输出一行{"index", "ok", "result"}；
+    否则等全部完成后按请求顺序返回结果列表
+
+    Args:
+        request: 当前请求，用于检测客户端是否断开
+        batch: 批量生成请求
+
+    Returns:
+        dict: 包含各条目结果的响应，或NDJSON流式响应
+    """
+    if not batch.items:
+        return api_response(None, message="生成条目不能为空", code=400)
+    if len(batch.items) > CHAT_BATCH_MAX_ITEMS:
+        return api_response(None, message=f"单次最多生成{CHAT_BATCH_MAX_ITEMS}项", code=400)
+    if any(not item.message for item in batch.items):
+        return api_response(None, message="消息内容不能为空", code=400)
+
+    print(f"批量生成: {len(batch.items)}项, 流式: {batch.stream}")
+    semaphore = asyncio.Semaphore(CHAT_BATCH_CONCURRENCY)
+    if batch.stream:
+        return StreamingResponse(_stream_batch(semaphore, batch.items), media_type="application/x-ndjson")
+
+    try:
+        results = await run_until_disconnect(request, asyncio.gather(
+            *[_run_batch_item(semaphore, i, item) for i, item in enumerate(batch.items)]
+        ))
+        return api_response(results)
+    except ClientDisconnected:
+        print("客户端已断开，已取消批量AI请求")
+        return Response(status_code=499)
+    except DeadlineExceeded:
+        print("批量AI请求超过截止时间，已取消")
+        return api_response("AI回复超时，请稍后再试", message="error", code=504)
     
 
+class ImageGenerationFailed(Exception):
+    """图片生成失败，幂等记录随之删除，相同键的重试会重新生成
+
+    Attributes:
+        image_key: 结果存储键
+        response: 图片API或重试循环返回的失败响应体
+    """
+
+    def __init__(self, image_key: Optional[str], response: str):
+        super().__init__("图片生成失败")
+        self.image_key = image_key
+        self.response = response
+
+
+def _generate_image_or_raise(message: str) -> tuple:
+    """生成图片，失败时抛出ImageGenerationFailed，避免失败结果被保存为幂等结果"""
+    image_key, response = generate_image(message)
+    if not is_image_success(response):
+        raise ImageGenerationFailed(image_key, response)
+    return image_key, response
+
+
 @router.get("/text2imagewithdeepseek")
-async def text2imagewithdeepseek(message: str):
+async def text2imagewithdeepseek(request: Request, message: str, passthrough: bool = False,
+                                 idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+                                 device_id: Optional[str] = Header(None, alias="X-Device-Id")):
     """
     生成图片的接口
+
+    响应头X-Image-Key为结果在本地存储中的键，可通过/chat/images/{key}直接获取
+
+    客户端断开或超过请求截止时间时停止重试，不再等待图片API。
+    请求头带Idempotency-Key时，生成任务不随客户端断开而取消，相同键的重试接上进行中的生成，
+    不会再发起一次图片生成；响应头Idempotent-Replayed: true表示结果来自之前的请求
+
+    Args:
+        request: 当前请求，用于检测客户端是否断开
+        message: 用户的图片描述
+        passthrough: 为True时直接返回图片API的原始响应体，不再包装成{"result": "<JSON字符串>"}，
+            省去解析和二次编码，适合返回base64图片等大响应
+        idempotency_key: 幂等键，客户端为每次生成随机生成一次，重试时保持不变
+        device_id: 可选的设备ID，提供时幂等键按设备区分，切换网络后重试不受影响
     """
     try:
         print(f"收到文生图请求，消息内容: '{message[:100]}...'")
-        response = text2image(message)
+        replay_headers = {}
+        if idempotency_key:
+            async def generate():
+                image_key, response = await run_in_threadpool(_generate_image_or_raise, message)
+                return {"imageKey": image_key, "response": response}
+
+            # 接口不需要登录，幂等键按设备ID区分；不使用客户端地址，切换网络后的重试仍能接上之前的生成
+            scope = anonymous_scope(device_id)
+            try:
+                result, replayed = await run_until_disconnect(request, idempotency_store.execute(
+                    idempotency_key, scope, "chat.text2image", {"message": message}, generate))
+                image_key, response = result["imageKey"], result["response"]
+                if replayed:
+                    replay_headers["Idempotent-Replayed"] = "true"
+            except ImageGenerationFailed as failed:
+                image_key, response = failed.image_key, failed.response  # 原样返回失败响应，记录已删除
+        else:
+            # 在线程池中执行，避免阻塞事件循环
+            image_key, response = await run_until_disconnect(request, run_in_threadpool(generate_image, message))
         print(f"文生图请求处理完成，返回数据长度: {len(response)}")
+        key_headers = {"X-Image-Key": image_key, **replay_headers} if image_key else replay_headers or None
         
-        # 确保返回的是有效的JSON格式
-        try:
-            import json
-            # 尝试解析response确保是有效的JSON
-            if isinstance(response, str):
-                json_obj = json.loads(response)
-                # 已经是有效的JSON字符串，直接返回
-                return JSONResponse(content={"result": response})
-            else:
-                # 如果已经是对象，转为JSON字符串
-                return JSONResponse(content={"result": json.dumps(response)})
-        except Exception as json_err:
-            print(f"JSON处理错误: {str(json_err)}")
-            # 如果不是有效的JSON，包装为错误响应
-            return JSONResponse(content={
+        if passthrough:
+            # 原样透传图片API的响应体，不做任何解析或重新编码
+            return Response(content=response, media_type="application/json", headers=key_headers)
+        
+        # 兼容旧格式：结果作为JSON字符串放在result字段中，只编码一次
+        # generate_image总是返回JSON文本，这里只做首字符检查，不再完整解析一遍
+        if response.lstrip()[:1] in ("{", "["):
+            return JSONResponse(content={"result": response}, headers=key_headers)
+        
+        print("JSON处理错误: 图片API返回的不是JSON")
+        # 如果不是有效的JSON，包装为错误响应
+        return JSONResponse(content={
+            "result": json.dumps({
+                "success": False,
+                "error": "无效的响应格式",
+                "message": "服务器返回的数据不是有效的JSON格式"
+            })
+        })
+    except ClientDisconnected:
+        print("客户端已断开，已取消文生图请求")
+        return Response(status_code=499)
+    except DeadlineExceeded:
+        print("文生图请求超过截止时间，已取消")
+        return JSONResponse(
+            status_code=504,
+            content={
                 "result": json.dumps({
                     "success": False,
-                    "error": "无效的响应格式",
-                    "message": "服务器返回的数据不是有效的JSON格式"
+                    "error": "请求超时",
+                    "message": "图片生成超过请求截止时间，请稍后再试"
                 })
-            })
+            }
+        )
+    except HTTPException:
+        raise  # 幂等键冲突等请求错误按原状态码和响应头返回
     except Exception as e:
         print(f"文生图请求处理错误: {str(e)}")
-        import json
         import traceback
         error_trace = traceback.format_exc()
         print(f"详细错误堆栈: {error_trace}")
@@ -249,6 +626,22 @@ async def text2imagewithdeepseek(message: str):
             }
         )
 
+@router.get("/images/{image_key}")
+async def get_stored_image(image_key: str):
+    """
+    直接返回本地结果存储中已生成的图片结果
+
+    Args:
+        image_key: 结果存储键，即文生图接口响应头中的X-Image-Key
+    """
+    # 键为SHA-256十六进制摘要，校验格式避免路径穿越
+    if len(image_key) != 64 or any(c not in "0123456789abcdef" for c in image_key):
+        raise HTTPException(status_code=400, detail="无效的图片结果键")
+    body = await run_in_threadpool(image_store.get, image_key)  # 读取时同时刷新最近访问时间，在线程池中读取文件和数据库
+    if body is None:
+        raise HTTPException(status_code=404, detail="图片结果不存在或已过期")
+    return Response(content=body, media_type="application/json")
+
 # 添加测试API连接的端点
 @router.get("/test-text2image-connection")
 async def test_image_connection():
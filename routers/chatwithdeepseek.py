@@ -1,4 +1,5 @@
 from langchain_deepseek import ChatDeepSeek
+from langchain_openai import ChatOpenAI
 
 # 导入必要的模块
 import os
@@ -9,10 +10,30 @@ import requests
 from langchain_core.messages import HumanMessage, SystemMessage
 import json
 import time
+import unicodedata
+import contextvars
 import urllib3
+from concurrent.futures import ThreadPoolExecutor
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from cache import TTLCache
+from similarity_cache import SimilarityCache, parse_thresholds
+from image_store import image_store
+from deadline import remaining, is_cancelled, wait_or_cancelled, request_cancel_event, LinkedCancelEvent
+from limiter import AdaptiveLimiter, LimiterRejected
+from llm_router import Backend, GenerationProfile, LatencyWindow, ProviderRouter, parse_profiles, parse_routes
+from config import (
+    AI_API_KEY, AI_API_URL, AI_MODEL_NAME,
+    PROMPT_CACHE_SIZE, PROMPT_CACHE_TTL, SIMILAR_CACHE_THRESHOLDS, SIMILAR_CACHE_SIZE, SIMILAR_CACHE_TTL,
+    TEXT2IMAGE_SPECULATIVE_PRIMARY,
+    LLM_CONCURRENCY_INITIAL, LLM_CONCURRENCY_MIN, LLM_CONCURRENCY_MAX, LLM_LATENCY_TARGET,
+    LLM_QUEUE_TIMEOUT, LLM_MAX_QUEUE,
+    LLM_ROUTES, LLM_FAILOVER_HEDGE_AFTER, LLM_STATS_WINDOW, LLM_UNHEALTHY_ERROR_RATE,
+    LLM_HEDGE_ROUTES, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_DELAY, LLM_HEDGE_BUDGET, LLM_HEDGE_MEASURE_RATE,
+    LLM_PROFILES, LLM_DEFAULT_MAX_TOKENS
+)
+
 # 加载环境变量
 env = os.getenv("ENV", "development")
 load_dotenv(f".env.{env}")
@@ -39,14 +60,97 @@ headers = {
     "content-type": "application/json"
 }
 
+# 图片生成使用的模型和尺寸，同时作为结果存储内容地址的一部分
+TEXT2IMAGE_MODEL = "flux"
+TEXT2IMAGE_SIZE = "1024x1024"
+
 payload = {
-    "model": "flux",
+    "model": TEXT2IMAGE_MODEL,
     "action": "generate",
-    "size": "1024x1024",
+    "size": TEXT2IMAGE_SIZE,
     "prompt": "a white siamese cat"
 }
 url = TEXT2IMAGE_URL
 
+# 优化后的英文提示词缓存，键为归一化后的用户输入
+prompt_cache = TTLCache(maxsize=PROMPT_CACHE_SIZE, ttl=PROMPT_CACHE_TTL)
+
+# 创作类功能的近似重复缓存，只对配置了相似度阈值的功能启用
+similar_cache = SimilarityCache(maxsize=SIMILAR_CACHE_SIZE, ttl=SIMILAR_CACHE_TTL)
+similar_cache_thresholds = parse_thresholds(SIMILAR_CACHE_THRESHOLDS)
+# 并行模式下用于后台优化或兜底生成的线程池
+speculative_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="text2image")
+
+def create_llm_limiter(name: str) -> AdaptiveLimiter:
+    """创建模型服务的自适应并发限制器，每个服务独立调整并发上限"""
+    return AdaptiveLimiter(
+        name,
+        initial_limit=LLM_CONCURRENCY_INITIAL,
+        min_limit=LLM_CONCURRENCY_MIN,
+        max_limit=LLM_CONCURRENCY_MAX,
+        latency_target=LLM_LATENCY_TARGET,
+        queue_timeout=LLM_QUEUE_TIMEOUT,
+        max_queue=LLM_MAX_QUEUE
+    )
+
+def _api_base(api_url: str):
+    """把完整的chat/completions地址转换为SDK使用的base_url"""
+    if not api_url:
+        return None
+    return api_url.rstrip("/").removesuffix("/chat/completions")
+
+def _create_deepseek(temperature, timeout, profile: GenerationProfile):
+    kwargs = {"api_base": _api_base(DEEPSEEK_API_URL)} if DEEPSEEK_API_URL else {}
+    return ChatDeepSeek(model=MODEL_NAME, temperature=temperature, timeout=timeout,
+                        max_tokens=profile.max_tokens, stop=profile.stop, **kwargs)
+
+def _create_openai(temperature, timeout, profile: GenerationProfile):
+    return ChatOpenAI(
+        model=AI_MODEL_NAME,
+        api_key=AI_API_KEY,
+        base_url=_api_base(AI_API_URL),
+        temperature=temperature,
+        timeout=timeout,
+        max_tokens=profile.max_tokens,
+        stop=profile.stop
+    )
+
+# DeepSeek调用使用的自适应并发限制器
+deepseek_limiter = create_llm_limiter("deepseek")
+llm_backends = [Backend("deepseek", _create_deepseek, deepseek_limiter, LatencyWindow(LLM_STATS_WINDOW))]
+if AI_API_KEY:
+    # 配置了OpenAI兼容服务时作为第二个服务，参与路由和故障转移
+    llm_backends.append(Backend("openai", _create_openai, create_llm_limiter("openai"), LatencyWindow(LLM_STATS_WINDOW)))
+
+# 各功能的默认生成预算：最大输出token数、连接和读取超时、停止序列和期望p95耗时（秒），可用LLM_PROFILES覆盖
+# 短文案只需要一段文字，遇到空行即停止，避免模型在正文后追加解释
+DEFAULT_GENERATION_PROFILES = {
+    "聊天": GenerationProfile(max_tokens=600, read_timeout=60, target_p95=15),
+    "翻译": GenerationProfile(max_tokens=2048, read_timeout=60, target_p95=20),
+    "评价": GenerationProfile(max_tokens=150, read_timeout=20, stop=["\n\n"], target_p95=5),
+    "朋友圈": GenerationProfile(max_tokens=150, read_timeout=20, stop=["\n\n"], target_p95=5),
+    "砍价": GenerationProfile(max_tokens=150, read_timeout=20, stop=["\n\n"], target_p95=5),
+    "小红书": GenerationProfile(max_tokens=600, read_timeout=40, target_p95=12),
+    "做菜达人": GenerationProfile(max_tokens=1500, read_timeout=90, target_p95=40),
+    "提示词优化": GenerationProfile(max_tokens=300, read_timeout=30, target_p95=8),
+}
+
+# 所有模型调用共用的路由器，按功能选择最快的健康服务
+llm_router = ProviderRouter(
+    llm_backends,
+    routes=parse_routes(LLM_ROUTES),
+    hedge_after=LLM_FAILOVER_HEDGE_AFTER,
+    hedge_routes=LLM_HEDGE_ROUTES,
+    hedge_percentile=LLM_HEDGE_PERCENTILE,
+    hedge_min_delay=LLM_HEDGE_MIN_DELAY,
+    hedge_budget=LLM_HEDGE_BUDGET,
+    hedge_measure_rate=LLM_HEDGE_MEASURE_RATE,
+    profiles=parse_profiles(LLM_PROFILES, DEFAULT_GENERATION_PROFILES),
+    default_profile=GenerationProfile(max_tokens=LLM_DEFAULT_MAX_TOKENS, read_timeout=120),  # 未配置预算的功能
+    unhealthy_error_rate=LLM_UNHEALTHY_ERROR_RATE,
+    window_seconds=LLM_STATS_WINDOW
+)
+
 # 禁用不安全连接警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -65,113 +169,259 @@ def create_retry_session(retries=3, backoff_factor=0.5):
     session.mount('https://', adapter)
     return session
 
+def normalize_prompt(userMessage: str) -> str:
+    """
+    归一化用户输入，作为提示词缓存的键
+
+    全角转半角、统一大小写、合并空白并去掉末尾标点，
+    使"一只猫。"和"一只猫"命中同一条缓存
+    """
+    text = unicodedata.normalize("NFKC", userMessage).casefold()
+    text = " ".join(text.split())
+    return text.rstrip("。.!！~～ ")
+
+def optimize_prompt_cached(userMessage: str):
+    """
+    带缓存的提示词优化，命中缓存时不再调用DeepSeek
+
+    Returns:
+        str: 优化后的英文提示词
+
+    Raises:
+        Exception: 优化失败时抛出，由调用方决定是否回退到原始输入
+    """
+    key = normalize_prompt(userMessage)
+    prompt = prompt_cache.get(key)
+    if prompt is not None:
+        print(f"提示词缓存命中: '{key[:50]}'")
+        return prompt
+    prompt = deepseek_optimize_prompt(userMessage)
+    prompt_cache.set(key, prompt)  # 只缓存优化成功的结果
+    return prompt
+
+def is_image_success(body: str) -> bool:
+    """图片API的响应体是否表示生成成功"""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and data.get("success") is True
+
+def _request_text2image(prompt: str):
+    """
+    使用给定提示词请求图片API，带重试
+
+    相同(提示词, 尺寸, 模型)的成功结果保存在本地结果存储中，
+    命中时直接返回，不再重新生成
+
+    Returns:
+        tuple: (是否成功, 响应JSON字符串, 结果存储键)
+    """
+    key = image_store.make_key(prompt, TEXT2IMAGE_SIZE, TEXT2IMAGE_MODEL)
+    try:
+        stored = image_store.get(key)
+        if stored is not None:
+            print(f"图片结果存储命中: {key}")
+            return True, stored, key
+    except Exception as store_err:
+        print(f"读取图片结果存储失败: {str(store_err)}")
+    
+    ok, result = _post_text2image(prompt)
+    if ok:
+        try:
+            image_store.put(key, prompt, TEXT2IMAGE_SIZE, TEXT2IMAGE_MODEL, result)
+        except Exception as store_err:
+            print(f"写入图片结果存储失败: {str(store_err)}")
+    return ok, result, key
+
+def _post_text2image(prompt: str):
+    """
+    请求图片API的重试循环
+
+    Returns:
+        tuple: (是否成功, 响应JSON字符串)
+    """
+    payload = {
+        "model": TEXT2IMAGE_MODEL,
+        "action": "generate",
+        "size": TEXT2IMAGE_SIZE,
+        "prompt": prompt
+    }
+    print("payload: ", payload)
+    
+    # 设置超时时间和重试次数
+    timeout = 180  # 增加超时时间到180秒(3分钟),因为图片生成可能需要较长时间
+    max_retries = 3
+    retry_count = 0
+    
+    # 使用重试会话
+    session = create_retry_session()
+    
+    while retry_count < max_retries:
+        # 客户端已断开或超过请求截止时间时不再发起新的请求
+        if is_cancelled():
+            print("请求已取消或超时，停止请求图片API")
+            return False, json.dumps({
+                "success": False,
+                "error": "请求已取消",
+                "message": "图片生成请求已取消或超过截止时间"
+            })
+        try:
+            print(f"开始第 {retry_count + 1}/{max_retries} 次请求图片API...")
+            # 尝试不进行SSL验证，解决SSL问题
+            response = session.post(
+                url, 
+                json=payload, 
+                headers=headers, 
+                timeout=remaining(timeout),  # 不超过请求剩余时间
+                verify=False  # 禁用SSL验证
+            )
+            
+            # 检查响应状态码
+            if response.status_code == 401:
+                print("认证失败：请检查TEXT2IMAGE_API_AUTHORIZATION环境变量")
+                return False, json.dumps({
+                    "success": False,
+                    "error": "API认证失败",
+                    "message": "图片生成失败：API认证失败，请联系管理员检查API密钥"
+                })
+            elif response.status_code != 200:
+                print(f"API请求失败，状态码: {response.status_code}，响应: {response.text}")
+                # 非200状态码也重试
+                retry_count += 1
+                wait_or_cancelled(2)
+                continue
+                
+            body = response.text  # 只解码一次，后续直接复用
+            print("text2image response status:", response.status_code)
+            print("text2image response长度: ", len(body))
+            # 只打印响应的前200个字符，避免日志过大
+            print("text2image response预览: ", body[:200])
+            # 状态码为200时图片API仍可能返回{"success": false}，这种结果不能当作成功保存
+            return is_image_success(body), body
+        except requests.exceptions.SSLError as ssl_err:
+            print(f"SSL错误 (尝试 {retry_count+1}/{max_retries}): {str(ssl_err)}")
+            retry_count += 1
+            # 添加延迟避免快速重试，请求取消时提前结束等待
+            wait_or_cancelled(2)  # 增加延迟时间
+            if retry_count >= max_retries:
+                return False, json.dumps({
+                    "success": False,
+                    "error": "SSL连接失败",
+                    "message": f"SSL连接失败，已尝试 {max_retries} 次: {str(ssl_err)}"
+                })
+        except requests.exceptions.Timeout:
+            print(f"请求超时 (尝试 {retry_count+1}/{max_retries})")
+            retry_count += 1
+            wait_or_cancelled(2)
+            if retry_count >= max_retries:
+                return False, json.dumps({
+                    "success": False,
+                    "error": "请求超时",
+                    "message": f"图片生成请求超时，已尝试 {max_retries} 次，每次等待 {timeout} 秒。请尝试简化您的描述或稍后再试。"
+                })
+        except requests.exceptions.ConnectionError as conn_err:
+            print(f"连接错误 (尝试 {retry_count+1}/{max_retries}): {str(conn_err)}")
+            retry_count += 1
+            wait_or_cancelled(2)
+            if retry_count >= max_retries:
+                return False, json.dumps({
+                    "success": False,
+                    "error": "连接失败",
+                    "message": f"连接失败，已尝试 {max_retries} 次: {str(conn_err)}"
+                })
+    
+    # 如果重试次数达到上限仍然失败
+    return False, json.dumps({
+        "success": False,
+        "error": "多次尝试失败",
+        "message": f"图片生成失败，已尝试 {max_retries} 次但未成功"
+    })
+
+def _optimize_in_background(userMessage: str):
+    """后台优化提示词并写入缓存，失败时只记录日志"""
+    try:
+        optimize_prompt_cached(userMessage)
+    except Exception as e:
+        print(f"后台提示词优化失败: {str(e)}")
+
 def text2image(userMessage: str):
     """
      根据用户的输入，将userMessage传入deepseek的api，让deepseek优化提示词，
      将优化好的提示词传入text2image的api，生成图片
+
+     Returns:
+        str: 图片API的响应JSON字符串
+    """
+    return generate_image(userMessage)[1]
+
+def generate_image(userMessage: str):
+    """
+     文生图的完整流程，返回结果及其在结果存储中的键
+
+     优化结果按归一化后的用户输入缓存。缓存未命中时，如果配置了
+     TEXT2IMAGE_SPECULATIVE_PRIMARY，会把原始输入和优化后的提示词并行发送：
+     - raw: 直接用原始输入生成图片，提示词优化在后台进行，只用于填充缓存
+     - optimized: 以优化后的提示词结果为准，优化或生成失败时回退到原始输入的结果；
+       优化结果生成成功后取消兜底请求，兜底请求不再发出或重试
+
+     Returns:
+        tuple: (结果存储键, 图片API的响应JSON字符串)，出错时键为None
     """
     try:
         print(f"开始处理用户请求: '{userMessage}'")
-        # 优化提示词处理
-        try:
-            prompt = deepseek_optimize_prompt(userMessage)
-            print(f"优化后的提示词: '{prompt}'")
-        except Exception as prompt_err:
-            print(f"提示词优化失败，使用原始输入: {str(prompt_err)}")
-            # 如果优化提示词失败，使用原始输入，不影响整体流程
-            prompt = userMessage
-            
-        payload = {
-            "model": "flux",
-            "action": "generate",
-            "size": "1024x1024",
-            "prompt": prompt
-        }
-        print("payload: ", payload)
-        
-        # 设置超时时间和重试次数
-        timeout = 180  # 增加超时时间到180秒(3分钟),因为图片生成可能需要较长时间
-        max_retries = 3
-        retry_count = 0
-        
-        # 使用重试会话
-        session = create_retry_session()
+        key = normalize_prompt(userMessage)
+        prompt = prompt_cache.get(key)
+        
+        if prompt is None and TEXT2IMAGE_SPECULATIVE_PRIMARY == "raw":
+            # 原始输入优先：提示词优化不再阻塞图片生成
+            speculative_executor.submit(_optimize_in_background, userMessage)
+            ok, result, image_key = _request_text2image(userMessage)
+            return image_key, result
+        
+        if prompt is None and TEXT2IMAGE_SPECULATIVE_PRIMARY == "optimized":
+            # 优化结果优先：原始输入的生成请求作为并行的兜底
+            # 兜底请求在复制的上下文中使用单独的取消标记，同样遵守请求截止时间，客户端断开时一起取消
+            fallback_cancel = LinkedCancelEvent(request_cancel_event.get())
+            fallback_context = contextvars.copy_context()
+            fallback_context.run(request_cancel_event.set, fallback_cancel)
+            raw_future = speculative_executor.submit(fallback_context.run, _request_text2image, userMessage)
+            try:
+                prompt = optimize_prompt_cached(userMessage)
+                print(f"优化后的提示词: '{prompt}'")
+            except Exception as prompt_err:
+                print(f"提示词优化失败，使用原始输入的生成结果: {str(prompt_err)}")
+                raw_ok, raw_result, raw_key = raw_future.result()
+                return raw_key, raw_result
+            ok, result, image_key = _request_text2image(prompt)
+            if ok:
+                # 优化结果已生成，兜底请求不再发出或重试
+                fallback_cancel.set()
+                raw_future.cancel()  # 仍在排队时直接取消
+                return image_key, result
+            print("优化提示词生成失败，使用原始输入的生成结果")
+            raw_ok, raw_result, raw_key = raw_future.result()
+            return raw_key, raw_result
         
-        while retry_count < max_retries:
+        # 优化提示词处理
+        if prompt is None:
             try:
-                print(f"开始第 {retry_count + 1}/{max_retries} 次请求图片API...")
-                # 尝试不进行SSL验证，解决SSL问题
-                response = session.post(
-                    url, 
-                    json=payload, 
-                    headers=headers, 
-                    timeout=timeout,
-                    verify=False  # 禁用SSL验证
-                )
-                
-                # 检查响应状态码
-                if response.status_code == 401:
-                    print("认证失败：请检查TEXT2IMAGE_API_AUTHORIZATION环境变量")
-                    return json.dumps({
-                        "success": False,
-                        "error": "API认证失败",
-                        "message": "图片生成失败：API认证失败，请联系管理员检查API密钥"
-                    })
-                elif response.status_code != 200:
-                    print(f"API请求失败，状态码: {response.status_code}，响应: {response.text}")
-                    # 非200状态码也重试
-                    retry_count += 1
-                    time.sleep(2)
-                    continue
-                    
-                print("text2image response status:", response.status_code)
-                print("text2image response长度: ", len(response.text))
-                # 只打印响应的前200个字符，避免日志过大
-                print("text2image response预览: ", response.text)
-                return response.text
-            except requests.exceptions.SSLError as ssl_err:
-                print(f"SSL错误 (尝试 {retry_count+1}/{max_retries}): {str(ssl_err)}")
-                retry_count += 1
-                # 添加延迟避免快速重试
-                time.sleep(2)  # 增加延迟时间
-                if retry_count >= max_retries:
-                    return json.dumps({
-                        "success": False,
-                        "error": "SSL连接失败",
-                        "message": f"SSL连接失败，已尝试 {max_retries} 次: {str(ssl_err)}"
-                    })
-            except requests.exceptions.Timeout:
-                print(f"请求超时 (尝试 {retry_count+1}/{max_retries})")
-                retry_count += 1
-                time.sleep(2)
-                if retry_count >= max_retries:
-                    return json.dumps({
-                        "success": False,
-                        "error": "请求超时",
-                        "message": f"图片生成请求超时，已尝试 {max_retries} 次，每次等待 {timeout} 秒。请尝试简化您的描述或稍后再试。"
-                    })
-            except requests.exceptions.ConnectionError as conn_err:
-                print(f"连接错误 (尝试 {retry_count+1}/{max_retries}): {str(conn_err)}")
-                retry_count += 1
-                time.sleep(2)
-                if retry_count >= max_retries:
-                    return json.dumps({
-                        "success": False,
-                        "error": "连接失败",
-                        "message": f"连接失败，已尝试 {max_retries} 次: {str(conn_err)}"
-                    })
-        
-        # 如果重试次数达到上限仍然失败
-        return json.dumps({
-            "success": False,
-            "error": "多次尝试失败",
-            "message": f"图片生成失败，已尝试 {max_retries} 次但未成功"
-        })
+                prompt = optimize_prompt_cached(userMessage)
+                print(f"优化后的提示词: '{prompt}'")
+            except Exception as prompt_err:
+                print(f"提示词优化失败，使用原始输入: {str(prompt_err)}")
+                # 如果优化提示词失败，使用原始输入，不影响整体流程
+                prompt = userMessage
+        else:
+            print(f"使用缓存的优化提示词: '{prompt}'")
+        
+        ok, result, image_key = _request_text2image(prompt)
+        return image_key, result
         
     except Exception as e:
         print(f"text2image调用错误: {str(e)}")
         # 返回格式化的JSON错误信息
-        return json.dumps({
+        return None, json.dumps({
             "success": False,
             "error": str(e),
             "message": f"抱歉，图片生成过程中出现错误: {str(e)}"
@@ -213,8 +463,47 @@ def test_text2image_connection():
             "message": f"连接测试错误: {str(e)}"
         }
 
+async def _invoke_llm(route: str, messages, temperature):
+    """通过路由器异步调用模型，所有服务都被并发限制拒绝时抛出LimiterRejected
+
+    Args:
+        route: 路由键，即功能类型
+        messages: 发送给模型的消息
+        temperature: 采样温度
+    """
+    # 超时不超过该功能的读取超时和请求剩余时间
+    return await llm_router.ainvoke(route, messages, temperature, timeout=remaining(llm_router.profile(route).read_timeout))
+
+async def _generate_similar_cached(route: str, userMessage: str, messages, temperature, options: tuple = ()) -> str:
+    """调用模型生成文本，对配置了相似度阈值的功能先查近似重复缓存
+
+    系统提示词和类型、字数等选项作为缓存的命名空间，只有选项相同且用户输入相似时才复用结果；
+    调用失败时异常直接抛出，不会写入缓存
+
+    Args:
+        options: 影响生成结果的选项，如(类型, 字数)
+
+    Returns:
+        str: 生成的文本
+    """
+    threshold = similar_cache_thresholds.get(route)
+    if threshold is None:
+        return (await _invoke_llm(route, messages, temperature)).content
+    namespace = (route, messages[0].content) + tuple(options)
+    text = similar_cache.get(namespace, userMessage, threshold)
+    if text is not None:
+        print(f"{route}近似重复缓存命中: '{userMessage[:50]}'")
+        return text
+    text = (await _invoke_llm(route, messages, temperature)).content
+    similar_cache.set(namespace, userMessage, text)
+    return text
+
+def _invoke_llm_sync(route: str, messages, temperature):
+    """通过路由器同步调用模型，供线程池中的调用使用"""
+    return llm_router.invoke(route, messages, temperature, timeout=remaining(llm_router.profile(route).read_timeout))
+
 # 初始化DeepSeek客户端
-def get_deepseek_client(userMessage: str):
+async def get_deepseek_client(userMessage: str):
     """
     获取DeepSeek客户端实例并处理用户消息
     
@@ -237,16 +526,6 @@ def get_deepseek_client(userMessage: str):
         # 构建系统提示词模版
         system_prompt = """你是一个简洁的AI助手。请用纯文本格式回复，每次回复内容不超过300字。"""
         
-        # 设置超时值
-        os.environ["LANGCHAIN_TIMEOUT"] = "120"  # 设置120秒超时
-        
-        # 正确使用 ChatDeepSeek
-        llm = ChatDeepSeek(
-            model=MODEL_NAME,
-            temperature=TEMPERATURE,
-            timeout=120  # 直接设置超时为120秒(2分钟)
-        )
-        
         # 使用 ChatDeepSeek 的正确API调用方式
         messages = [
             SystemMessage(content=system_prompt),
@@ -255,7 +534,7 @@ def get_deepseek_client(userMessage: str):
         
         # 执行调用
         print("正在发送请求到DeepSeek API...")
-        response = llm.invoke(messages)
+        response = await _invoke_llm("聊天", messages, TEMPERATURE)
         
         # 计算处理时间
         end_time = time.time()
@@ -268,6 +547,8 @@ def get_deepseek_client(userMessage: str):
         print(f"DeepSeek响应前200字符: {content[:200]}...")
         
         return content
+    except LimiterRejected:
+        raise  # 排队超时快速失败，由接口返回503
     except Exception as e:
         # 记录详细错误信息
         import traceback
@@ -287,22 +568,19 @@ def deepseek_optimize_prompt(userMessage: str):
      """
     try:
         system_prompt = """你是一个专业的prompt优化师，请根据用户的输入，优化提示词，使得生成的图片更加符合用户的需求，要求只返回优化后的英文提示词文本，不要返回其他内容。"""
-        llm = ChatDeepSeek(
-            model=MODEL_NAME,
-            temperature=TEMPERATURE
-        )
         messages = [
             SystemMessage(content=system_prompt),
             HumanMessage(content=userMessage)
         ]
-        prompt = llm.invoke(messages)
+        prompt = _invoke_llm_sync("提示词优化", messages, TEMPERATURE)
         return prompt.content
     except Exception as e:
         print(f"DeepSeek调用错误: {str(e)}")
-        return f"抱歉，我现在无法优化提示词，因为: {str(e)}"
+        # 抛出异常由调用方回退到原始输入，避免把错误信息当作提示词缓存或发送给图片API
+        raise
 
 # 翻译功能的实现
-def translate_text(userMessage: str, translation_type: str):
+async def translate_text(userMessage: str, translation_type: str):
     """
     根据用户选择的翻译类型（中译英或英译中）翻译文本
     
@@ -331,28 +609,27 @@ def translate_text(userMessage: str, translation_type: str):
         else:
             return f"不支持的翻译类型: {translation_type}"
         
-        llm = ChatDeepSeek(
-            model=MODEL_NAME,
-            temperature=0.2  # 使用较低的温度值保证翻译的准确性
-        )
+        temperature = 0.2  # 使用较低的温度值保证翻译的准确性
         
         messages = [
             SystemMessage(content=system_prompt),
             HumanMessage(content=userMessage)
         ]
         
-        response = llm.invoke(messages)
+        response = await _invoke_llm("翻译", messages, temperature)
         translated_text = response.content
         
         print(f"翻译完成 - 结果: '{translated_text[:100]}...'")
         return translated_text
         
+    except LimiterRejected:
+        raise  # 排队超时快速失败，由接口返回503
     except Exception as e:
         print(f"翻译处理错误: {str(e)}")
         return f"抱歉，翻译过程中出现错误: {str(e)}"
 
 # 评价生成功能的实现
-def generate_review(userMessage: str, review_type: str, length: str):
+async def generate_review(userMessage: str, review_type: str, length: str):
     """
     根据用户输入的关键词生成指定类型和长度的评价
     
@@ -377,20 +654,17 @@ def generate_review(userMessage: str, review_type: str, length: str):
         else:
             word_limit = 30  # 默认值
         
-        # 构建系统提示
+        # 构建系统提示，不含字数等可变部分，同一类型固定不变以命中前缀缓存
         if review_type.startswith("好评"):
-            system_prompt = f"""你是一个专业的评价生成助手。请为用户输入的内容生成一段正面、积极的好评，体现产品/服务的优点。评价要真实可信，不要过于夸张或做作。评价字数控制在{word_limit}字左右，请只返回生成的评价内容，不要包含任何解释或额外说明。"""
+            system_prompt = """你是一个专业的评价生成助手。请为用户输入的内容生成一段正面、积极的好评，体现产品/服务的优点。评价要真实可信，不要过于夸张或做作。评价字数按用户要求控制，请只返回生成的评价内容，不要包含任何解释或额外说明。"""
         elif review_type.startswith("差评"):
-            system_prompt = f"""你是一个专业的评价生成助手。请为用户输入的内容生成一段负面、客观的差评，指出产品/服务的不足之处。评价要具体、理性，不要无端抱怨或情绪化。评价字数控制在{word_limit}字左右，请只返回生成的评价内容，不要包含任何解释或额外说明。"""
+            system_prompt = """你是一个专业的评价生成助手。请为用户输入的内容生成一段负面、客观的差评，指出产品/服务的不足之处。评价要具体、理性，不要无端抱怨或情绪化。评价字数按用户要求控制，请只返回生成的评价内容，不要包含任何解释或额外说明。"""
         else:
             return f"不支持的评价类型: {review_type}"
         
-        llm = ChatDeepSeek(
-            model=MODEL_NAME,
-            temperature=0.7  # 使用较高的温度值增加评价的多样性
-        )
+        temperature = 0.7  # 使用较高的温度值增加评价的多样性
         
-        # 构建提示信息
+        # 构建提示信息，用户输入放在最后
         prompt = f"请为以下内容生成{word_limit}字左右的{review_type}：{userMessage}"
         
         messages = [
@@ -398,18 +672,19 @@ def generate_review(userMessage: str, review_type: str, length: str):
             HumanMessage(content=prompt)
         ]
         
-        response = llm.invoke(messages)
-        review_text = response.content
+        review_text = await _generate_similar_cached("评价", userMessage, messages, temperature, (review_type, word_limit))
         
         print(f"评价生成完成 - 结果: '{review_text}'")
         return review_text
         
+    except LimiterRejected:
+        raise  # 排队超时快速失败，由接口返回503
     except Exception as e:
         print(f"评价生成错误: {str(e)}")
         return f"抱歉，评价生成过程中出现错误: {str(e)}"
 
 # 朋友圈文案生成功能
-def generate_friend_circle_post(userMessage: str, post_type: str, length: str):
+async def generate_friend_circle_post(userMessage: str, post_type: str, length: str):
     """
     根据用户输入的关键词生成指定类型和长度的朋友圈文案
     
@@ -434,42 +709,40 @@ def generate_friend_circle_post(userMessage: str, post_type: str, length: str):
         else:
             word_limit = 30  # 默认值
         
-        # 构建系统提示
+        # 构建系统提示，不含字数等可变部分，同一类型固定不变以命中前缀缓存
         prompts = {
-            "过节": f"""你是一个社交媒体文案专家。请为用户输入的节日生成一条朋友圈文案，文案应当简洁有力，能够表达节日的喜悦氛围，字数控制在{word_limit}字左右。请只返回生成的文案内容，不要包含任何解释或额外说明。""",
-            "生日": f"""你是一个社交媒体文案专家。请根据用户输入生成一条关于生日的朋友圈文案，文案应当温馨感人，能够表达对自己或他人生日的祝福，字数控制在{word_limit}字左右。请只返回生成的文案内容，不要包含任何解释或额外说明。""",
-            "祝福": f"""你是一个社交媒体文案专家。请根据用户输入生成一条祝福类朋友圈文案，文案应当真挚诚恳，能够传达美好的祝愿，字数控制在{word_limit}字左右。请只返回生成的文案内容，不要包含任何解释或额外说明。""",
-            "表白": f"""你是一个社交媒体文案专家。请根据用户输入生成一条表白类朋友圈文案，文案应当浪漫感人，能够表达真挚的爱意，字数控制在{word_limit}字左右。请只返回生成的文案内容，不要包含任何解释或额外说明。""",
-            "分手": f"""你是一个社交媒体文案专家。请根据用户输入生成一条关于分手或失恋的朋友圈文案，文案应当伤感但不过度悲观，能够表达对过去感情的告别，字数控制在{word_limit}字左右。请只返回生成的文案内容，不要包含任何解释或额外说明。"""
+            "过节": """你是一个社交媒体文案专家。请为用户输入的节日生成一条朋友圈文案，文案应当简洁有力，能够表达节日的喜悦氛围，字数按用户要求控制。请只返回生成的文案内容，不要包含任何解释或额外说明。""",
+            "生日": """你是一个社交媒体文案专家。请根据用户输入生成一条关于生日的朋友圈文案，文案应当温馨感人，能够表达对自己或他人生日的祝福，字数按用户要求控制。请只返回生成的文案内容，不要包含任何解释或额外说明。""",
+            "祝福": """你是一个社交媒体文案专家。请根据用户输入生成一条祝福类朋友圈文案，文案应当真挚诚恳，能够传达美好的祝愿，字数按用户要求控制。请只返回生成的文案内容，不要包含任何解释或额外说明。""",
+            "表白": """你是一个社交媒体文案专家。请根据用户输入生成一条表白类朋友圈文案，文案应当浪漫感人，能够表达真挚的爱意，字数按用户要求控制。请只返回生成的文案内容，不要包含任何解释或额外说明。""",
+            "分手": """你是一个社交媒体文案专家。请根据用户输入生成一条关于分手或失恋的朋友圈文案，文案应当伤感但不过度悲观，能够表达对过去感情的告别，字数按用户要求控制。请只返回生成的文案内容，不要包含任何解释或额外说明。"""
         }
         
-        system_prompt = prompts.get(post_type, f"你是一个社交媒体文案专家。请生成一条朋友圈文案，字数控制在{word_limit}字左右。")
+        system_prompt = prompts.get(post_type, "你是一个社交媒体文案专家。请生成一条朋友圈文案，字数按用户要求控制。")
         
-        llm = ChatDeepSeek(
-            model=MODEL_NAME,
-            temperature=0.7  # 使用较高的温度值增加文案的创意性
-        )
+        temperature = 0.7  # 使用较高的温度值增加文案的创意性
         
-        # 构建提示信息
-        prompt = f"请根据关键词「{userMessage}」，为我创作一条{post_type}场景的朋友圈文案，字数控制在{word_limit}字左右。"
+        # 构建提示信息，用户输入放在最后
+        prompt = f"请为我创作一条{post_type}场景的朋友圈文案，字数控制在{word_limit}字左右。关键词：{userMessage}"
         
         messages = [
             SystemMessage(content=system_prompt),
             HumanMessage(content=prompt)
         ]
         
-        response = llm.invoke(messages)
-        post_text = response.content
+        post_text = await _generate_similar_cached("朋友圈", userMessage, messages, temperature, (post_type, word_limit))
         
         print(f"朋友圈文案生成完成 - 结果: '{post_text}'")
         return post_text
         
+    except LimiterRejected:
+        raise  # 排队超时快速失败，由接口返回503
     except Exception as e:
         print(f"朋友圈文案生成错误: {str(e)}")
         return f"抱歉，朋友圈文案生成过程中出现错误: {str(e)}"
 
 # 小红书文案生成功能
-def generate_xiaohongshu_post(userMessage: str, post_type: str, length: str):
+async def generate_xiaohongshu_post(userMessage: str, post_type: str, length: str):
     """
     根据用户输入的关键词生成指定类型和长度的小红书文案
     
@@ -494,41 +767,39 @@ def generate_xiaohongshu_post(userMessage: str, post_type: str, length: str):
         else:
             word_limit = 100  # 默认值
         
-        # 构建系统提示
+        # 构建系统提示，不含字数等可变部分，同一类型固定不变以命中前缀缓存
         prompts = {
-            "种草": f"""你是一个小红书文案专家。请为用户输入的产品或服务生成一条种草类小红书文案，文案应当真实可信，包含产品亮点和个人使用感受，语气要亲切自然，带有惊喜感，字数控制在{word_limit}字左右。请加入合适的表情符号和排版，但不要过多。请只返回生成的文案内容，不要包含任何解释或额外说明。""",
-            "吐槽": f"""你是一个小红书文案专家。请根据用户输入生成一条吐槽类小红书文案，文案应当幽默诙谐，带有一定的批判性但不要过于尖刻，语气要生活化，字数控制在{word_limit}字左右。请加入合适的表情符号和排版，但不要过多。请只返回生成的文案内容，不要包含任何解释或额外说明。""",
-            "分享": f"""你是一个小红书文案专家。请根据用户输入生成一条分享类小红书文案，文案应当详实有用，提供有价值的信息或经验，语气要真诚，字数控制在{word_limit}字左右。请加入合适的表情符号和排版，但不要过多。请只返回生成的文案内容，不要包含任何解释或额外说明。""",
-            "暗广": f"""你是一个小红书文案专家。请根据用户输入生成一条巧妙融入产品推广的小红书文案，文案应当不显刻意，将产品自然地融入内容中，语气要轻松自然，字数控制在{word_limit}字左右。请加入合适的表情符号和排版，但不要过多。请只返回生成的文案内容，不要包含任何解释或额外说明。"""
+            "种草": """你是一个小红书文案专家。请为用户输入的产品或服务生成一条种草类小红书文案，文案应当真实可信，包含产品亮点和个人使用感受，语气要亲切自然，带有惊喜感，字数按用户要求控制。请加入合适的表情符号和排版，但不要过多。请只返回生成的文案内容，不要包含任何解释或额外说明。""",
+            "吐槽": """你是一个小红书文案专家。请根据用户输入生成一条吐槽类小红书文案，文案应当幽默诙谐，带有一定的批判性但不要过于尖刻，语气要生活化，字数按用户要求控制。请加入合适的表情符号和排版，但不要过多。请只返回生成的文案内容，不要包含任何解释或额外说明。""",
+            "分享": """你是一个小红书文案专家。请根据用户输入生成一条分享类小红书文案，文案应当详实有用，提供有价值的信息或经验，语气要真诚，字数按用户要求控制。请加入合适的表情符号和排版，但不要过多。请只返回生成的文案内容，不要包含任何解释或额外说明。""",
+            "暗广": """你是一个小红书文案专家。请根据用户输入生成一条巧妙融入产品推广的小红书文案，文案应当不显刻意，将产品自然地融入内容中，语气要轻松自然，字数按用户要求控制。请加入合适的表情符号和排版，但不要过多。请只返回生成的文案内容，不要包含任何解释或额外说明。"""
         }
         
-        system_prompt = prompts.get(post_type, f"你是一个小红书文案专家。请生成一条小红书文案，字数控制在{word_limit}字左右。")
+        system_prompt = prompts.get(post_type, "你是一个小红书文案专家。请生成一条小红书文案，字数按用户要求控制。")
         
-        llm = ChatDeepSeek(
-            model=MODEL_NAME,
-            temperature=0.8  # 使用较高的温度值增加文案的多样性和创意性
-        )
+        temperature = 0.8  # 使用较高的温度值增加文案的多样性和创意性
         
-        # 构建提示信息
-        prompt = f"请为「{userMessage}」创作一篇{post_type}类型的小红书文案，字数约{word_limit}字。加入适量表情符号和排版，使文案生动有趣。"
+        # 构建提示信息，用户输入放在最后
+        prompt = f"请加入适量表情符号和排版，使文案生动有趣。创作一篇{post_type}类型的小红书文案，字数约{word_limit}字。主题：{userMessage}"
         
         messages = [
             SystemMessage(content=system_prompt),
             HumanMessage(content=prompt)
         ]
         
-        response = llm.invoke(messages)
-        post_text = response.content
+        post_text = await _generate_similar_cached("小红书", userMessage, messages, temperature, (post_type, word_limit))
         
         print(f"小红书文案生成完成 - 结果前100字: '{post_text[:100]}...'")
         return post_text
         
+    except LimiterRejected:
+        raise  # 排队超时快速失败，由接口返回503
     except Exception as e:
         print(f"小红书文案生成错误: {str(e)}")
         return f"抱歉，小红书文案生成过程中出现错误: {str(e)}"
 
 # 砍价话术生成功能
-def generate_bargain_script(userMessage: str, product_type: str, length: str):
+async def generate_bargain_script(userMessage: str, product_type: str, length: str):
     """
     根据用户输入生成砍价话术
     
@@ -553,43 +824,41 @@ def generate_bargain_script(userMessage: str, product_type: str, length: str):
         else:
             word_limit = 30  # 默认值
         
-        # 构建系统提示
+        # 构建系统提示，不含字数等可变部分，同一类型固定不变以命中前缀缓存
         prompts = {
-            "衣服": f"""你是一个砍价话术专家。请为用户购买衣服场景生成一条砍价话术，话术应当有理有据，不卑不亢，能够委婉表达降价意愿，字数控制在{word_limit}字左右。请只返回生成的话术内容，不要包含任何解释或额外说明。""",
-            "鞋子": f"""你是一个砍价话术专家。请为用户购买鞋子场景生成一条砍价话术，话术应当有理有据，不卑不亢，能够委婉表达降价意愿，字数控制在{word_limit}字左右。请只返回生成的话术内容，不要包含任何解释或额外说明。""",
-            "包包": f"""你是一个砍价话术专家。请为用户购买包包场景生成一条砍价话术，话术应当有理有据，不卑不亢，能够委婉表达降价意愿，字数控制在{word_limit}字左右。请只返回生成的话术内容，不要包含任何解释或额外说明。""",
-            "化妆品": f"""你是一个砍价话术专家。请为用户购买化妆品场景生成一条砍价话术，话术应当有理有据，不卑不亢，能够委婉表达降价意愿，字数控制在{word_limit}字左右。请只返回生成的话术内容，不要包含任何解释或额外说明。""",
-            "数码产品": f"""你是一个砍价话术专家。请为用户购买数码产品场景生成一条砍价话术，话术应当有理有据，不卑不亢，能够委婉表达降价意愿，字数控制在{word_limit}字左右。请只返回生成的话术内容，不要包含任何解释或额外说明。""",
-            "闲鱼转转二手": f"""你是一个砍价话术专家。请为用户在二手平台购物场景生成一条砍价话术，话术应当有理有据，不卑不亢，能够委婉表达降价意愿，字数控制在{word_limit}字左右。请只返回生成的话术内容，不要包含任何解释或额外说明。"""
+            "衣服": """你是一个砍价话术专家。请为用户购买衣服场景生成一条砍价话术，话术应当有理有据，不卑不亢，能够委婉表达降价意愿，字数按用户要求控制。请只返回生成的话术内容，不要包含任何解释或额外说明。""",
+            "鞋子": """你是一个砍价话术专家。请为用户购买鞋子场景生成一条砍价话术，话术应当有理有据，不卑不亢，能够委婉表达降价意愿，字数按用户要求控制。请只返回生成的话术内容，不要包含任何解释或额外说明。""",
+            "包包": """你是一个砍价话术专家。请为用户购买包包场景生成一条砍价话术，话术应当有理有据，不卑不亢，能够委婉表达降价意愿，字数按用户要求控制。请只返回生成的话术内容，不要包含任何解释或额外说明。""",
+            "化妆品": """你是一个砍价话术专家。请为用户购买化妆品场景生成一条砍价话术，话术应当有理有据，不卑不亢，能够委婉表达降价意愿，字数按用户要求控制。请只返回生成的话术内容，不要包含任何解释或额外说明。""",
+            "数码产品": """你是一个砍价话术专家。请为用户购买数码产品场景生成一条砍价话术，话术应当有理有据，不卑不亢，能够委婉表达降价意愿，字数按用户要求控制。请只返回生成的话术内容，不要包含任何解释或额外说明。""",
+            "闲鱼转转二手": """你是一个砍价话术专家。请为用户在二手平台购物场景生成一条砍价话术，话术应当有理有据，不卑不亢，能够委婉表达降价意愿，字数按用户要求控制。请只返回生成的话术内容，不要包含任何解释或额外说明。"""
         }
         
-        system_prompt = prompts.get(product_type, f"你是一个砍价话术专家。请生成一条砍价话术，字数控制在{word_limit}字左右。")
+        system_prompt = prompts.get(product_type, "你是一个砍价话术专家。请生成一条砍价话术，字数按用户要求控制。")
         
-        llm = ChatDeepSeek(
-            model=MODEL_NAME,
-            temperature=0.6  # 使用适中的温度值，保证话术的实用性
-        )
+        temperature = 0.6  # 使用适中的温度值，保证话术的实用性
         
-        # 构建提示信息
-        prompt = f"请为我想购买的「{userMessage}」({product_type}类商品)生成一条砍价话术，字数控制在{word_limit}字左右。话术要委婉有效，不卑不亢。"
+        # 构建提示信息，用户输入放在最后
+        prompt = f"话术要委婉有效，不卑不亢。请为我想购买的{product_type}类商品生成一条砍价话术，字数控制在{word_limit}字左右。商品：{userMessage}"
         
         messages = [
             SystemMessage(content=system_prompt),
             HumanMessage(content=prompt)
         ]
         
-        response = llm.invoke(messages)
-        bargain_text = response.content
+        bargain_text = await _generate_similar_cached("砍价", userMessage, messages, temperature, (product_type, word_limit))
         
         print(f"砍价话术生成完成 - 结果: '{bargain_text}'")
         return bargain_text
         
+    except LimiterRejected:
+        raise  # 排队超时快速失败，由接口返回503
     except Exception as e:
         print(f"砍价话术生成错误: {str(e)}")
         return f"抱歉，砍价话术生成过程中出现错误: {str(e)}"
 
 # 做菜达人功能
-def generate_cooking_recipe(ingredients: str):
+async def generate_cooking_recipe(ingredients: str):
     """
     根据用户提供的食材生成一道菜的做法
     
@@ -615,25 +884,23 @@ def generate_cooking_recipe(ingredients: str):
 
 生成的文字格式为文本加手机emoji，回答要详细专业，但语言要通俗易懂，让普通家庭也能轻松完成。"""
         
-        llm = ChatDeepSeek(
-            model=MODEL_NAME,
-            temperature=0.7  # 使用较高的温度值增加菜谱的创意性
-        )
+        temperature = 0.7  # 使用较高的温度值增加菜谱的创意性
         
-        # 构建提示信息
-        prompt = f"我有这些食材：{ingredients}。请教我用这些食材做一道美味的菜，提供详细的步骤和技巧。"
+        # 构建提示信息，用户输入放在最后
+        prompt = f"请教我用以下食材做一道美味的菜，提供详细的步骤和技巧。食材：{ingredients}"
         
         messages = [
             SystemMessage(content=system_prompt),
             HumanMessage(content=prompt)
         ]
         
-        response = llm.invoke(messages)
-        recipe_text = response.content
+        recipe_text = await _generate_similar_cached("做菜达人", ingredients, messages, temperature)
         
         print(f"菜谱生成完成 - 结果前100字: '{recipe_text[:100]}...'")
         return recipe_text
         
+    except LimiterRejected:
+        raise  # 排队超时快速失败，由接口返回503
     except Exception as e:
         print(f"菜谱生成错误: {str(e)}")
         return f"抱歉，菜谱生成过程中出现错误: {str(e)}"
\ No newline at end of file
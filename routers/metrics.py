@@ -0,0 +1,171 @@
+# 导入必要的模块
+from fastapi import APIRouter, Depends, Header, HTTPException, status  # FastAPI相关组件
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response  # Prometheus文本格式和剖析报告响应
+from typing import Optional  # 类型提示
+
+# 导入项目内部模块
+
+from routers.chatwithdeepseek import llm_router, prompt_cache, similar_cache  # 模型服务路由器、提示词缓存和近似重复缓存
+from routers.user import user_info_cache  # 用户信息缓存
+from routers.ws import ws_stats  # WebSocket连接统计
+from revocation import revocation_list  # 令牌吊销列表
+from loop_monitor import loop_monitor  # 事件循环阻塞检测
+from idempotency import idempotency_store  # 幂等请求
+from outbox import outbox_relay  # 发件箱事件发布
+from profiling import PROFILE_FORMATS, profile_store  # 剖析报告
+from responses import api_response  # 统一响应格式
+from utils import is_metrics_token_valid  # 访问令牌校验
+
+# 创建路由器
+router = APIRouter()
+
+# 对外暴露指标的并发限制器，每个模型服务一个
+LIMITERS = [backend.limiter for backend in llm_router.backends]
+
+def verify_metrics_token(x_metrics_token: Optional[str] = Header(None)):
+    """校验指标接口访问令牌
+
+    配置了METRICS_TOKEN时要求请求头X-Metrics-Token一致；未配置时只在调试模式下开放
+    """
+    if not is_metrics_token_valid(x_metrics_token):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+def collect_metrics() -> dict:
+    """汇总进程内的运行指标"""
+    return {
+        "llmRouter": llm_router.stats(),
+        "caches": {
+            "prompt": prompt_cache.stats(),
+            "similar": similar_cache.stats(),
+            "userInfo": user_info_cache.stats()
+        },
+        "websocket": dict(ws_stats),
+        "revocation": revocation_list.stats(),
+        "eventLoop": loop_monitor.stats(),
+        "idempotency": idempotency_store.stats(),
+        "outbox": outbox_relay.stats()
+    }
+
+# 运行指标接口
+@router.get("", dependencies=[Depends(verify_metrics_token)])
+async def get_metrics():
+    """
+    获取当前进程的运行指标
+
+    包括各模型服务的p95耗时、错误率和并发限制器状态（当前上限、进行中和排队中的调用数、拒绝次数），
+    各功能的对冲比例、p99耗时、生成预算与实际p95的对比和前缀缓存命中率，以及各缓存的命中率
+
+    Returns:
+        dict: 包含运行指标的响应
+    """
+    return api_response(collect_metrics())
+
+# Prometheus格式指标接口
+@router.get("/prometheus", dependencies=[Depends(verify_metrics_token)], response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    """
+    以Prometheus文本格式输出运行指标，供监控系统抓取
+
+    Returns:
+        str: Prometheus文本格式的指标
+    """
+    lines = []
+    gauges = [("limit", "当前并发上限"), ("inflight", "进行中的调用数"), ("queued", "排队中的调用数")]
+    counters = [("accepted", "获得名额的调用数"), ("rejected", "被快速拒绝的调用数"),
+                ("errors", "出错的调用数"), ("slow", "超过期望耗时的调用数")]
+    stats = [limiter.stats() for limiter in LIMITERS]
+    for key, help_text in gauges:
+        lines.append(f"# HELP llm_limiter_{key} {help_text}")
+        lines.append(f"# TYPE llm_limiter_{key} gauge")
+        lines.extend(f'llm_limiter_{key}{{limiter="{s["name"]}"}} {s[key]}' for s in stats)
+    for key, help_text in counters:
+        lines.append(f"# HELP llm_limiter_{key}_total {help_text}")
+        lines.append(f"# TYPE llm_limiter_{key}_total counter")
+        lines.extend(f'llm_limiter_{key}_total{{limiter="{s["name"]}"}} {s[key]}' for s in stats)
+    lines.append("# HELP llm_limiter_queue_wait_seconds 排队时间的指数移动平均")
+    lines.append("# TYPE llm_limiter_queue_wait_seconds gauge")
+    lines.extend(f'llm_limiter_queue_wait_seconds{{limiter="{s["name"]}"}} {s["queueWaitEwmaSeconds"]}' for s in stats)
+
+    router_stats = llm_router.stats()
+    for key, name, help_text in [("p95Seconds", "llm_backend_p95_seconds", "窗口内成功调用的p95耗时"),
+                                 ("errorRate", "llm_backend_error_rate", "窗口内的错误率")]:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(f'{name}{{backend="{b["name"]}"}} {b[key]}' for b in router_stats["backends"] if b[key] is not None)
+    route_stats = router_stats["routes"]
+    for key, name, help_text in [("hedgeRate", "llm_route_hedge_rate", "发出对冲请求的请求比例"),
+                                 ("p99Seconds", "llm_route_p99_seconds", "窗口内的p99耗时"),
+                                 ("p99WithoutHedgeSeconds", "llm_route_p99_without_hedge_seconds", "抽样请求不对冲时的p99耗时"),
+                                 ("p99WithHedgeSeconds", "llm_route_p99_with_hedge_seconds", "抽样请求对冲后的p99耗时"),
+                                 ("targetP95Seconds", "llm_route_target_p95_seconds", "生成预算中的期望p95耗时"),
+                                 ("p50CacheHitSeconds", "llm_route_p50_cache_hit_seconds", "命中前缀缓存的调用p50耗时"),
+                                 ("p50CacheMissSeconds", "llm_route_p50_cache_miss_seconds", "未命中前缀缓存的调用p50耗时")]:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(f'{name}{{route="{route}"}} {r[key]}' for route, r in route_stats.items() if r[key] is not None)
+    for key, name, help_text in [("requests", "llm_route_requests_total", "请求数"),
+                                 ("hedges", "llm_route_hedges_total", "对冲请求数"),
+                                 ("hedgeWins", "llm_route_hedge_wins_total", "对冲请求先返回的次数"),
+                                 ("hedgesDenied", "llm_route_hedges_denied_total", "因预算不足未发出的对冲请求数"),
+                                 ("truncated", "llm_route_truncated_total", "达到最大输出长度被截断的调用数"),
+                                 ("timeouts", "llm_route_timeouts_total", "超时的调用数"),
+                                 ("promptTokens", "llm_route_prompt_tokens_total", "输入token数"),
+                                 ("cachedPromptTokens", "llm_route_cached_prompt_tokens_total", "命中前缀缓存的输入token数")]:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        lines.extend(f'{name}{{route="{route}"}} {r[key]}' for route, r in route_stats.items())
+    for key, name, help_text in [("failovers", "llm_router_failovers_total", "故障转移次数"),
+                                 ("providerHedges", "llm_router_provider_hedges_total", "向第二个服务发出的对冲请求数")]:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {router_stats[key]}")
+
+    loop_stats = loop_monitor.stats()
+    lines.append("# HELP event_loop_lag_seconds 事件循环延迟")
+    lines.append("# TYPE event_loop_lag_seconds histogram")
+    for bound, count in loop_monitor.histogram():
+        lines.append(f'event_loop_lag_seconds_bucket{{le="{"+Inf" if bound == float("inf") else bound}"}} {count}')
+    lines.append(f"event_loop_lag_seconds_sum {loop_stats['lagSumSeconds']}")
+    lines.append(f"event_loop_lag_seconds_count {loop_stats['lagCount']}")
+    lines.append("# HELP event_loop_blocks_total 延迟超过阈值的阻塞次数")
+    lines.append("# TYPE event_loop_blocks_total counter")
+    lines.append(f"event_loop_blocks_total {loop_stats['blocks']}")
+    return "\n".join(lines) + "\n"
+
+# 剖析报告列表接口
+@router.get("/profiles", dependencies=[Depends(verify_metrics_token)])
+async def list_profiles():
+    """
+    列出最近的请求剖析报告，最新的在前
+
+    需要开启PROFILING_ENABLED，请求头带X-Profile: 1和X-Metrics-Token的请求以及按PROFILE_SAMPLE_RATE抽样的请求会被剖析
+
+    Returns:
+        dict: 包含报告ID、请求路径、状态码、触发方式和耗时的响应
+    """
+    return api_response(profile_store.list())
+
+# 剖析报告下载接口
+@router.get("/profiles/{report_id}", dependencies=[Depends(verify_metrics_token)])
+async def get_profile(report_id: str, format: str = "html"):
+    """
+    下载剖析报告
+
+    Args:
+        report_id: 报告ID，即被剖析请求的响应头X-Profile-Id
+        format: html（浏览器中查看的调用树）、text（文本调用树）或speedscope（可导入speedscope.app的JSON）
+
+    Raises:
+        HTTPException: 报告不存在或已被新报告替换时抛出404错误
+    """
+    if format not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的格式，可选: {', '.join(PROFILE_FORMATS)}")
+    content = profile_store.render(report_id, format)
+    if content is None:
+        raise HTTPException(status_code=404, detail="剖析报告不存在")
+    if format == "html":
+        return HTMLResponse(content)
+    if format == "text":
+        return PlainTextResponse(content)
+    return Response(content, media_type="application/json",
+                    headers={"Content-Disposition": f'attachment; filename="{report_id}.speedscope.json"'})
@@ -1,56 +1,159 @@
 # 导入必要的模块
-from fastapi import APIRouter, Depends, HTTPException, status  # FastAPI相关组件
-from sqlalchemy.orm import Session  # 数据库会话
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status  # FastAPI相关组件
+from sqlalchemy.orm import Session, joinedload  # 数据库会话和预加载
+from pydantic import BaseModel  # 数据验证
+from typing import Optional  # 类型提示
+import hashlib  # 计算ETag
+import orjson  # 序列化用户信息
 
 # 导入项目内部模块
 
+from config import USER_INFO_CACHE_SIZE, USER_INFO_CACHE_TTL  # 用户信息缓存配置
+from cache import TTLCache  # 进程内缓存
 from database import get_db  # 数据库会话依赖
-from database import get_db  # 数据库会话依赖
-from models import User  # 数据模型
-from utils import get_current_user  # 用户认证依赖
+from database import get_read_db  # 只读数据库会话依赖
+from models import User, UserSettings  # 数据模型
+from utils import get_current_user, get_current_user_id, credentials_exception  # 用户认证依赖
+from responses import ApiResponse, api_response  # 统一响应格式
 
 # 创建路由器
 router = APIRouter()
 
+# 用户信息缓存：user_id -> (ETag, 用户信息)，设置修改时同步更新
+user_info_cache = TTLCache(maxsize=USER_INFO_CACHE_SIZE, ttl=USER_INFO_CACHE_TTL)
+
+# 用户设置响应模型
+class UserSettingsInfo(BaseModel):
+    """用户设置信息"""
+    isDarkMode: bool  # 深色模式
+    autoRead: bool  # 自动朗读
+    saveHistory: bool  # 保存历史
+
+# 用户信息响应模型
+class UserInfo(BaseModel):
+    """用户信息及设置"""
+    id: str  # 用户ID
+    openid: str  # 微信openid
+    nickName: Optional[str] = None  # 用户昵称
+    avatar: Optional[str] = None  # 用户头像
+    createdAt: str  # 创建时间
+    settings: UserSettingsInfo  # 用户设置
+
+# 更新用户设置请求模型
+class UserSettingsUpdate(BaseModel):
+    """更新用户设置请求，未提供的字段保持不变"""
+    isDarkMode: Optional[bool] = None  # 深色模式
+    autoRead: Optional[bool] = None  # 自动朗读
+    saveHistory: Optional[bool] = None  # 保存历史
+
+def _setting_value(settings: Optional[UserSettings], name: str):
+    """读取设置项，尚未创建设置记录时返回模型定义的默认值"""
+    value = getattr(settings, name) if settings is not None else None
+    return UserSettings.__table__.c[name].default.arg if value is None else value
+
+def build_user_info(user: User) -> tuple:
+    """构建用户信息及其ETag
+
+    Args:
+        user: 已预加载settings的用户对象
+
+    Returns:
+        tuple: (ETag, 用户信息字典)
+    """
+    settings = user.settings
+    info = {
+        "id": user.id,  # 用户ID
+        "openid": user.openid,  # 微信openid
+        "nickName": user.nick_name,  # 用户昵称
+        "avatar": user.avatar,  # 用户头像
+        "createdAt": user.created_at.isoformat(),  # 格式化创建时间
+        "settings": {  # 用户设置
+            "isDarkMode": _setting_value(settings, "is_dark_mode"),  # 深色模式
+            "autoRead": _setting_value(settings, "auto_read"),  # 自动朗读
+            "saveHistory": _setting_value(settings, "save_history")  # 保存历史
+        }
+    }
+    etag = '"' + hashlib.sha1(orjson.dumps(info)).hexdigest() + '"'
+    return etag, info
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """判断If-None-Match请求头是否包含当前ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+def _user_info_response(request: Request, etag: str, info: dict) -> Response:
+    """返回用户信息，客户端缓存的ETag仍然有效时返回304"""
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return api_response(info, headers=headers)
+
 # 获取用户信息接口
-@router.get("/info")
-async def get_user_info(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.get("/info", response_model=ApiResponse[UserInfo])
+async def get_user_info(request: Request, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_read_db)):
     """
     获取当前用户信息接口
     
-    返回用户基本信息和个性化设置
+    返回用户基本信息和个性化设置。结果按用户缓存在进程内，命中时不访问数据库；
+    请求头If-None-Match与ETag一致时返回304且不带响应体。
+    未命中时用一次关联查询读取用户和设置，查询走只读副本
+    
+    Args:
+        request: 请求对象，用于读取If-None-Match
+        user_id: 当前用户ID，由get_current_user_id依赖项提供
+        db: 只读数据库会话，由get_read_db依赖项提供
+        
+    Returns:
+        dict: 包含用户信息和设置的响应
+    """
+    cached = user_info_cache.get(user_id)
+    if cached is None:
+        user = db.query(User).options(joinedload(User.settings)).filter(User.id == user_id).first()
+        if user is None:
+            raise credentials_exception()
+        cached = build_user_info(user)
+        user_info_cache.set(user_id, cached)
+    etag, info = cached
+    return _user_info_response(request, etag, info)
+
+# 更新用户设置接口
+@router.put("/settings", response_model=ApiResponse[UserInfo])
+async def update_user_settings(
+    update: UserSettingsUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    更新当前用户设置接口
+    
+    只修改请求中提供的字段，尚未创建设置记录时自动创建。
+    提交后同步更新用户信息缓存，返回新的用户信息和ETag
     
     Args:
+        update: 要修改的设置项
         current_user: 当前认证用户，由get_current_user依赖项提供
         db: 数据库会话，由get_db依赖项提供
         
     Returns:
         dict: 包含用户信息和设置的响应
     """
-    # 获取用户设置
     settings = db.query(UserSettings).filter(UserSettings.user_id == current_user.id).first()
-    
     if not settings:
-        # 如果没有设置，创建默认设置
         settings = UserSettings(user_id=current_user.id)  # 创建默认用户设置
-        db.add(settings)  # 添加到数据库会话
-        db.commit()  # 提交事务
-        db.refresh(settings)  # 刷新对象
-    
-    # 返回响应
-    return {
-        "code": 200,
-        "message": "success",
-        "data": {
-            "id": current_user.id,  # 用户ID
-            "openid": current_user.openid,  # 微信openid
-            "nickName": current_user.nick_name,  # 用户昵称
-            "avatar": current_user.avatar,  # 用户头像
-            "createdAt": current_user.created_at.isoformat(),  # 格式化创建时间
-            "settings": {  # 用户设置
-                "isDarkMode": settings.is_dark_mode,  # 深色模式
-                "autoRead": settings.auto_read,  # 自动朗读
-                "saveHistory": settings.save_history  # 保存历史
-            }
-        }
-    }
\ No newline at end of file
+        db.add(settings)
+    if update.isDarkMode is not None:
+        settings.is_dark_mode = update.isDarkMode
+    if update.autoRead is not None:
+        settings.auto_read = update.autoRead
+    if update.saveHistory is not None:
+        settings.save_history = update.saveHistory
+    db.commit()  # 提交事务，提交后current_user及其设置会重新加载
+
+    # 写穿缓存：提交成功后立即用新数据替换缓存
+    cached = build_user_info(current_user)
+    user_info_cache.set(current_user.id, cached)
+    etag, info = cached
+    return api_response(info, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
@@ -0,0 +1,243 @@
+# 导入必要的模块
+import asyncio  # 并发处理同一连接上的多个请求
+import threading  # 线程池中同步调用的取消标记
+import time  # 截止时间和令牌过期判断
+import orjson  # 消息序列化
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect  # FastAPI相关组件
+from fastapi.concurrency import run_in_threadpool  # 在线程池中执行同步调用
+
+# 导入项目内部模块
+
+from config import REQUEST_TIMEOUT, WS_AUTH_TIMEOUT, WS_IDLE_TIMEOUT, WS_MAX_INFLIGHT, WS_SEND_QUEUE  # 连接配置
+from database import SessionLocal, current_user_id  # 数据库会话和当前用户
+from deadline import request_deadline, request_cancel_event  # 请求截止时间与取消
+from limiter import LimiterRejected  # DeepSeek并发限制
+from models import User  # 数据模型
+from routers.chat import dispatch_chat_function  # 功能分发
+from routers.chatwithdeepseek import generate_image  # 文生图
+from revocation import revocation_list  # 已吊销令牌
+from utils import decode_access_token  # 令牌校验
+
+# 创建路由器
+router = APIRouter()
+
+# 连接统计，由运行指标接口输出
+ws_stats = {"connections": 0, "totalConnections": 0, "requests": 0, "rejected": 0, "authFailures": 0}
+
+
+class _Closed(Exception):
+    """连接需要关闭"""
+
+    def __init__(self, code: int, reason: str):
+        self.code = code
+        self.reason = reason
+
+
+class ChatConnection:
+    """一个已认证的WebSocket连接
+
+    连接建立时校验一次令牌并查询一次用户，之后同一连接上的所有请求共用这些状态。
+    每个请求带客户端生成的id，请求并发执行，结果按完成顺序返回，用id对应；
+    进行中的请求超过WS_MAX_INFLIGHT时直接拒绝新请求。
+    发送队列有上限，客户端读取过慢时生成任务在写入队列时等待，不会无限堆积待发送的数据
+
+    Attributes:
+        websocket: WebSocket连接
+        user_id: 当前用户ID
+        expires_at: 令牌过期时间（Unix时间戳），过期后关闭连接
+        jti: 令牌唯一标识，令牌被吊销（退出登录）后关闭连接
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: str, expires_at: float = None, jti: str = None):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.expires_at = expires_at
+        self.jti = jti
+        self.tasks = {}  # 请求id -> (任务, 取消标记)
+        self.outbox = asyncio.Queue(maxsize=WS_SEND_QUEUE)
+
+    async def send(self, message: dict):
+        """把消息放入发送队列，队列已满时等待"""
+        await self.outbox.put(message)
+
+    async def _send_loop(self):
+        while True:
+            message = await self.outbox.get()
+            await self.websocket.send_text(orjson.dumps(message).decode())
+
+    async def _run(self, request_id: str, kind: str, payload: dict, cancel_event: threading.Event):
+        """执行一个请求并发送结果，请求级的截止时间、取消标记和当前用户只在本任务内有效"""
+        request_deadline.set(time.monotonic() + REQUEST_TIMEOUT if REQUEST_TIMEOUT > 0 else None)
+        request_cancel_event.set(cancel_event)
+        current_user_id.set(self.user_id)
+        try:
+            await self.send({"type": "ack", "id": request_id})
+            timeout = REQUEST_TIMEOUT if REQUEST_TIMEOUT > 0 else None
+            if kind == "chat":
+                data = await asyncio.wait_for(dispatch_chat_function(
+                    payload["message"], payload.get("functionType"), payload.get("functionValue")), timeout)
+            else:
+                image_key, response = await asyncio.wait_for(run_in_threadpool(generate_image, payload["message"]), timeout)
+                data = {"imageKey": image_key, "result": response}
+            await self.send({"type": "result", "id": request_id, "code": 200, "data": data})
+        except asyncio.CancelledError:
+            cancel_event.set()  # 通知线程池中的同步调用停止重试
+            raise
+        except asyncio.TimeoutError:
+            cancel_event.set()
+            await self.send({"type": "result", "id": request_id, "code": 504, "message": "AI回复超时，请稍后再试"})
+        except LimiterRejected:
+            await self.send({"type": "result", "id": request_id, "code": 503, "message": "服务繁忙，请稍后再试"})
+        except Exception as e:
+            print(f"WebSocket请求{request_id}处理出错: {str(e)}")
+            await self.send({"type": "result", "id": request_id, "code": 500, "message": f"处理请求失败: {str(e)}"})
+        finally:
+            self.tasks.pop(request_id, None)
+
+    async def _handle(self, message: dict):
+        """处理客户端发来的一条消息"""
+        if self.expires_at and time.time() >= self.expires_at:
+            raise _Closed(4401, "令牌已过期")
+        revoked = revocation_list.lookup(self.jti)  # 绝大多数消息只查内存中的布隆过滤器
+        if revoked is None:
+            revoked = await run_in_threadpool(revocation_list.confirm, self.jti)  # 命中且未确认时查询吊销表
+        if revoked:
+            raise _Closed(4401, "令牌已吊销")
+        kind = message.get("type")
+        request_id = message.get("id")
+        if kind == "ping":
+            await self.send({"type": "pong"})
+            return
+        if kind == "cancel":
+            entry = self.tasks.get(request_id)
+            if entry is not None:
+                entry[0].cancel()
+                await self.send({"type": "cancelled", "id": request_id})
+            return
+        if kind not in ("chat", "image"):
+            await self.send({"type": "error", "id": request_id, "code": 400, "message": f"不支持的消息类型: {kind}"})
+            return
+        if not isinstance(request_id, str) or not request_id:
+            await self.send({"type": "error", "code": 400, "message": "请求缺少id"})
+            return
+        if request_id in self.tasks:
+            await self.send({"type": "error", "id": request_id, "code": 409, "message": "相同id的请求仍在处理中"})
+            return
+        if not message.get("message"):
+            await self.send({"type": "error", "id": request_id, "code": 400, "message": "消息内容不能为空"})
+            return
+        if len(self.tasks) >= WS_MAX_INFLIGHT:
+            ws_stats["rejected"] += 1
+            await self.send({"type": "error", "id": request_id, "code": 429,
+                             "message": f"同一连接最多同时处理{WS_MAX_INFLIGHT}个请求"})
+            return
+        ws_stats["requests"] += 1
+        cancel_event = threading.Event()
+        task = asyncio.create_task(self._run(request_id, kind, message, cancel_event))
+        self.tasks[request_id] = (task, cancel_event)
+
+    async def serve(self):
+        """读取并处理消息，直到客户端断开、空闲超时或令牌过期"""
+        sender = asyncio.create_task(self._send_loop())
+        try:
+            while True:
+                receive = asyncio.ensure_future(self.websocket.receive_text())
+                done, _ = await asyncio.wait({receive, sender}, timeout=WS_IDLE_TIMEOUT or None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if sender in done:
+                    receive.cancel()
+                    sender.result()  # 发送失败说明连接已断开，抛出异常
+                if receive not in done:
+                    receive.cancel()
+                    raise _Closed(1000, "连接空闲超时")
+                try:
+                    message = orjson.loads(receive.result())
+                except orjson.JSONDecodeError:
+                    await self.send({"type": "error", "code": 400, "message": "消息不是有效的JSON"})
+                    continue
+                if not isinstance(message, dict):
+                    await self.send({"type": "error", "code": 400, "message": "消息必须是JSON对象"})
+                    continue
+                await self._handle(message)
+        finally:
+            for task, cancel_event in list(self.tasks.values()):
+                cancel_event.set()
+                task.cancel()
+            sender.cancel()
+
+
+async def _authenticate(websocket: WebSocket) -> dict:
+    """获取并校验令牌
+
+    依次从查询参数token、Authorization请求头和连接后的第一条{"type": "auth", "token": ...}消息中读取，
+    浏览器和小程序不方便设置请求头时可以使用后两种方式
+    """
+    token = websocket.query_params.get("token")
+    authorization = websocket.headers.get("authorization", "")
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token:
+        message = orjson.loads(await asyncio.wait_for(websocket.receive_text(), WS_AUTH_TIMEOUT))
+        if isinstance(message, dict) and message.get("type") == "auth":
+            token = message.get("token")
+    if not token:
+        raise _Closed(4401, "缺少认证令牌")
+    payload = await run_in_threadpool(_verify_token, token)  # 吊销检查和用户查询都会访问数据库
+    if payload is None:
+        raise _Closed(4401, "无效的认证凭证")
+    return payload
+
+
+def _verify_token(token: str):
+    """校验令牌并确认用户存在，失败时返回None"""
+    try:
+        payload = decode_access_token(token)
+    except HTTPException:
+        return None
+    db = SessionLocal()
+    try:
+        if db.get(User, payload["sub"]) is None:
+            return None
+    finally:
+        db.close()
+    return payload
+
+
+# 聊天WebSocket接口
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket):
+    """
+    聊天WebSocket接口，一个连接上可以同时进行多个请求
+
+    连接时认证一次，之后的请求不再重复校验令牌和查询用户。消息均为JSON文本：
+
+    - 客户端发送{"type": "chat", "id", "message", "functionType", "functionValue"}进行AI回复，
+      参数与/chat/chatAi相同；{"type": "image", "id", "message"}生成图片；
+      {"type": "cancel", "id"}取消进行中的请求；{"type": "ping"}心跳
+    - 服务端对每个请求先返回{"type": "ack", "id"}，完成后返回{"type": "result", "id", "code", "data"或"message"}，
+      code与HTTP接口的状态码含义相同；消息格式错误或超过并发上限时返回{"type": "error", "id", "code", "message"}
+
+    认证失败、令牌过期或被吊销时以4401关闭连接
+    """
+    await websocket.accept()
+    try:
+        payload = await _authenticate(websocket)
+    except (_Closed, asyncio.TimeoutError, orjson.JSONDecodeError, WebSocketDisconnect) as e:
+        ws_stats["authFailures"] += 1
+        if not isinstance(e, WebSocketDisconnect):
+            reason = e.reason if isinstance(e, _Closed) else "认证失败"
+            await websocket.close(code=4401, reason=reason)
+        return
+
+    connection = ChatConnection(websocket, payload["sub"], payload.get("exp"), payload.get("jti"))
+    ws_stats["connections"] += 1
+    ws_stats["totalConnections"] += 1
+    try:
+        await websocket.send_text(orjson.dumps({"type": "ready", "userId": connection.user_id}).decode())
+        await connection.serve()
+    except _Closed as e:
+        await websocket.close(code=e.code, reason=e.reason)
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # 客户端已断开
+    finally:
+        ws_stats["connections"] -= 1
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# 聊天记录归档与恢复工具
+#
+# 用法：
+#   python scripts/chat_retention.py archive --days 180          # 归档180天前的会话
+#   python scripts/chat_retention.py restore archives/chat_archive_xxx.jsonl.gz
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import RETENTION_DAYS, RETENTION_BATCH_SIZE, RETENTION_DELETE_CHUNK, ARCHIVE_DIR  # noqa: E402
+from retention import archive_sessions, restore_archive  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="聊天记录归档与恢复工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    archive_parser = subparsers.add_parser("archive", help="归档并删除超过保留期的会话")
+    archive_parser.add_argument("--days", type=int, default=RETENTION_DAYS or 180, help="保留天数")
+    archive_parser.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE, help="每个归档文件的会话数")
+    archive_parser.add_argument("--delete-chunk", type=int, default=RETENTION_DELETE_CHUNK, help="每个删除事务的行数")
+    archive_parser.add_argument("--archive-dir", default=ARCHIVE_DIR, help="归档文件目录")
+    archive_parser.add_argument("--max-batches", type=int, default=0, help="最多处理的批次数，0表示不限制")
+
+    restore_parser = subparsers.add_parser("restore", help="从归档文件恢复会话")
+    restore_parser.add_argument("paths", nargs="+", help="归档文件路径")
+
+    args = parser.parse_args()
+    if args.command == "archive":
+        before = datetime.utcnow() - timedelta(days=args.days)
+        stats = archive_sessions(before, args.batch_size, args.delete_chunk, args.archive_dir, args.max_batches)
+        print(f"归档完成: {stats['sessions']} 个会话、{stats['messages']} 条消息、{len(stats['files'])} 个文件，"
+              f"跳过 {stats['skipped']} 个归档期间有更新的会话")
+    else:
+        for path in args.paths:
+            stats = restore_archive(path)
+            print(f"{path}: 恢复 {stats['sessions']} 个会话、{stats['messages']} 条消息，跳过 {stats['skipped']} 个已存在的会话")
+
+
+if __name__ == "__main__":
+    main()
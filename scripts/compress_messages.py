@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# 存量聊天消息分批压缩/解压迁移工具
+#
+# 用法：
+#   python scripts/compress_messages.py --batch-size 500            # 压缩超过阈值的存量消息
+#   python scripts/compress_messages.py --decompress                # 回滚：解压所有压缩消息
+#   python scripts/compress_messages.py --dry-run                   # 只统计，不修改
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+
+from compression import encode_content, decode_content, is_encoded  # noqa: E402
+from config import MESSAGE_COMPRESSION_THRESHOLD  # noqa: E402
+from database import engine  # noqa: E402
+
+
+def migrate(batch_size: int, decompress: bool, dry_run: bool, pause: float):
+    """按主键顺序分批处理，每批一个短事务，避免长时间持有行锁"""
+    if decompress:
+        select_sql = text(
+            "SELECT id, content FROM chat_messages "
+            "WHERE is_compressed = :flag AND id > :last_id ORDER BY id LIMIT :limit"
+        )
+        params = {"flag": True}
+    else:
+        # MySQL的LENGTH按字节计算，字符数需用CHAR_LENGTH
+        length_func = "CHAR_LENGTH" if engine.dialect.name == "mysql" else "LENGTH"
+        select_sql = text(
+            "SELECT id, content FROM chat_messages "
+            f"WHERE is_compressed = :flag AND {length_func}(content) >= :threshold "
+            "AND id > :last_id ORDER BY id LIMIT :limit"
+        )
+        params = {"flag": False, "threshold": MESSAGE_COMPRESSION_THRESHOLD}
+    update_sql = text("UPDATE chat_messages SET content = :content, is_compressed = :flag WHERE id = :id")
+
+    last_id = ""
+    processed = 0
+    before_bytes = 0
+    after_bytes = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(select_sql, {**params, "last_id": last_id, "limit": batch_size}).fetchall()
+            if not rows:
+                break
+            updates = []
+            for row_id, content in rows:
+                if decompress:
+                    new_content = decode_content(content)
+                else:
+                    new_content = encode_content(content, force=True)
+                before_bytes += len(content.encode("utf-8"))
+                after_bytes += len(new_content.encode("utf-8"))
+                updates.append({"id": row_id, "content": new_content, "flag": is_encoded(new_content)})
+            if not dry_run:
+                conn.execute(update_sql, updates)
+        processed += len(rows)
+        last_id = rows[-1][0]
+        print(f"已处理 {processed} 条，存储大小 {before_bytes / 1024:.0f} KB -> {after_bytes / 1024:.0f} KB")
+        if pause:
+            time.sleep(pause)  # 批次间暂停，降低对主库的压力
+
+    print(f"完成，共处理 {processed} 条消息" + ("（试运行，未修改数据）" if dry_run else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="存量聊天消息分批压缩/解压迁移工具")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批处理的消息数")
+    parser.add_argument("--decompress", action="store_true", help="解压所有压缩消息（回滚）")
+    parser.add_argument("--dry-run", action="store_true", help="只统计压缩效果，不修改数据")
+    parser.add_argument("--pause", type=float, default=0.05, help="批次间暂停秒数")
+    args = parser.parse_args()
+    migrate(args.batch_size, args.decompress, args.dry_run, args.pause)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# 本地模拟的Flux图片API，用于离线调试文生图流程
+#
+# 用法：
+#   python scripts/fake_flux_server.py --port 8081 --delay 1
+#   TEXT2IMAGE_URL=http://127.0.0.1:8081/flux/images python run.py
+import argparse
+import hashlib
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeFluxHandler(BaseHTTPRequestHandler):
+    """按提示词返回确定性结果的模拟图片API"""
+
+    delay = 0.0  # 模拟生成耗时（秒）
+    request_count = 0  # 已处理的生成请求数
+    success = True  # 为False时模拟图片API返回200但生成失败
+
+    def do_POST(self):
+        length = int(self.headers.get("content-length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        FakeFluxHandler.request_count += 1
+        time.sleep(self.delay)
+
+        prompt = payload.get("prompt", "")
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+        if not FakeFluxHandler.success:
+            body = json.dumps({"success": False, "error": "生成失败", "task_id": f"fake-{FakeFluxHandler.request_count}"})
+        else:
+            body = json.dumps({
+                "success": True,
+                "task_id": f"fake-{FakeFluxHandler.request_count}",
+                "data": [{
+                    "prompt": prompt,
+                    "image_url": f"https://example.com/fake-flux/{digest}.png",
+                    "image_width": 1024,
+                    "image_height": 1024
+                }]
+            })
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"[fake-flux] 第{FakeFluxHandler.request_count}次请求: {format % args}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的Flux图片API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--delay", type=float, default=0.0, help="模拟生成耗时（秒）")
+    args = parser.parse_args()
+
+    FakeFluxHandler.delay = args.delay
+    server = ThreadingHTTPServer((args.host, args.port), FakeFluxHandler)
+    print(f"模拟Flux服务已启动: http://{args.host}:{args.port}/flux/images")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# 本地模拟的OpenAI兼容聊天接口，用于离线调试多模型路由、故障转移和对冲
+#
+# 用法（两个服务分别模拟DeepSeek和备用服务）：
+#   python scripts/fake_llm_server.py --port 8091 --name deepseek --delay 0.5 --slow-rate 0.1 --slow-delay 8
+#   python scripts/fake_llm_server.py --port 8092 --name openai --delay 1
+#   DEEPSEEK_API_URL=http://127.0.0.1:8091/v1 DEEPSEEK_API_KEY=fake \
+#   AI_API_URL=http://127.0.0.1:8092/v1/chat/completions AI_API_KEY=fake python run.py
+#
+# 模拟DeepSeek的前缀缓存：按64字为单位缓存出现过的提示词前缀，命中部分不计预填充耗时，
+# 响应的usage中返回prompt_cache_hit_tokens和prompt_cache_miss_tokens（以字数近似token数）：
+#   python scripts/fake_llm_server.py --port 8091 --name deepseek --prefill-delay 0.002
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """返回固定格式回复的模拟聊天接口，可配置耗时、长尾和错误率"""
+
+    name = "fake"  # 服务名称，出现在回复内容中
+    delay = 0.0  # 基础耗时（秒）
+    slow_rate = 0.0  # 长尾请求比例
+    slow_delay = 0.0  # 长尾请求耗时（秒）
+    error_rate = 0.0  # 返回500的比例
+    prefill_delay = 0.0  # 每个未命中前缀缓存的字的预填充耗时（秒）
+    request_count = 0  # 已处理的请求数
+    prefix_cache = set()  # 已缓存前缀的哈希，按CACHE_BLOCK字对齐
+    prefix_lock = threading.Lock()
+
+    CACHE_BLOCK = 64
+
+    def _prefix_cache_hits(self, prompt: str) -> int:
+        """返回命中前缀缓存的字数，并缓存本次提示词的所有前缀"""
+        ends = range(self.CACHE_BLOCK, len(prompt) + 1, self.CACHE_BLOCK)
+        hashes = [hash(prompt[:end]) for end in ends]
+        with self.prefix_lock:
+            cached = 0
+            for end, value in zip(ends, hashes):
+                if value not in self.prefix_cache:
+                    break
+                cached = end
+            self.prefix_cache.update(hashes)
+        return cached
+
+    def do_POST(self):
+        length = int(self.headers.get("content-length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        FakeLLMHandler.request_count += 1
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": "not found"}})
+            return
+
+        prompt = "".join(f"{m.get('role')}:{m.get('content', '')}\n" for m in payload.get("messages", []))
+        cached = self._prefix_cache_hits(prompt)
+        slow = random.random() < self.slow_rate
+        time.sleep((self.slow_delay if slow else self.delay) + (len(prompt) - cached) * self.prefill_delay)
+        if random.random() < self.error_rate:
+            self._send(500, {"error": {"message": "fake upstream error", "type": "server_error"}})
+            return
+
+        user_message = next((m.get("content", "") for m in reversed(payload.get("messages", []))
+                             if m.get("role") == "user"), "")
+        content = f"[{self.name}] {user_message[:50]}"
+        finish_reason = "stop"
+        for stop in payload.get("stop") or []:
+            content = content.split(stop, 1)[0]
+        if payload.get("max_tokens") and len(content) > payload["max_tokens"]:
+            content, finish_reason = content[:payload["max_tokens"]], "length"  # 以字数近似token数
+        self._send(200, {
+            "id": f"chatcmpl-fake-{FakeLLMHandler.request_count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason
+            }],
+            "usage": {
+                "prompt_tokens": len(prompt),
+                "completion_tokens": len(content),
+                "total_tokens": len(prompt) + len(content),
+                "prompt_cache_hit_tokens": cached,
+                "prompt_cache_miss_tokens": len(prompt) - cached
+            }
+        })
+
+    def _send(self, status_code: int, body: dict):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        print(f"[fake-llm:{self.name}] 第{FakeLLMHandler.request_count}次请求: {format % args}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的OpenAI兼容聊天接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--name", default="fake", help="服务名称，出现在回复内容中")
+    parser.add_argument("--delay", type=float, default=0.0, help="基础耗时（秒）")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="长尾请求比例")
+    parser.add_argument("--slow-delay", type=float, default=0.0, help="长尾请求耗时（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的比例")
+    parser.add_argument("--prefill-delay", type=float, default=0.0, help="每个未命中前缀缓存的字的预填充耗时（秒）")
+    args = parser.parse_args()
+
+    FakeLLMHandler.name = args.name
+    FakeLLMHandler.delay = args.delay
+    FakeLLMHandler.slow_rate = args.slow_rate
+    FakeLLMHandler.slow_delay = args.slow_delay
+    FakeLLMHandler.error_rate = args.error_rate
+    FakeLLMHandler.prefill_delay = args.prefill_delay
+    server = ThreadingHTTPServer((args.host, args.port), FakeLLMHandler)
+    print(f"模拟聊天服务{args.name}已启动: http://{args.host}:{args.port}/v1/chat/completions")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# chat_messages主键与分区迁移工具
+#
+# 用法：
+#   python scripts/migrate_ids.py rekey-messages --batch-size 1000   # 存量消息ID改写为按创建时间排序的UUIDv7
+#   python scripts/migrate_ids.py partition --months-ahead 3 --drop-fulltext   # 按月分区（仅MySQL）
+#   python scripts/migrate_ids.py add-partitions --months-ahead 3     # 为未来月份追加分区（建议每月定时执行）
+#
+# users和chat_sessions的ID不做改写：用户ID是已签发JWT的sub，会话ID由客户端保存，
+# 改写会使令牌和客户端缓存失效；新记录会自动使用UUIDv7
+import argparse
+import os
+import sys
+import time
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+
+from database import engine  # noqa: E402
+from ids import uuid7_from_datetime  # noqa: E402
+
+
+def _as_datetime(value) -> datetime:
+    """原生SQL查询在SQLite上返回字符串形式的时间"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value or datetime.utcnow()
+
+
+def rekey_messages(batch_size: int, pause: float):
+    """把非UUIDv7的消息ID改写为按创建时间生成的UUIDv7，每批一个短事务"""
+    # UUID字符串第15个字符是版本号
+    select_sql = text(
+        "SELECT id, created_at FROM chat_messages "
+        "WHERE SUBSTR(id, 15, 1) <> '7' AND id > :last_id ORDER BY id LIMIT :limit"
+    )
+    update_sql = text("UPDATE chat_messages SET id = :new_id WHERE id = :old_id")
+    last_id = ""
+    processed = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(select_sql, {"last_id": last_id, "limit": batch_size}).fetchall()
+            if not rows:
+                break
+            conn.execute(update_sql, [
+                {"old_id": row_id, "new_id": str(uuid7_from_datetime(_as_datetime(created_at)))}
+                for row_id, created_at in rows
+            ])
+        processed += len(rows)
+        last_id = rows[-1][0]
+        print(f"已改写 {processed} 条消息ID")
+        if pause:
+            time.sleep(pause)
+    print(f"完成，共改写 {processed} 条消息ID；建议执行 OPTIMIZE TABLE chat_messages 重建索引")
+
+
+def _month_start(value: date, offset: int = 0) -> date:
+    """返回value所在月份偏移offset个月后的第一天"""
+    month_index = value.year * 12 + value.month - 1 + offset
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _partition_clause(start: date, end: date) -> str:
+    """生成[start, end)每月一个分区的定义"""
+    parts = []
+    current = start
+    while current < end:
+        upper = _month_start(current, 1)
+        parts.append(f"PARTITION p{current:%Y%m} VALUES LESS THAN (TO_DAYS('{upper:%Y-%m-%d}'))")
+        current = upper
+    return ", ".join(parts)
+
+
+def _require_mysql():
+    if engine.dialect.name != "mysql":
+        sys.exit("分区只支持MySQL")
+
+
+def partition(months_ahead: int, drop_fulltext: bool):
+    """把chat_messages改为按created_at月份RANGE分区"""
+    _require_mysql()
+    with engine.begin() as conn:
+        has_fulltext = conn.execute(text(
+            "SELECT COUNT(*) FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'chat_messages' AND INDEX_TYPE = 'FULLTEXT'"
+        )).scalar()
+        if has_fulltext and not drop_fulltext:
+            sys.exit("分区表不支持FULLTEXT索引，请加 --drop-fulltext 并设置 CHAT_SEARCH_FULLTEXT=False")
+        if has_fulltext:
+            conn.execute(text("ALTER TABLE chat_messages DROP INDEX ft_content"))
+            print("已删除全文索引ft_content")
+
+        oldest = conn.execute(text("SELECT MIN(created_at) FROM chat_messages")).scalar()
+        start = _month_start(oldest.date() if oldest else date.today())
+        end = _month_start(date.today(), months_ahead + 1)
+
+        # 分区键必须包含在主键中
+        conn.execute(text(
+            "ALTER TABLE chat_messages MODIFY created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+            "DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)"
+        ))
+        conn.execute(text(
+            "ALTER TABLE chat_messages PARTITION BY RANGE (TO_DAYS(created_at)) ("
+            + _partition_clause(start, end)
+            + ", PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        ))
+    print(f"分区完成：{start:%Y-%m} 至 {_month_start(end, -1):%Y-%m}，另有pmax兜底分区")
+
+
+def add_partitions(months_ahead: int):
+    """从pmax中拆分出未来月份的分区"""
+    _require_mysql()
+    with engine.begin() as conn:
+        names = {row[0] for row in conn.execute(text(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'chat_messages' AND PARTITION_NAME IS NOT NULL"
+        ))}
+        if "pmax" not in names:
+            sys.exit("chat_messages尚未分区，请先执行 partition")
+        existing = sorted(name for name in names if name != "pmax")
+        latest = existing[-1]
+        start = _month_start(date(int(latest[1:5]), int(latest[5:7]), 1), 1)
+        end = _month_start(date.today(), months_ahead + 1)
+        if start >= end:
+            print("未来月份的分区已存在，无需追加")
+            return
+        conn.execute(text(
+            "ALTER TABLE chat_messages REORGANIZE PARTITION pmax INTO ("
+            + _partition_clause(start, end)
+            + ", PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        ))
+    print(f"已追加分区：{start:%Y-%m} 至 {_month_start(end, -1):%Y-%m}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="chat_messages主键与分区迁移工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rekey_parser = subparsers.add_parser("rekey-messages", help="存量消息ID改写为UUIDv7")
+    rekey_parser.add_argument("--batch-size", type=int, default=1000, help="每批改写的消息数")
+    rekey_parser.add_argument("--pause", type=float, default=0.05, help="批次间暂停秒数")
+
+    partition_parser = subparsers.add_parser("partition", help="chat_messages按月分区")
+    partition_parser.add_argument("--months-ahead", type=int, default=3, help="预先创建的未来月份数")
+    partition_parser.add_argument("--drop-fulltext", action="store_true", help="删除不兼容分区的全文索引")
+
+    add_parser = subparsers.add_parser("add-partitions", help="追加未来月份的分区")
+    add_parser.add_argument("--months-ahead", type=int, default=3, help="预先创建的未来月份数")
+
+    args = parser.parse_args()
+    if args.command == "rekey-messages":
+        rekey_messages(args.batch_size, args.pause)
+    elif args.command == "partition":
+        partition(args.months_ahead, args.drop_fulltext)
+    else:
+        add_partitions(args.months_ahead)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# 大规模模拟数据生成工具，用于评估索引和查询计划
+#
+# 向DATABASE_URL指向的数据库批量写入模拟的用户、用户设置、会话和消息：
+# - 每个用户的会话数、每个会话的消息数服从对数正态分布，少数重度用户占大部分数据，与线上分布接近
+# - 消息内容混合中文、英文单词和emoji，AI回复比用户消息长，长消息按MESSAGE_COMPRESSION_*配置压缩
+# - 主键按创建时间生成UUIDv7，与线上写入顺序一致
+# - 默认使用多行INSERT（pymysql的executemany会把INSERT改写为多行VALUES）；
+#   MySQL上可用--method load-data先写临时TSV文件再LOAD DATA LOCAL INFILE，需要服务端开启local_infile
+#
+# 用法：
+#   python scripts/seed_data.py --users 100000 --sessions-per-user 8 --messages-per-session 12
+#   python scripts/seed_data.py --users 1000000 --method load-data --batch-size 20000
+#   python scripts/seed_data.py --users 1000 --dry-run          # 只统计将要生成的数据量
+#
+# 生成的用户openid以seed_开头，可用 --delete 删除之前生成的全部模拟数据
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from compression import encode_content, is_encoded  # noqa: E402
+from config import DATABASE_URL  # noqa: E402
+from ids import uuid7_from_datetime  # noqa: E402
+from models import Base  # noqa: E402
+
+SEED_OPENID_PREFIX = "seed_"
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何林罗高"
+NAME_CHARS = "小大阿子明华丽强静敏伟芳娜磊洋艳勇杰娟涛超霞平刚桂英"
+EMOJIS = ["😀", "😂", "🥰", "😎", "🤔", "👍", "🙏", "🎉", "🔥", "✨", "🌸", "🍜", "☕", "🐱", "🚀", "💡", "❤️", "🙂"]
+TOPICS = ["周末去哪里玩", "帮我写个生日朋友圈", "翻译一下这段话", "今天晚饭吃什么", "怎么学好Python",
+          "推荐几本好书", "写一段小红书文案", "给差评怎么写", "砍价话术", "番茄炒蛋怎么做", "旅行攻略",
+          "面试自我介绍", "工作总结", "减肥食谱", "英语口语练习", "考研复习计划", "租房注意事项"]
+PHRASES = ["我想问一下", "能不能帮我", "谢谢", "这个问题", "具体来说", "比如说", "另外", "总的来说",
+           "首先", "其次", "最后", "建议你", "可以试试", "需要注意的是", "一般情况下", "如果时间允许",
+           "简单来说", "大家都说", "我觉得", "有没有更好的办法", "步骤如下", "小贴士"]
+WORDS = ["AI", "Python", "ok", "App", "Wi-Fi", "PPT", "vlog", "citywalk", "brunch", "deadline", "KPI"]
+
+
+def lognormal_count(rng: random.Random, mean: float, sigma: float, cap: int) -> int:
+    """按对数正态分布生成正整数，期望约为mean，sigma越大分布越偏"""
+    mu = math.log(max(mean, 1)) - sigma ** 2 / 2
+    return max(1, min(cap, int(round(rng.lognormvariate(mu, sigma)))))
+
+
+def make_text(rng: random.Random, min_len: int, max_len: int) -> str:
+    """生成中文为主、混合英文单词和emoji的文本，长度大致在min_len到max_len之间"""
+    target = rng.randint(min_len, max_len)
+    parts = []
+    length = 0
+    while length < target:
+        r = rng.random()
+        if r < 0.7:
+            part = rng.choice(PHRASES) + rng.choice(TOPICS)
+        elif r < 0.85:
+            part = rng.choice(WORDS)
+        else:
+            part = rng.choice(EMOJIS)
+        part += rng.choice("，。！？ 、") if r < 0.7 else ""
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)
+
+
+class Writer:
+    """按批写入各表，支持多行INSERT和LOAD DATA两种方式"""
+
+    COLUMNS = {
+        "users": ["id", "openid", "nick_name", "avatar", "created_at"],
+        "user_settings": ["id", "user_id", "is_dark_mode", "auto_read", "save_history", "created_at", "updated_at"],
+        "chat_sessions": ["id", "user_id", "title", "created_at", "updated_at"],
+        "chat_messages": ["id", "session_id", "is_user", "content", "is_compressed", "created_at"],
+    }
+
+    def __init__(self, engine, method: str, batch_size: int, dry_run: bool):
+        self.engine = engine
+        self.method = method
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.buffers = {table: [] for table in self.COLUMNS}
+        self.counts = {table: 0 for table in self.COLUMNS}
+        self.tmpdir = tempfile.mkdtemp(prefix="seed_") if method == "load-data" else None
+
+    def add(self, table: str, row: dict):
+        buffer = self.buffers[table]
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        # 任一表攒满一批时所有表一起写入，并且先写父表，满足外键约束
+        for name in self.COLUMNS:
+            rows = self.buffers[name]
+            if not rows:
+                continue
+            if not self.dry_run:
+                if self.method == "load-data":
+                    self._load_data(name, rows)
+                else:
+                    self._insert(name, rows)
+            self.counts[name] += len(rows)
+            self.buffers[name] = []
+
+    def _insert(self, table: str, rows):
+        columns = self.COLUMNS[table]
+        sql = text(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})")
+        with self.engine.begin() as conn:
+            conn.execute(sql, rows)
+
+    def _load_data(self, table: str, rows):
+        columns = self.COLUMNS[table]
+        path = os.path.join(self.tmpdir, f"{table}.tsv")
+        with open(path, "w", encoding="utf-8", newline="\n") as f:
+            for row in rows:
+                f.write("\t".join(_tsv_value(row[c]) for c in columns) + "\n")
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                f"LOAD DATA LOCAL INFILE :path INTO TABLE {table} CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({', '.join(columns)})"
+            ), {"path": path})
+        os.remove(path)
+
+
+def _tsv_value(value) -> str:
+    """转换为LOAD DATA默认转义规则下的字段值"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def seed(args):
+    rng = random.Random(args.seed)
+    connect_args = {"local_infile": True} if args.method == "load-data" else {}
+    engine = create_engine(DATABASE_URL, connect_args=connect_args)
+    if args.method == "load-data" and engine.dialect.name != "mysql":
+        raise SystemExit("--method load-data只支持MySQL")
+    if not args.dry_run:
+        Base.metadata.create_all(engine)  # 表不存在时按模型创建，已存在时不修改
+    writer = Writer(engine, args.method, args.batch_size, args.dry_run)
+
+    now = datetime.utcnow().replace(microsecond=0)
+    span = timedelta(days=args.days)
+    start = time.perf_counter()
+    last_report = start
+    for n in range(args.users):
+        user_created = now - span * rng.random() ** 0.5  # 越近期注册的用户越多
+        user_id = str(uuid7_from_datetime(user_created))
+        writer.add("users", {
+            "id": user_id,
+            "openid": f"{SEED_OPENID_PREFIX}{user_id.replace('-', '')}",
+            "nick_name": rng.choice(SURNAMES) + "".join(rng.choices(NAME_CHARS, k=rng.randint(1, 2)))
+                         + (rng.choice(EMOJIS) if rng.random() < 0.3 else ""),
+            "avatar": f"https://thirdwx.qlogo.cn/mmopen/{user_id.replace('-', '')}/132",
+            "created_at": user_created,
+        })
+        writer.add("user_settings", {
+            "id": str(uuid7_from_datetime(user_created)),
+            "user_id": user_id,
+            "is_dark_mode": rng.random() < 0.3,
+            "auto_read": rng.random() < 0.1,
+            "save_history": rng.random() < 0.95,
+            "created_at": user_created,
+            "updated_at": user_created,
+        })
+
+        for _ in range(lognormal_count(rng, args.sessions_per_user, 1.2, args.sessions_per_user * 50)):
+            session_created = user_created + (now - user_created) * rng.random()
+            session_id = str(uuid7_from_datetime(session_created))
+            message_count = lognormal_count(rng, args.messages_per_session, 0.9, args.messages_per_session * 30)
+            contents = [make_text(rng, 4, 60) if i % 2 == 0 else make_text(rng, 40, rng.choice([120, 300, 1500]))
+                        for i in range(message_count)]  # 用户消息和AI回复交替出现
+            message_times = [session_created]
+            for _ in contents:
+                message_times.append(message_times[-1] + timedelta(seconds=rng.randint(2, 120)))
+            writer.add("chat_sessions", {
+                "id": session_id,
+                "user_id": user_id,
+                "title": contents[0][:20],
+                "created_at": session_created,
+                "updated_at": message_times[-1],
+            })
+            for i, content in enumerate(contents):
+                is_user = i % 2 == 0
+                message_time = message_times[i + 1]
+                stored = encode_content(content)  # 与线上一致，超过阈值且开启压缩时压缩存储
+                writer.add("chat_messages", {
+                    "id": str(uuid7_from_datetime(message_time)),
+                    "session_id": session_id,
+                    "is_user": is_user,
+                    "content": stored,
+                    "is_compressed": is_encoded(stored),
+                    "created_at": message_time,
+                })
+
+        current = time.perf_counter()
+        if current - last_report > 5:
+            total = sum(writer.counts.values())
+            print(f"已生成 {n + 1}/{args.users} 个用户，已写入 {total} 行，{total / (current - start):.0f} 行/秒")
+            last_report = current
+
+    writer.flush()
+    elapsed = time.perf_counter() - start
+    total = sum(writer.counts.values())
+    print(f"完成，用时 {elapsed:.1f} 秒，共 {total} 行（{total / elapsed:.0f} 行/秒）"
+          + ("（试运行，未写入数据）" if args.dry_run else ""))
+    for table, count in writer.counts.items():
+        print(f"  {table:<15}{count:>12}")
+
+
+def delete_seeded(batch_size: int):
+    """分批删除openid以seed_开头的用户及其设置、会话和消息"""
+    engine = create_engine(DATABASE_URL)
+    deleted = 0
+    while True:
+        with engine.begin() as conn:
+            user_ids = [row[0] for row in conn.execute(text(
+                "SELECT id FROM users WHERE openid LIKE :prefix LIMIT :limit"
+            ), {"prefix": SEED_OPENID_PREFIX + "%", "limit": batch_size})]
+            if not user_ids:
+                break
+            params = {f"u{i}": user_id for i, user_id in enumerate(user_ids)}
+            placeholders = ", ".join(f":u{i}" for i in range(len(user_ids)))
+            conn.execute(text(
+                "DELETE FROM chat_messages WHERE session_id IN "
+                f"(SELECT id FROM chat_sessions WHERE user_id IN ({placeholders}))"
+            ), params)
+            conn.execute(text(f"DELETE FROM chat_sessions WHERE user_id IN ({placeholders})"), params)
+            conn.execute(text(f"DELETE FROM user_settings WHERE user_id IN ({placeholders})"), params)
+            conn.execute(text(f"DELETE FROM users WHERE id IN ({placeholders})"), params)
+        deleted += len(user_ids)
+        print(f"已删除 {deleted} 个模拟用户及其数据")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大规模模拟数据生成工具")
+    parser.add_argument("--users", type=int, default=10000, help="生成的用户数")
+    parser.add_argument("--sessions-per-user", type=float, default=8, help="每个用户的平均会话数")
+    parser.add_argument("--messages-per-session", type=float, default=12, help="每个会话的平均消息数")
+    parser.add_argument("--days", type=int, default=365, help="数据覆盖的天数")
+    parser.add_argument("--batch-size", type=int, default=2000, help="每批写入的行数")
+    parser.add_argument("--method", choices=["insert", "load-data"], default="insert", help="写入方式")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子，相同参数生成相同分布的数据")
+    parser.add_argument("--dry-run", action="store_true", help="只生成不写入，统计数据量和生成速度")
+    parser.add_argument("--delete", action="store_true", help="删除之前生成的全部模拟数据")
+    args = parser.parse_args()
+    if args.delete:
+        delete_seeded(args.batch_size)
+    else:
+        seed(args)
+
+
+if __name__ == "__main__":
+    main()
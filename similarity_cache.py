@@ -0,0 +1,184 @@
+# 近似重复输入的进程内缓存
+import random  # 生成MinHash的哈希参数
+import threading  # 线程锁
+import time  # 单调时钟
+import unicodedata  # 全角转半角
+from collections import OrderedDict, deque  # LRU淘汰和查询耗时记录
+from typing import Dict, List  # 类型提示
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# 不影响生成结果的常见虚词和请求用语，计算相似度前去掉
+# 使"帮我写个生日朋友圈"和"帮我写一个生日的朋友圈"得到相同的特征
+FILLER_PHRASES = ("帮我", "给我", "请你", "麻烦", "写一个", "写个", "来一个", "来个", "一下")
+FILLER_CHARS = set("的了个一吧呢啊呀嘛哦请写，,。.！!？?~～ 、")
+
+
+def shingles(text: str, size: int = 2) -> frozenset:
+    """把文本切成字符n-gram集合，去掉虚词和标点，文本太短时退化为单字"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    for phrase in FILLER_PHRASES:
+        text = text.replace(phrase, "")
+    text = "".join(ch for ch in text if ch not in FILLER_CHARS and not ch.isspace())
+    if len(text) < size:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + size] for i in range(len(text) - size + 1))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    """两个特征集合的Jaccard相似度"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _Entry:
+    __slots__ = ("features", "bands", "value", "expires_at")
+
+    def __init__(self, features, bands, value, expires_at):
+        self.features = features
+        self.bands = bands
+        self.value = value
+        self.expires_at = expires_at
+
+
+class SimilarityCache:
+    """基于MinHash和LSH的近似重复缓存
+
+    输入切成字符n-gram后计算MinHash签名，签名按band分桶建立LSH索引，
+    查询时只和同一命名空间、至少一个band相同的条目比较，再用特征集合的Jaccard相似度确认，
+    相似度达到阈值时返回缓存的结果。超过容量时淘汰最久未使用的条目
+
+    Attributes:
+        maxsize: 最大条目数
+        ttl: 条目存活时间（秒），为0表示永不过期
+        num_perm: MinHash签名长度
+        bands: LSH的band数，num_perm需要能被bands整除
+        hits: 命中次数
+        misses: 未命中次数
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 0, num_perm: int = 32, bands: int = 8,
+                 shingle_size: int = 2, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm需要能被bands整除")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self._perms = [(rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+                       for _ in range(num_perm)]
+        self._entries = OrderedDict()  # 条目ID -> _Entry
+        self._buckets = {}  # (命名空间, band序号, band签名) -> 条目ID集合
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._lookup_seconds = deque(maxlen=1000)
+        self.hits = 0
+        self.misses = 0
+
+    def _band_keys(self, namespace, features: frozenset) -> List[tuple]:
+        """计算MinHash签名并切成band"""
+        hashes = [hash(feature) & _MAX_HASH for feature in features]
+        signature = [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._perms]
+        rows = self.num_perm // self.bands
+        return [(namespace, band, tuple(signature[band * rows:(band + 1) * rows])) for band in range(self.bands)]
+
+    def _remove(self, entry_id):
+        """删除条目及其索引，调用方需持有锁"""
+        entry = self._entries.pop(entry_id)
+        for key in entry.bands:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def get(self, namespace, text: str, threshold: float, default=None):
+        """查找与text相似度不低于threshold的缓存结果，有多条时返回最相似的一条"""
+        start = time.perf_counter()
+        features = shingles(text, self.shingle_size)
+        value = default
+        if features:
+            band_keys = self._band_keys(namespace, features)
+            now = time.monotonic()
+            with self._lock:
+                candidates = set()
+                for key in band_keys:
+                    candidates.update(self._buckets.get(key, ()))
+                best_id, best_score = None, threshold
+                for entry_id in candidates:
+                    entry = self._entries[entry_id]
+                    if entry.expires_at and entry.expires_at < now:
+                        self._remove(entry_id)
+                        continue
+                    score = jaccard(features, entry.features)
+                    if score >= best_score:
+                        best_id, best_score = entry_id, score
+                if best_id is not None:
+                    self._entries.move_to_end(best_id)
+                    value = self._entries[best_id].value
+        with self._lock:
+            if value is default:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._lookup_seconds.append(time.perf_counter() - start)
+        return value
+
+    def set(self, namespace, text: str, value, ttl: float = None):
+        """写入缓存，超过容量时淘汰最久未使用的条目"""
+        features = shingles(text, self.shingle_size)
+        if not features:
+            return
+        band_keys = self._band_keys(namespace, features)
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else 0
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(features, band_keys, value, expires_at)
+            for key in band_keys:
+                self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))  # 淘汰最久未使用的条目
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """返回缓存统计信息，包括查询耗时"""
+        with self._lock:
+            total = self.hits + self.misses
+            lookups = sorted(self._lookup_seconds)
+            buckets = len(self._buckets)
+        p50 = lookups[len(lookups) // 2] if lookups else 0.0
+        p99 = lookups[min(len(lookups) - 1, int(len(lookups) * 0.99))] if lookups else 0.0
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "buckets": buckets,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / total, 4) if total else 0.0,
+            "lookupP50Micros": round(p50 * 1e6, 1),
+            "lookupP99Micros": round(p99 * 1e6, 1),
+        }
+
+
+def parse_thresholds(value: str) -> Dict[str, float]:
+    """解析相似度阈值配置，格式如 朋友圈:0.7,小红书:0.75"""
+    thresholds = {}
+    for item in value.split(","):
+        route, _, threshold = item.partition(":")
+        if route.strip() and threshold.strip():
+            thresholds[route.strip()] = float(threshold)
+    return thresholds
@@ -0,0 +1,78 @@
+# 测试公共配置
+#
+# 运行：python -m pytest -q
+# 使用临时目录中的SQLite数据库和文件存储，不需要MySQL和外部服务。
+# 配置在导入项目模块前通过环境变量设置，项目模块在导入时读取配置
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEST_DIR = tempfile.mkdtemp(prefix="ai_assistant_test_")
+os.environ["ENV"] = "test"
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'primary.db')}"
+os.environ["SECRET_KEY"] = "test-secret-key-for-unit-tests-only"
+os.environ["IMAGE_STORE_DIR"] = os.path.join(TEST_DIR, "images")
+os.environ["ARCHIVE_DIR"] = os.path.join(TEST_DIR, "archives")
+os.environ["OUTBOX_SINK"] = "memory"
+os.environ["LOOP_MONITOR_ENABLED"] = "True"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import database  # noqa: E402
+import main  # noqa: E402
+import models  # noqa: E402
+from loop_monitor import loop_monitor  # noqa: E402
+from routers.auth import create_access_token  # noqa: E402
+
+models.Base.metadata.create_all(database.engine)
+
+
+@pytest.fixture(autouse=True)
+def clean_tables():
+    """每个测试结束后清空所有表"""
+    yield
+    with database.engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+
+
+@pytest.fixture
+def strict_loop_monitor(monkeypatch):
+    """开启事件循环监控的严格模式，应用关闭时有阻塞记录则抛出EventLoopBlocked"""
+    monkeypatch.setattr(main, "LOOP_MONITOR_ENABLED", True)
+    monkeypatch.setattr(loop_monitor, "strict", True)
+    loop_monitor.blocks.clear()
+    yield loop_monitor
+    loop_monitor.blocks.clear()
+
+
+@pytest.fixture
+def client(strict_loop_monitor):
+    """运行完整生命周期的测试客户端
+
+    所有请求在同一个事件循环中处理；接口中有阻塞事件循环的同步调用时，
+    客户端关闭时抛出EventLoopBlocked，使用该客户端的测试失败
+    """
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def make_user():
+    """创建用户，返回(用户ID, 带令牌的请求头)"""
+    def create(openid: str = None):
+        db = database.SessionLocal()
+        try:
+            user = models.User(openid=openid or f"test_{os.urandom(6).hex()}", nick_name="测试用户")
+            db.add(user)
+            db.commit()
+            user_id = user.id
+        finally:
+            db.close()
+        return user_id, {"Authorization": "Bearer " + create_access_token({"sub": user_id})}
+    return create
@@ -0,0 +1,71 @@
+# 文生图推测执行测试
+import threading
+import time
+
+import pytest
+
+import routers.chatwithdeepseek as deepseek
+from deadline import is_cancelled
+
+
+@pytest.fixture
+def flux(monkeypatch):
+    """替换图片API和提示词优化，记录发出的生成请求"""
+    state = {"calls": [], "fail": set(), "raw_started": threading.Event(), "raw_cancelled": None}
+
+    def post(prompt):
+        state["calls"].append(prompt)
+        if prompt.startswith("raw:"):
+            state["raw_started"].set()
+            deadline = time.monotonic() + 2
+            while not is_cancelled() and time.monotonic() < deadline:
+                time.sleep(0.01)  # 模拟耗时的生成，期间检查取消标记
+            state["raw_cancelled"] = is_cancelled()
+        if prompt in state["fail"]:
+            return False, '{"success": false}'
+        return True, f'{{"prompt": "{prompt}"}}'
+
+    def optimize(message):
+        state["raw_started"].wait(2)  # 等兜底请求开始后再返回优化结果
+        return f"optimized {message}"
+
+    monkeypatch.setattr(deepseek, "_post_text2image", post)
+    monkeypatch.setattr(deepseek, "deepseek_optimize_prompt", optimize)
+    deepseek.prompt_cache.clear()
+    return state
+
+
+def test_raw_primary_returns_raw_result_and_fills_prompt_cache(flux, monkeypatch):
+    monkeypatch.setattr(deepseek, "TEXT2IMAGE_SPECULATIVE_PRIMARY", "raw")
+    flux["raw_started"].set()  # raw模式下优化在后台进行，不需要等待
+
+    image_key, result = deepseek.generate_image("raw:一只猫")
+    assert result == '{"prompt": "raw:一只猫"}'
+    assert image_key is not None
+
+    deadline = time.monotonic() + 2
+    while deepseek.prompt_cache.get(deepseek.normalize_prompt("raw:一只猫")) is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert deepseek.prompt_cache.get(deepseek.normalize_prompt("raw:一只猫")) == "optimized raw:一只猫"
+
+
+def test_optimized_primary_cancels_fallback_after_success(flux, monkeypatch):
+    monkeypatch.setattr(deepseek, "TEXT2IMAGE_SPECULATIVE_PRIMARY", "optimized")
+
+    image_key, result = deepseek.generate_image("raw:一只狗")
+    assert result == '{"prompt": "optimized raw:一只狗"}'
+
+    deadline = time.monotonic() + 2
+    while flux["raw_cancelled"] is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert flux["raw_cancelled"] is True  # 兜底请求收到取消，不再继续生成
+    assert not is_cancelled()  # 只取消兜底请求，不影响当前请求
+
+
+def test_optimized_primary_falls_back_to_raw_result(flux, monkeypatch):
+    monkeypatch.setattr(deepseek, "TEXT2IMAGE_SPECULATIVE_PRIMARY", "optimized")
+    flux["fail"].add("optimized raw:一只鸟")
+
+    image_key, result = deepseek.generate_image("raw:一只鸟")
+    assert result == '{"prompt": "raw:一只鸟"}'
+    assert flux["raw_cancelled"] is False
@@ -0,0 +1,136 @@
+# 幂等请求测试
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+import database
+import main
+import models
+import routers.chat as chat
+from idempotency import IdempotencyStore, anonymous_scope, fingerprint
+
+
+def _count_messages() -> int:
+    db = database.SessionLocal()
+    try:
+        return db.query(models.ChatMessage).count()
+    finally:
+        db.close()
+
+
+def _insert_processing(record_id: str, params: dict):
+    """模拟其他进程正在处理相同的键"""
+    db = database.SessionLocal()
+    try:
+        now = datetime.utcnow()
+        db.add(models.IdempotencyRecord(
+            id=record_id, user_id="other", endpoint="other", fingerprint=fingerprint(params),
+            status="processing", created_at=now, expires_at=now + timedelta(hours=1)
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _fake_generate_image(calls: list, delay: float = 0.0, failures: int = 0):
+    """模拟文生图，前failures次调用返回图片API的失败响应"""
+    def generate(message):
+        calls.append(message)
+        time.sleep(delay)
+        success = "true" if len(calls) > failures else "false"
+        return f"{len(calls):064x}", f'{{"success": {success}, "prompt": "{message}"}}'
+    return generate
+
+
+def test_send_message_retry_replays_first_result(client, make_user):
+    _, headers = make_user()
+    headers = {**headers, "Idempotency-Key": "msg-1"}
+    first = client.post("/chat/message", json={"content": "你好"}, headers=headers)
+    retry = client.post("/chat/message", json={"content": "你好"}, headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json()["data"]["messageId"] == first.json()["data"]["messageId"]
+    assert "idempotent-replayed" not in first.headers
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert _count_messages() == 2  # 只写入了一次用户消息和AI回复
+
+
+def test_send_message_key_reused_with_other_content_is_rejected(client, make_user):
+    _, headers = make_user()
+    headers = {**headers, "Idempotency-Key": "msg-1"}
+    assert client.post("/chat/message", json={"content": "你好"}, headers=headers).status_code == 200
+    assert client.post("/chat/message", json={"content": "再见"}, headers=headers).status_code == 422
+
+
+def test_send_message_in_progress_elsewhere_returns_409(client, make_user):
+    user_id, headers = make_user()
+    body = {"content": "你好", "sessionId": None}
+    _insert_processing(IdempotencyStore.record_id(user_id, "chat.message", "msg-1"), body)
+
+    response = client.post("/chat/message", json=body, headers={**headers, "Idempotency-Key": "msg-1"})
+    assert response.status_code == 409
+    assert response.headers["retry-after"] == "2"
+    assert _count_messages() == 0
+
+
+def test_text2image_keys_are_scoped_per_device(client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(chat, "generate_image", _fake_generate_image(calls))
+    first = client.get("/chat/text2imagewithdeepseek", params={"message": "猫"},
+                       headers={"Idempotency-Key": "img-1", "X-Device-Id": "device-a"})
+    other = client.get("/chat/text2imagewithdeepseek", params={"message": "狗"},
+                       headers={"Idempotency-Key": "img-1", "X-Device-Id": "device-b"})
+    retry = client.get("/chat/text2imagewithdeepseek", params={"message": "猫"},
+                       headers={"Idempotency-Key": "img-1", "X-Device-Id": "device-a"})
+
+    assert first.status_code == other.status_code == retry.status_code == 200
+    assert "猫" in first.json()["result"] and "狗" in other.json()["result"]
+    assert "idempotent-replayed" not in other.headers  # 另一个设备相同的键不会拿到别人的结果
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
+    assert calls == ["猫", "狗"]
+
+
+def test_text2image_retry_after_network_switch_replays(monkeypatch, strict_loop_monitor):
+    calls = []
+    monkeypatch.setattr(chat, "generate_image", _fake_generate_image(calls))
+    headers = {"Idempotency-Key": "img-1", "User-Agent": "app/1.0"}
+    with TestClient(main.app, client=("192.168.1.20", 50000)) as wifi:
+        first = wifi.get("/chat/text2imagewithdeepseek", params={"message": "猫"}, headers=headers)
+    with TestClient(main.app, client=("10.64.0.7", 50000)) as cellular:  # 切换到4G后地址改变
+        retry = cellular.get("/chat/text2imagewithdeepseek", params={"message": "猫"}, headers=headers)
+        other = cellular.get("/chat/text2imagewithdeepseek", params={"message": "狗"}, headers=headers)
+
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
+    assert other.status_code == 422  # 没有设备ID时键在匿名请求间共享，参数不同的请求被拒绝
+    assert calls == ["猫"]
+
+
+def test_text2image_in_progress_elsewhere_returns_409(client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(chat, "generate_image", _fake_generate_image(calls))
+    _insert_processing(IdempotencyStore.record_id(anonymous_scope("device-a"), "chat.text2image", "img-1"),
+                       {"message": "猫"})
+
+    response = client.get("/chat/text2imagewithdeepseek", params={"message": "猫"},
+                          headers={"Idempotency-Key": "img-1", "X-Device-Id": "device-a"})
+    assert response.status_code == 409
+    assert response.headers["retry-after"] == "2"
+    assert calls == []
+
+
+def test_text2image_failure_is_not_replayed(client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(chat, "generate_image", _fake_generate_image(calls, failures=1))
+    headers = {"Idempotency-Key": "img-1", "X-Device-Id": "device-a"}
+    first = client.get("/chat/text2imagewithdeepseek", params={"message": "猫"}, headers=headers)
+    retry = client.get("/chat/text2imagewithdeepseek", params={"message": "猫"}, headers=headers)
+    replay = client.get("/chat/text2imagewithdeepseek", params={"message": "猫"}, headers=headers)
+
+    assert '"success": false' in first.json()["result"]
+    assert '"success": true' in retry.json()["result"]  # 失败结果没有保存，重试重新生成
+    assert "idempotent-replayed" not in retry.headers
+    assert replay.headers["idempotent-replayed"] == "true"
+    assert calls == ["猫", "猫"]
@@ -0,0 +1,71 @@
+# 生成图片结果存储测试，使用scripts/fake_flux_server.py作为图片API
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import routers.chatwithdeepseek as deepseek
+from image_store import image_store
+from scripts.fake_flux_server import FakeFluxHandler
+
+
+@pytest.fixture
+def fake_flux(monkeypatch):
+    """在随机端口启动模拟Flux服务，并让文生图请求发往该服务"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeFluxHandler)
+    FakeFluxHandler.request_count = 0
+    FakeFluxHandler.success = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(deepseek, "url", f"http://127.0.0.1:{server.server_address[1]}/flux/images")
+    yield FakeFluxHandler
+    FakeFluxHandler.success = True
+    server.shutdown()
+    server.server_close()
+
+
+def test_key_is_stable_and_content_addressed():
+    key = image_store.make_key("一只猫", "1024x1024", "flux")
+    assert key == image_store.make_key("  一只猫 ", "1024x1024", "flux")  # 首尾空白不影响结果
+    assert len(key) == 64 and all(c in "0123456789abcdef" for c in key)
+    assert key != image_store.make_key("一只猫", "512x512", "flux")
+    assert key != image_store.make_key("一只猫", "1024x1024", "other")
+    assert key != image_store.make_key("一只狗", "1024x1024", "flux")
+
+
+def test_store_hit_skips_flux(fake_flux):
+    ok, first, key = deepseek._request_text2image("a cat on the moon")
+    assert ok and fake_flux.request_count == 1
+
+    ok, second, second_key = deepseek._request_text2image("a cat on the moon")
+    assert ok and second == first and second_key == key
+    assert fake_flux.request_count == 1  # 命中结果存储，没有再请求图片API
+
+    deepseek._request_text2image("a dog on the moon")
+    assert fake_flux.request_count == 2
+
+
+def test_failed_generation_is_not_stored(fake_flux):
+    fake_flux.success = False  # 图片API返回200，但响应体为{"success": false}
+    ok, body, key = deepseek._request_text2image("a fish in the sky")
+    assert not ok and '"success": false' in body
+    assert image_store.get(key) is None
+
+    fake_flux.success = True
+    ok, body, second_key = deepseek._request_text2image("a fish in the sky")
+    assert ok and second_key == key
+    assert fake_flux.request_count == 2  # 失败结果没有命中存储，重新生成
+    assert image_store.get(key) == body
+
+
+def test_stored_image_is_served_by_key(client):
+    key = image_store.make_key("a red fox", "1024x1024", "flux")
+    image_store.put(key, "a red fox", "1024x1024", "flux", '{"success": true, "data": []}')
+
+    response = client.get(f"/chat/images/{key}")
+    assert response.status_code == 200
+    assert response.text == '{"success": true, "data": []}'
+    assert response.headers["content-type"] == "application/json"
+
+    assert client.get(f"/chat/images/{'0' * 64}").status_code == 404
+    assert client.get("/chat/images/..%2Fsecrets").status_code in (400, 404)
@@ -0,0 +1,122 @@
+# 多模型服务路由测试，使用桩服务代替真实的模型服务
+import asyncio
+
+import pytest
+
+from limiter import AdaptiveLimiter
+from llm_router import Backend, LatencyWindow, ProviderRouter, parse_profiles
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class StubModel:
+    """按预设行为返回或抛错的聊天模型"""
+
+    def __init__(self, backend: "StubBackend"):
+        self.backend = backend
+
+    async def ainvoke(self, messages):
+        self.backend.calls += 1
+        await asyncio.sleep(self.backend.delay)
+        if self.backend.error:
+            raise self.backend.error
+        return f"reply from {self.backend.name}"
+
+
+class StubBackend(Backend):
+    def __init__(self, name: str, delay: float = 0.0, error: Exception = None):
+        super().__init__(name, lambda temperature, timeout, profile: StubModel(self),
+                         AdaptiveLimiter(name), LatencyWindow())
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def observe(self, latency: float, count: int = 5, ok: bool = True):
+        """预先写入统计样本"""
+        for _ in range(count):
+            self.window.record(latency, ok)
+
+
+@pytest.mark.anyio
+async def test_fails_over_to_next_backend_on_error():
+    first = StubBackend("first", error=RuntimeError("upstream 500"))
+    second = StubBackend("second")
+    router = ProviderRouter([first, second])
+
+    assert await router.ainvoke("聊天", [], 0.7, 10) == "reply from second"
+    assert (first.calls, second.calls) == (1, 1)
+    assert router.failovers == 1
+
+
+@pytest.mark.anyio
+async def test_raises_last_error_when_all_backends_fail():
+    router = ProviderRouter([StubBackend("first", error=RuntimeError("a")),
+                             StubBackend("second", error=RuntimeError("b"))])
+    with pytest.raises(RuntimeError, match="b"):
+        await router.ainvoke("聊天", [], 0.7, 10)
+
+
+@pytest.mark.anyio
+async def test_orders_backends_by_p95_latency():
+    slow = StubBackend("slow")
+    fast = StubBackend("fast")
+    slow.observe(2.0)
+    fast.observe(0.1)
+    router = ProviderRouter([slow, fast])
+
+    assert [backend.name for backend in router.candidates("聊天")] == ["fast", "slow"]
+    assert await router.ainvoke("聊天", [], 0.7, 10) == "reply from fast"
+    assert slow.calls == 0
+
+
+@pytest.mark.anyio
+async def test_skips_unhealthy_backend():
+    broken = StubBackend("broken")
+    healthy = StubBackend("healthy")
+    broken.observe(0.01, ok=False)  # 错误率100%
+    healthy.observe(1.0)
+    router = ProviderRouter([broken, healthy], unhealthy_error_rate=0.5)
+
+    assert [backend.name for backend in router.candidates("聊天")] == ["healthy", "broken"]
+    assert await router.ainvoke("聊天", [], 0.7, 10) == "reply from healthy"
+    assert broken.calls == 0
+
+
+@pytest.mark.anyio
+async def test_route_restricts_backends():
+    deepseek = StubBackend("deepseek")
+    openai = StubBackend("openai")
+    router = ProviderRouter([deepseek, openai], routes={"翻译": ["openai"]})
+
+    assert await router.ainvoke("翻译", [], 0.7, 10) == "reply from openai"
+    assert deepseek.calls == 0
+
+
+def test_parse_profiles_keeps_default_timeouts_for_empty_values():
+    profiles = parse_profiles("评价:connect_timeout=,read_timeout=,max_tokens=,target_p95=;翻译:read_timeout=30")
+
+    review = profiles["评价"]
+    assert (review.connect_timeout, review.read_timeout) == (5, 120)
+    assert review.max_tokens is None and review.target_p95 is None
+    timeout = review.client_timeout(10)
+    assert (timeout.read, timeout.connect) == (10, 5)
+    assert profiles["翻译"].client_timeout(60).read == 30
+
+
+@pytest.mark.anyio
+async def test_cancelled_hedge_loser_is_not_a_latency_sample():
+    slow = StubBackend("slow", delay=1.0)
+    fast = StubBackend("fast")
+    router = ProviderRouter([slow, fast], hedge_after=0.02, hedge_budget=1.0, min_samples=2)
+
+    for _ in range(2):
+        assert await router.ainvoke("聊天", [], 0.7, 10) == "reply from fast"
+    await asyncio.sleep(0)  # 等待落败的首次请求处理取消
+
+    assert slow.window.snapshot() == ([], 0)  # 截断的耗时不计入p95
+    assert slow.window.cancelled() == 2
+    # 总是对冲落败的服务没有完整样本，排在有样本的服务之后，不会因p95被拉低而被优先选择
+    assert [backend.name for backend in router.candidates("聊天")] == ["fast", "slow"]
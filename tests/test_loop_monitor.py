@@ -0,0 +1,38 @@
+# 事件循环阻塞检测测试
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import main
+from loop_monitor import EventLoopBlocked
+
+
+def _app_with(handler) -> FastAPI:
+    """使用应用生命周期和单个接口的测试应用"""
+    app = FastAPI(lifespan=main.lifespan)
+    app.add_api_route("/probe", handler)
+    return app
+
+
+def test_blocking_handler_fails_in_strict_mode(strict_loop_monitor):
+    async def blocking():
+        time.sleep(strict_loop_monitor.threshold * 4)  # 在async函数中直接调用同步等待
+        return {}
+
+    with pytest.raises(EventLoopBlocked) as excinfo:
+        with TestClient(_app_with(blocking)) as test_client:
+            assert test_client.get("/probe").status_code == 200
+    assert "time.sleep" in str(excinfo.value)  # 异常信息包含阻塞位置的调用栈
+
+
+def test_awaiting_handler_passes_in_strict_mode(strict_loop_monitor):
+    async def awaiting():
+        await asyncio.sleep(strict_loop_monitor.threshold * 4)
+        return {}
+
+    with TestClient(_app_with(awaiting)) as test_client:
+        assert test_client.get("/probe").status_code == 200
+    assert not strict_loop_monitor.blocks
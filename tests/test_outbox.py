@@ -0,0 +1,109 @@
+# 事务性发件箱测试，使用进程内的MemoryBroker代替消息队列
+import os
+from datetime import datetime
+
+import pytest
+
+import database
+import models
+import outbox
+from outbox import MemoryBroker, NDJSONSink, OutboxRelay, add_message_event
+
+
+@pytest.fixture(autouse=True)
+def outbox_enabled(monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_ENABLED", True)
+
+
+class FailingSink:
+    def publish(self, events: list):
+        raise ConnectionError("broker unavailable")
+
+
+def _write_message(user_id: str, content: str, commit: bool = True) -> str:
+    """在同一事务中写入会话、消息和事件"""
+    db = database.SessionLocal()
+    try:
+        session = models.ChatSession(user_id=user_id)
+        db.add(session)
+        db.flush()
+        message = models.ChatMessage(session_id=session.id, is_user=True, content=content)
+        db.add(message)
+        add_message_event(db, message, user_id)
+        if commit:
+            db.commit()
+        else:
+            db.rollback()
+        return message.id
+    finally:
+        db.close()
+
+
+def _events() -> list:
+    db = database.SessionLocal()
+    try:
+        return db.query(models.OutboxEvent).order_by(models.OutboxEvent.id).all()
+    finally:
+        db.close()
+
+
+def test_event_is_committed_with_message(make_user):
+    user_id, _ = make_user()
+    message_id = _write_message(user_id, "你好")
+
+    events = _events()
+    assert len(events) == 1
+    assert events[0].event_type == "message.created" and events[0].published_at is None
+    assert f'"messageId":"{message_id}"' in events[0].payload
+
+
+def test_rollback_drops_event(make_user):
+    user_id, _ = make_user()
+    _write_message(user_id, "你好", commit=False)
+
+    assert _events() == []
+    db = database.SessionLocal()
+    try:
+        assert db.query(models.ChatMessage).count() == 0
+    finally:
+        db.close()
+
+
+def test_relay_once_publishes_and_marks_rows(make_user):
+    user_id, _ = make_user()
+    first, second = _write_message(user_id, "第一条"), _write_message(user_id, "第二条")
+    broker = MemoryBroker()
+    relay = OutboxRelay(broker, batch_size=10)
+
+    assert relay.relay_once() == 2
+    assert all(event.published_at is not None for event in _events())
+    consumed = broker.consume()
+    assert [event["payload"]["messageId"] for event in consumed] == [first, second]
+    assert consumed[0]["payload"]["content"] == "第一条"
+    assert relay.relay_once() == 0  # 已发布的事件不会再次发布
+    assert relay.stats()["published"] == 2
+
+
+def test_failing_sink_leaves_rows_unpublished(make_user):
+    user_id, _ = make_user()
+    _write_message(user_id, "你好")
+    relay = OutboxRelay(FailingSink())
+
+    with pytest.raises(ConnectionError):
+        relay.relay_once()
+    assert [event.published_at for event in _events()] == [None]
+    assert relay.stats()["failures"] == 1 and relay.stats()["lastError"] == "broker unavailable"
+
+    broker = MemoryBroker()
+    assert OutboxRelay(broker).relay_once() == 1  # 接收端恢复后补发
+    assert len(broker.consume()) == 1
+
+
+def test_ndjson_sink_purges_expired_files(tmp_path):
+    sink = NDJSONSink(str(tmp_path), retention_days=7)
+    for name in ("chat-events-20260101.ndjson", "chat-events-20260112.ndjson", "other.txt"):
+        (tmp_path / name).write_text("{}\n")
+
+    assert sink.purge_files(now=datetime(2026, 1, 15)) == 1
+    assert sorted(os.listdir(tmp_path)) == ["chat-events-20260112.ndjson", "other.txt"]
+    assert NDJSONSink(str(tmp_path), retention_days=0).purge_files() == 0
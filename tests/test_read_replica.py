@@ -0,0 +1,89 @@
+# 读写分离测试，主库和只读副本分别使用一个SQLite数据库
+import itertools
+import os
+
+import pytest
+from sqlalchemy import create_engine
+
+import database
+import models
+from conftest import TEST_DIR
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    """配置一个只读副本，副本中的数据与主库不同，用于区分查询发往了哪个库"""
+    path = os.path.join(TEST_DIR, "replica.db")
+    if os.path.exists(path):
+        os.remove(path)
+    replica_engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(replica_engine)
+    monkeypatch.setattr(database, "replica_engines", [replica_engine])
+    monkeypatch.setattr(database, "_replica_cycle", itertools.cycle([replica_engine]))
+    database.recent_writers.clear()
+    yield replica_engine
+    database.recent_writers.clear()
+    replica_engine.dispose()
+
+
+def _add_user(session_factory, user_id: str, nick_name: str):
+    db = session_factory()
+    try:
+        db.add(models.User(id=user_id, openid=f"openid_{user_id}", nick_name=nick_name))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _read_nick_name(user_id: str):
+    db = database.ReadSessionLocal()
+    try:
+        user = db.get(models.User, user_id)
+        return user.nick_name if user else None
+    finally:
+        db.close()
+
+
+def test_reads_go_to_replica(replica):
+    _add_user(database.SessionLocal, "u1", "主库")
+    _add_user(lambda: database.Session(bind=replica), "u1", "副本")
+    assert _read_nick_name("u1") == "副本"
+
+
+def test_writes_go_to_primary(replica):
+    db = database.ReadSessionLocal()
+    try:
+        db.add(models.User(id="u2", openid="openid_u2", nick_name="新用户"))
+        db.commit()
+        assert db.get(models.User, "u2").nick_name == "新用户"  # 写入过的会话之后的查询也走主库
+    finally:
+        db.close()
+
+    primary = database.SessionLocal()
+    try:
+        assert primary.get(models.User, "u2") is not None
+    finally:
+        primary.close()
+    with replica.connect() as conn:
+        assert conn.execute(models.User.__table__.select()).first() is None
+
+
+def test_recent_writer_reads_from_primary(replica):
+    _add_user(lambda: database.Session(bind=replica), "u3", "旧昵称")
+    _add_user(lambda: database.Session(bind=replica), "u4", "副本")
+    _add_user(database.SessionLocal, "u4", "主库")
+
+    token = database.current_user_id.set("u3")
+    try:
+        _add_user(database.SessionLocal, "u3", "新昵称")  # 当前用户刚写入，副本尚未同步
+        assert _read_nick_name("u3") == "新昵称"
+        assert _read_nick_name("u4") == "主库"  # 窗口期内当前用户的所有读请求都走主库
+    finally:
+        database.current_user_id.reset(token)
+
+    token = database.current_user_id.set("u4")
+    try:
+        assert _read_nick_name("u4") == "副本"  # 没有写入过的用户仍然读副本
+        assert _read_nick_name("u3") == "旧昵称"
+    finally:
+        database.current_user_id.reset(token)
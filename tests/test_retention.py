@@ -0,0 +1,111 @@
+# 聊天记录归档与恢复测试
+from datetime import datetime, timedelta
+
+import compression
+import database
+import models
+import retention
+
+
+def _create_session(user_id: str, updated_at: datetime, contents: list) -> str:
+    db = database.SessionLocal()
+    try:
+        session = models.ChatSession(user_id=user_id, title="旧会话", created_at=updated_at, updated_at=updated_at)
+        db.add(session)
+        db.flush()
+        for i, content in enumerate(contents):
+            db.add(models.ChatMessage(session_id=session.id, is_user=i % 2 == 0, content=content,
+                                      created_at=updated_at + timedelta(seconds=i)))
+        db.commit()
+        return session.id
+    finally:
+        db.close()
+
+
+def _snapshot(session_id: str):
+    """会话及其消息的内容，用于比较归档前后的数据"""
+    db = database.SessionLocal()
+    try:
+        session = db.get(models.ChatSession, session_id)
+        if session is None:
+            return None
+        messages = db.query(models.ChatMessage).filter(
+            models.ChatMessage.session_id == session_id).order_by(models.ChatMessage.created_at).all()
+        return ((session.user_id, session.title, session.created_at, session.updated_at),
+                [(m.id, m.is_user, m.content, m.is_compressed, m.created_at) for m in messages])
+    finally:
+        db.close()
+
+
+def test_archive_deletes_and_restore_round_trips(make_user, tmp_path, monkeypatch):
+    monkeypatch.setattr(compression, "MESSAGE_COMPRESSION_ENABLED", True)
+    user_id, _ = make_user()
+    now = datetime.utcnow()
+    old_id = _create_session(user_id, now - timedelta(days=200), ["怎么做红烧肉？", "红烧肉的做法：" + "五花肉切块。" * 500])
+    recent_id = _create_session(user_id, now - timedelta(days=1), ["你好"])
+    before = _snapshot(old_id)
+    assert before[1][1][3] is True  # 长回复压缩存储
+
+    stats = retention.archive_sessions(now - timedelta(days=180), archive_dir=str(tmp_path), delete_chunk=2)
+    assert (stats["sessions"], stats["messages"], stats["skipped"]) == (1, 2, 0)
+    assert len(stats["files"]) == 1
+    assert _snapshot(old_id) is None
+    assert _snapshot(recent_id) is not None  # 保留期内的会话不受影响
+
+    restored = retention.restore_archive(stats["files"][0])
+    assert (restored["sessions"], restored["messages"], restored["skipped"]) == (1, 2, 0)
+    assert _snapshot(old_id) == before
+
+    again = retention.restore_archive(stats["files"][0])
+    assert (again["sessions"], again["skipped"]) == (0, 1)  # 已存在的会话跳过，不重复写入
+    assert _snapshot(old_id) == before
+
+
+def test_session_written_during_archive_is_not_deleted(make_user, tmp_path, monkeypatch):
+    user_id, _ = make_user()
+    now = datetime.utcnow()
+    busy_id = _create_session(user_id, now - timedelta(days=200), ["第一条"])
+    idle_id = _create_session(user_id, now - timedelta(days=300), ["很久以前"])
+    delete_sessions = retention._delete_sessions
+
+    def write_then_delete(session_ids, archived, before):
+        # 归档文件已写入，删除之前用户在旧会话中发了一条新消息，会话更新时间尚未更新
+        if busy_id in session_ids:
+            db = database.SessionLocal()
+            try:
+                db.add(models.ChatMessage(session_id=busy_id, is_user=True, content="新消息"))
+                db.commit()
+            finally:
+                db.close()
+        return delete_sessions(session_ids, archived, before)
+
+    monkeypatch.setattr(retention, "_delete_sessions", write_then_delete)
+    stats = retention.archive_sessions(now - timedelta(days=180), archive_dir=str(tmp_path), max_batches=1)
+
+    assert (stats["sessions"], stats["messages"], stats["skipped"]) == (1, 1, 1)
+    assert _snapshot(idle_id) is None
+    kept = _snapshot(busy_id)
+    assert [m[2] for m in kept[1]] == ["第一条", "新消息"]  # 未归档的新消息没有被删除
+
+
+def test_session_updated_during_archive_is_not_deleted(make_user, tmp_path, monkeypatch):
+    user_id, _ = make_user()
+    now = datetime.utcnow()
+    session_id = _create_session(user_id, now - timedelta(days=200), ["第一条"])
+    delete_sessions = retention._delete_sessions
+
+    def touch_then_delete(session_ids, archived, before):
+        db = database.SessionLocal()
+        try:
+            db.get(models.ChatSession, session_id).title = "改过的标题"
+            db.get(models.ChatSession, session_id).updated_at = datetime.utcnow()
+            db.commit()
+        finally:
+            db.close()
+        return delete_sessions(session_ids, archived, before)
+
+    monkeypatch.setattr(retention, "_delete_sessions", touch_then_delete)
+    stats = retention.archive_sessions(now - timedelta(days=180), archive_dir=str(tmp_path))
+
+    assert (stats["sessions"], stats["skipped"]) == (0, 1)
+    assert _snapshot(session_id)[0][1] == "改过的标题"
@@ -0,0 +1,95 @@
+# 令牌吊销测试
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+from revocation import BloomFilter, RevocationList, revocation_list
+from routers.auth import create_access_token
+from utils import decode_access_token
+
+
+def test_logout_revokes_token(client, make_user):
+    _, headers = make_user()
+    assert client.get("/user/info", headers=headers).status_code == 200
+
+    assert client.post("/auth/logout", headers=headers).status_code == 200
+    assert client.get("/user/info", headers=headers).status_code == 401
+    assert client.post("/auth/logout", headers=headers).status_code == 401
+
+
+def test_logout_does_not_affect_other_tokens(client, make_user):
+    user_id, headers = make_user()
+    other = {"Authorization": "Bearer " + create_access_token({"sub": user_id})}  # 同一用户在另一台设备的令牌
+
+    assert client.post("/auth/logout", headers=headers).status_code == 200
+    assert client.get("/user/info", headers=other).status_code == 200
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    items = [os.urandom(8).hex() for _ in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+
+    false_positives = sum(os.urandom(8).hex() in bloom for _ in range(10000))
+    assert false_positives < 10000 * 0.01 * 3  # 误判率在预期范围内
+
+
+def test_sync_picks_up_revocation_from_other_instance():
+    local, other = RevocationList(capacity=100), RevocationList(capacity=100)
+    local.sync()
+    token = create_access_token({"sub": "user-1"})
+    jti = decode_access_token(token)["jti"]
+    assert not local.is_revoked(jti)
+
+    other.revoke(jti, "user-1", datetime.utcnow() + timedelta(hours=1))  # 另一个进程退出登录
+    assert other.is_revoked(jti)
+    assert not local.is_revoked(jti)  # 同步前当前进程还不知道
+
+    assert local.sync() == 1
+    assert local.is_revoked(jti)
+
+
+def test_sync_rebuilds_filter_beyond_capacity():
+    local, other = RevocationList(capacity=2), RevocationList(capacity=2)
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    jtis = [f"jti-{i}" for i in range(5)]
+    for jti in jtis:
+        other.revoke(jti, "user-1", expires_at)
+
+    assert local.sync() == 5
+    assert local.stats()["bloomCapacity"] >= 10  # 超过容量后按两倍实际数量重建
+    assert all(local.is_revoked(jti) for jti in jtis)
+
+
+def test_lookup_only_needs_database_on_unconfirmed_bloom_hit():
+    revocations = RevocationList(capacity=100)
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    assert revocations.lookup("never-revoked") is False  # 布隆过滤器未命中，不需要查询数据库
+
+    RevocationList(capacity=100).revoke("jti-1", "user-1", expires_at)
+    revocations.sync()
+    assert revocations.lookup("jti-1") is None  # 命中但尚未确认
+    assert revocations.confirm("jti-1") is True
+    assert revocations.lookup("jti-1") is True  # 确认结果已缓存
+
+
+def test_http_auth_confirms_bloom_hit_off_the_event_loop(client, make_user, monkeypatch):
+    _, headers = make_user()
+    assert client.post("/auth/logout", headers=headers).status_code == 200
+    revocation_list._confirmed.clear()  # 确认结果的缓存过期，下次校验需要查询吊销表
+    confirm = revocation_list.confirm
+    threads = []
+
+    def confirm_in_worker(jti):
+        try:
+            asyncio.get_running_loop()
+            threads.append("event loop")
+        except RuntimeError:
+            threads.append("worker")
+        return confirm(jti)
+
+    monkeypatch.setattr(revocation_list, "confirm", confirm_in_worker)
+    assert client.get("/user/info", headers=headers).status_code == 401
+    assert threads == ["worker"]
@@ -0,0 +1,70 @@
+# 聊天记录搜索测试
+from datetime import datetime, timedelta
+
+import pytest
+
+import compression
+import database
+import models
+import routers.chat as chat
+
+RECIPE = "番茄炒蛋的做法：" + "先把鸡蛋打散，再放入番茄翻炒。" * 100
+
+
+@pytest.fixture
+def compressed(monkeypatch):
+    monkeypatch.setattr(compression, "MESSAGE_COMPRESSION_ENABLED", True)
+
+
+def _add_messages(user_id: str, contents: list) -> list:
+    """按顺序写入消息，后写入的时间更晚"""
+    db = database.SessionLocal()
+    try:
+        session = models.ChatSession(user_id=user_id, title="做菜")
+        db.add(session)
+        db.flush()
+        start = datetime.utcnow() - timedelta(minutes=len(contents))
+        messages = [models.ChatMessage(session_id=session.id, is_user=i % 2 == 0, content=content,
+                                       created_at=start + timedelta(minutes=i))
+                    for i, content in enumerate(contents)]
+        db.add_all(messages)
+        db.commit()
+        return [(m.id, m.is_compressed) for m in messages]
+    finally:
+        db.close()
+
+
+def test_search_finds_compressed_messages(client, make_user, compressed):
+    user_id, headers = make_user()
+    ids = _add_messages(user_id, ["怎么做番茄炒蛋？", RECIPE, "红烧肉呢？", "红烧肉的做法：" + "五花肉切块。" * 300])
+    assert [flag for _, flag in ids] == [False, True, False, True]
+
+    data = client.get("/chat/search", params={"q": "番茄"}, headers=headers).json()["data"]
+    assert [item["messageId"] for item in data["items"]] == [ids[1][0], ids[0][0]]  # 按时间倒序
+    assert data["items"][0]["snippet"].startswith("番茄炒蛋的做法")
+    assert data["partial"] is False and data["hasMore"] is False
+
+
+def test_search_pages_across_compressed_and_plain_messages(client, make_user, compressed):
+    user_id, headers = make_user()
+    ids = [message_id for message_id, _ in _add_messages(user_id, ["番茄1", RECIPE, "番茄2", RECIPE, "番茄3"])]
+
+    first = client.get("/chat/search", params={"q": "番茄", "pageSize": 2}, headers=headers).json()["data"]
+    second = client.get("/chat/search", params={"q": "番茄", "pageSize": 2, "page": 3}, headers=headers).json()["data"]
+    assert [item["messageId"] for item in first["items"]] == [ids[4], ids[3]]
+    assert first["hasMore"] is True
+    assert [item["messageId"] for item in second["items"]] == [ids[0]]
+    assert second["hasMore"] is False
+
+
+def test_compressed_scan_limit_is_reported(make_user, compressed):
+    user_id, _ = make_user()
+    ids = _add_messages(user_id, [RECIPE, RECIPE.replace("番茄", "土豆")])
+    db = database.SessionLocal()
+    try:
+        matches, partial = chat.search_compressed_messages(db, user_id, "番茄", scan_limit=1)
+        assert matches == [] and partial is True  # 只扫描了最近一条，更早的番茄菜谱未被检索
+        matches, partial = chat.search_compressed_messages(db, user_id, "番茄", scan_limit=2)
+        assert [message.id for message, _ in matches] == [ids[0][0]] and partial is False
+    finally:
+        db.close()
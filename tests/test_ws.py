@@ -0,0 +1,56 @@
+# 聊天WebSocket接口测试
+from datetime import datetime, timedelta
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from revocation import RevocationList, revocation_list
+from routers.auth import create_access_token
+from utils import decode_access_token
+
+
+def test_connection_is_closed_after_token_revoked(client, make_user):
+    user_id, headers = make_user()
+    token = headers["Authorization"][7:]
+    with client.websocket_connect(f"/chat/ws?token={token}") as websocket:
+        assert websocket.receive_json() == {"type": "ready", "userId": user_id}
+        websocket.send_json({"type": "ping"})
+        assert websocket.receive_json() == {"type": "pong"}
+
+        jti = decode_access_token(token)["jti"]
+        revocation_list.revoke(jti, user_id, datetime.utcnow() + timedelta(hours=1))
+        websocket.send_json({"type": "ping"})
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+        assert closed.value.code == 4401
+
+
+def test_token_of_unknown_user_is_rejected(client):
+    token = create_access_token({"sub": "missing-user"})
+    with client.websocket_connect("/chat/ws", headers={"Authorization": "Bearer " + token}) as websocket:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+        assert closed.value.code == 4401
+
+
+def test_messages_skip_threadpool_unless_bloom_filter_hits(client, make_user, monkeypatch):
+    user_id, headers = make_user()
+    confirmed = []
+    confirm = revocation_list.confirm
+    monkeypatch.setattr(revocation_list, "confirm", lambda jti: confirmed.append(jti) or confirm(jti))
+    with client.websocket_connect("/chat/ws", headers=headers) as websocket:
+        assert websocket.receive_json()["type"] == "ready"
+        for _ in range(3):
+            websocket.send_json({"type": "ping"})
+            assert websocket.receive_json() == {"type": "pong"}
+        assert confirmed == []  # 未吊销的令牌不查询吊销表
+
+        jti = decode_access_token(headers["Authorization"][7:])["jti"]
+        other = RevocationList()
+        other.revoke(jti, user_id, datetime.utcnow() + timedelta(hours=1))  # 其他进程吊销
+        revocation_list.sync()
+        websocket.send_json({"type": "ping"})
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+        assert closed.value.code == 4401
+        assert confirmed == [jti]
@@ -1,26 +1,122 @@
 # 导入必要的模块
 from fastapi import Depends, HTTPException, status  # FastAPI相关组件
+from fastapi.concurrency import run_in_threadpool  # 在线程池中执行同步调用
 from fastapi.security import OAuth2PasswordBearer  # OAuth2密码流认证
 from sqlalchemy.orm import Session  # 数据库会话
 import jwt  # JWT令牌处理
+import secrets  # 令牌比较
 from datetime import datetime, timedelta  # 日期时间处理
 from typing import Optional  # 类型提示
 
 # 导入项目内部模块
-from config import SECRET_KEY, ALGORITHM  # 配置
-from database import get_db  # 数据库依赖
+from config import SECRET_KEY, ALGORITHM, METRICS_TOKEN, DEBUG  # 配置
+from database import get_db, current_user_id  # 数据库依赖
 from models import User  # 数据模型
+from revocation import revocation_list  # 已吊销令牌
 
 # OAuth2认证
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")  # 配置OAuth2密码流认证，指定获取令牌的URL
 
+# 校验管理员令牌
+def is_metrics_token_valid(token: Optional[str]) -> bool:
+    """
+    校验运行指标等管理接口的访问令牌
+
+    配置了METRICS_TOKEN时要求令牌一致；未配置时只在调试模式下放行
+    """
+    if METRICS_TOKEN:
+        return bool(token) and secrets.compare_digest(token, METRICS_TOKEN)
+    return DEBUG
+
+# 解码令牌
+def _decode_token(token: str) -> dict:
+    """校验JWT令牌的签名、过期时间和用户ID，不检查是否已吊销"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        raise credentials_exception()
+    if payload.get("sub") is None:
+        raise credentials_exception()
+    return payload
+
+def decode_access_token(token: str) -> dict:
+    """
+    解码并校验JWT令牌
+
+    吊销检查在布隆过滤器命中时会同步查询数据库，只能在线程池或同步代码中调用，
+    异步代码中使用verify_access_token
+
+    Args:
+        token: JWT令牌
+
+    Returns:
+        dict: 令牌载荷，至少包含用户ID（sub）
+
+    Raises:
+        HTTPException: 令牌签名无效、已过期、已吊销或缺少用户ID时抛出认证失败异常
+    """
+    payload = _decode_token(token)
+    if revocation_list.is_revoked(payload.get("jti")):
+        raise credentials_exception()
+    return payload
+
+async def verify_access_token(token: str) -> dict:
+    """
+    解码并校验JWT令牌，与decode_access_token相同，供异步代码使用
+
+    未吊销的令牌只查内存中的布隆过滤器；命中且没有缓存的确认结果时在线程池中查询吊销表，不阻塞事件循环
+
+    Raises:
+        HTTPException: 令牌签名无效、已过期、已吊销或缺少用户ID时抛出认证失败异常
+    """
+    payload = _decode_token(token)
+    jti = payload.get("jti")
+    revoked = revocation_list.lookup(jti)
+    if revoked is None:
+        revoked = await run_in_threadpool(revocation_list.confirm, jti)
+    if revoked:
+        raise credentials_exception()
+    return payload
+
+# 依赖项：获取令牌载荷
+async def get_token_payload(token: str = Depends(oauth2_scheme)) -> dict:
+    """
+    校验JWT令牌并返回载荷，用于需要jti、过期时间等令牌信息的接口
+
+    Returns:
+        dict: 令牌载荷
+    """
+    payload = await verify_access_token(token)
+    current_user_id.set(payload["sub"])
+    return payload
+
 # 验证令牌
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user_id(token: str = Depends(oauth2_scheme)) -> str:
     """
-    验证JWT令牌并获取当前用户
+    验证JWT令牌并返回当前用户ID，不查询数据库
+    
+    用于可以直接从缓存返回结果的接口，令牌签名和过期时间仍然会被校验
     
     Args:
         token: JWT令牌，由OAuth2PasswordBearer依赖项提供
+        
+    Returns:
+        str: 当前用户ID
+        
+    Raises:
+        HTTPException: 令牌无效时抛出异常
+    """
+    user_id: str = (await verify_access_token(token))["sub"]  # 获取用户ID
+    current_user_id.set(user_id)  # 供读写分离判断当前用户是否刚写入过数据
+    return user_id
+
+# 获取当前用户
+async def get_current_user(user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    """
+    验证JWT令牌并获取当前用户
+    
+    Args:
+        user_id: 当前用户ID，由get_current_user_id依赖项提供
         db: 数据库会话，由get_db依赖项提供
         
     Returns:
@@ -29,24 +125,17 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     Raises:
         HTTPException: 令牌无效或用户不存在时抛出异常
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="无效的认证凭证",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        # 解码JWT令牌
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")  # 获取用户ID
-        if user_id is None:
-            raise credentials_exception
-    except jwt.PyJWTError:
-        # JWT解码错误
-        raise credentials_exception
-    
     # 查询用户
     user = db.query(User).filter(User.id == user_id).first()
     if user is None:
         # 用户不存在
-        raise credentials_exception
-    return user
\ No newline at end of file
+        raise credentials_exception()
+    return user
+
+def credentials_exception() -> HTTPException:
+    """构建认证失败异常"""
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="无效的认证凭证",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
\ No newline at end of file